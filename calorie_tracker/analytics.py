@@ -0,0 +1,210 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Analytics settings
+NUTRIENTS = ('calories', 'protein_g', 'carbs_g', 'fat_g')
+ROLLING_WINDOWS = (7, 30)
+ADHERENCE_TOLERANCE = 0.10
+RESULT_CACHE_SIZE = 32
+SERIES_CACHE_SIZE = 64
+
+
+@dataclass
+class Trends:
+    """
+    A user's intake over a date range, with rolling averages and goal adherence.
+
+    Attributes:
+        start_date (str): The first ISO date of the range.
+        end_date (str): The last ISO date of the range.
+        goals (dict[str, float | None]): The user's daily goal per nutrient; None if unset.
+        daily (pd.DataFrame): One row per day of the range, indexed by date. It has a
+            column per nutrient (NaN on days without entries), a '<nutrient>_avg<N>'
+            column per rolling window, and a '<nutrient>_pct' column with the intake
+            as a percentage of the goal.
+        averages (dict[str, float | None]): The mean daily intake per nutrient over the
+            days with entries; None if there are none.
+        adherence (dict[str, float | None]): The fraction of days with entries whose
+            intake was within the tolerance of the goal; None if the goal is unset or
+            there are no such days.
+    """
+    start_date: str
+    end_date: str
+    goals: dict
+    daily: pd.DataFrame
+    averages: dict
+    adherence: dict
+
+    @property
+    def logged_days(self):
+        return int(self.daily['calories'].notna().sum())
+
+
+def load_daily_series(repo, user_id, start_date, end_date):
+    """
+    Reads a user's per-day totals for a date range in one query.
+
+    The rows come from 'daily_totals', which the database keeps equal to the
+    per-day sums of 'food_log', and are reindexed so the frame has a row for
+    every day of the range. Days without entries are NaN.
+
+    Returns:
+        pd.DataFrame: A float column per nutrient, indexed by a daily DatetimeIndex.
+    """
+    rows = repo.get_totals_range(user_id, start_date, end_date)
+    frame = pd.DataFrame.from_records(rows, columns=['entry_date', *NUTRIENTS])
+    frame.index = pd.to_datetime(frame.pop('entry_date'))
+    return frame.astype(float).reindex(pd.date_range(start_date, end_date, freq='D'))
+
+def compute_trends(series, goals, start_date, end_date, windows=ROLLING_WINDOWS, tolerance=ADHERENCE_TOLERANCE):
+    """
+    Computes rolling averages and goal adherence over a daily series.
+
+    Everything is computed on whole columns at once. Rolling averages are the
+    mean over the days with entries in the trailing window, so a day that was
+    not tracked does not count as a day of zero intake. The series should start
+    `max(windows) - 1` days before `start_date` so the first days of the range
+    have full windows.
+
+    Args:
+        series (pd.DataFrame): Per-day totals as returned by `load_daily_series`.
+        goals (dict[str, float | None]): The daily goal per nutrient.
+        start_date (str): The first ISO date to report.
+        end_date (str): The last ISO date to report.
+        windows (tuple[int]): The rolling window lengths in days.
+        tolerance (float): How far from the goal a day may be and still count as
+            adherent, as a fraction of the goal.
+
+    Returns:
+        Trends: The daily rows of the range with their averages, and the summary figures.
+    """
+    values = series[list(NUTRIENTS)]
+    columns = [values]
+    for window in windows:
+        columns.append(values.rolling(window, min_periods=1).mean().add_suffix(f'_avg{window}'))
+    daily = pd.concat(columns, axis=1).loc[start_date:end_date]
+
+    intake = daily[list(NUTRIENTS)].to_numpy()
+    goal_vector = np.array([goals.get(name) or np.nan for name in NUTRIENTS], dtype=float)
+    ratios = intake / goal_vector
+    for i, name in enumerate(NUTRIENTS):
+        daily[f'{name}_pct'] = ratios[:, i] * 100
+
+    logged = ~np.isnan(intake[:, 0])
+    with np.errstate(invalid='ignore'):
+        within = np.abs(ratios[logged] - 1) <= tolerance
+    averages, adherence = {}, {}
+    for i, name in enumerate(NUTRIENTS):
+        averages[name] = float(np.nanmean(intake[logged, i])) if logged.any() else None
+        adherence[name] = float(within[:, i].mean()) if logged.any() and not np.isnan(goal_vector[i]) else None
+    return Trends(start_date, end_date, dict(goals), daily, averages, adherence)
+
+
+class TrendsCache:
+    """
+    Caches each user's daily series and the trends computed from it.
+
+    A user's series covers one contiguous span of days. A request outside the
+    span reads only the missing days and appends them; days marked changed by
+    `invalidate` are re-read in one query before the next computation. Computed
+    trends are kept per (user, start, end) in a small LRU, and `invalidate` drops
+    only the results whose rows or rolling windows include the changed day.
+
+    `invalidate` only sees food logged through the core, so before trusting the
+    cache each lookup reads the connection's `PRAGMA data_version`, which moves
+    whenever another connection commits; only then is everything dropped and
+    re-read. Series are kept for the `series_cache_size` most recently used users.
+
+    The cache is guarded by a lock, so it can be shared between threads.
+
+    Attributes:
+        repo (Repository): The repository the series are read through.
+        windows (tuple[int]): The rolling window lengths in days.
+        tolerance (float): The goal adherence tolerance.
+    """
+    def __init__(self, repo, windows=ROLLING_WINDOWS, tolerance=ADHERENCE_TOLERANCE, cache_size=RESULT_CACHE_SIZE,
+                 series_cache_size=SERIES_CACHE_SIZE):
+        self.repo = repo; self.windows = tuple(windows); self.tolerance = tolerance
+        self._cache_size = cache_size
+        self._series_cache_size = series_cache_size
+        self._lock = threading.Lock()
+        self._series = OrderedDict()
+        self._versions = {}
+        self._dirty = {}
+        self._results = OrderedDict()
+
+    def get(self, user_id, start_date, end_date):
+        """Returns the user's Trends between two ISO dates, computing them only if not cached."""
+        key = (user_id, start_date, end_date)
+        with self._lock:
+            self._check_version()
+            trends = self._results.get(key)
+            if trends is not None:
+                self._results.move_to_end(key)
+                return trends
+            history_start = (date.fromisoformat(start_date) - timedelta(days=max(self.windows) - 1)).isoformat()
+            series = self._series_for(user_id, history_start, end_date)
+            trends = compute_trends(series, self.repo.get_user_goals(user_id), start_date, end_date, self.windows, self.tolerance)
+            self._results[key] = trends
+            if len(self._results) > self._cache_size: self._results.popitem(last=False)
+            return trends
+
+    def invalidate(self, user_id, entry_date):
+        """Marks a user's day as changed, dropping the cached trends it affects."""
+        with self._lock:
+            if user_id in self._series: self._dirty.setdefault(user_id, set()).add(entry_date)
+            reach = timedelta(days=max(self.windows) - 1)
+            day = date.fromisoformat(entry_date)
+            for key in [key for key in self._results if key[0] == user_id]:
+                if date.fromisoformat(key[1]) - reach <= day <= date.fromisoformat(key[2]): del self._results[key]
+
+    def clear(self, user_id=None):
+        """Drops everything cached for a user, or for every user."""
+        with self._lock:
+            if user_id is None:
+                self._series.clear(); self._dirty.clear(); self._results.clear(); return
+            self._drop(user_id)
+
+    def _check_version(self):
+        """Drops everything cached if another connection has committed since this thread last looked."""
+        conn = self.repo.connection()
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        seen = self._versions.get(threading.get_ident())
+        self._versions[threading.get_ident()] = (conn, version)
+        # Each connection counts on its own, so a thread's first look (or a reopened
+        # connection) has nothing to compare against and cannot vouch for the cache.
+        if seen is None or seen[0] is not conn or seen[1] != version:
+            self._series.clear(); self._dirty.clear(); self._results.clear()
+
+    def _drop(self, user_id):
+        self._series.pop(user_id, None); self._dirty.pop(user_id, None)
+        for key in [key for key in self._results if key[0] == user_id]: del self._results[key]
+
+    def _series_for(self, user_id, start_date, end_date):
+        """Returns the user's series between two dates, reading only the days not cached yet."""
+        series = self._series.get(user_id)
+        if series is None:
+            series = load_daily_series(self.repo, user_id, start_date, end_date)
+            self._dirty.pop(user_id, None)
+        else:
+            dirty = self._dirty.pop(user_id, None)
+            if dirty:
+                fresh = load_daily_series(self.repo, user_id, min(dirty), max(dirty))
+                fresh = fresh.loc[series.index[0]:series.index[-1]]
+                series.loc[fresh.index] = fresh
+            first, last = series.index[0].date(), series.index[-1].date()
+            parts = [series]
+            if date.fromisoformat(start_date) < first:
+                parts.insert(0, load_daily_series(self.repo, user_id, start_date, (first - timedelta(days=1)).isoformat()))
+            if date.fromisoformat(end_date) > last:
+                parts.append(load_daily_series(self.repo, user_id, (last + timedelta(days=1)).isoformat(), end_date))
+            if len(parts) > 1: series = pd.concat(parts)
+        self._series[user_id] = series
+        self._series.move_to_end(user_id)
+        while len(self._series) > self._series_cache_size: self._drop(next(iter(self._series)))
+        return series.loc[start_date:end_date]
@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import json
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from instrumentation import DEFAULT_SLOW_QUERY_MS, get_metrics
+from planner import DEFAULT_MAX_ITEMS
+from tracker_core import FoodNotFoundError, RecipeNotFoundError, TrackerCore
+
+# Server settings
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_DB_WORKERS = 8
+MAX_BODY_BYTES = 64 * 1024
+MAX_RESULT_LIMIT = 500
+MAX_PLAN_ITEMS = 10
+
+LOG_COLUMNS = ('log_id', 'entry_date', 'quantity', 'food_name', 'calories', 'protein_g', 'carbs_g', 'fat_g')
+
+
+class ApiError(Exception):
+    """An error reported to the client with an HTTP status and a JSON message."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class TrackerServer:
+    """
+    A local HTTP/JSON service exposing the tracker core to many concurrent users.
+
+    Connections are handled by asyncio, with HTTP/1.1 keep-alive so a client can
+    reuse one connection for many requests. The core's blocking database calls
+    run on a fixed pool of threads; each thread keeps its own repository
+    connection, so connections are reused across requests instead of opened per
+    call. Per-user search indexes and summaries are cached by the core, for a
+    bounded number of recently active users.
+
+    Routes (all responses are JSON):
+        GET  /health
+        GET  /metrics            (404 unless the server was started with --metrics)
+        GET  /users/<id>/summary[?date=YYYY-MM-DD]
+        GET  /users/<id>/nutrients[?date=YYYY-MM-DD]
+        GET  /users/<id>/log[?date=YYYY-MM-DD&after=<log_id>]
+        GET  /users/<id>/foods?q=<prefix>[&limit=<n>]
+        GET  /users/<id>/foods/search?q=<text>[&limit=<n>]
+        GET  /users/<id>/plan[?date=YYYY-MM-DD&items=<n>]
+        GET  /users/<id>/recipes[?q=<prefix>&limit=<n>]
+        GET  /users/<id>/recipe?name=<recipe name>
+        POST /users/<id>/log    {"food_name": ..., "quantity": ..., "date": ...}
+        POST /users/<id>/foods  {"food_name": ..., "calories": ..., "protein_g": ...,
+                                 "carbs_g": ..., "fat_g": ..., "log": true, "date": ...}
+        POST /users/<id>/meals  {"foods": [{"food_name": ..., "quantity": ...}, ...],
+                                 "recipes": [{"recipe_name": ..., "servings": ...}, ...], "date": ...}
+
+    Attributes:
+        core (TrackerCore): The core that serves every request.
+        host (str): The interface to listen on.
+        port (int): The port to listen on.
+    """
+    def __init__(self, core=None, host=DEFAULT_HOST, port=DEFAULT_PORT, db_workers=DEFAULT_DB_WORKERS):
+        self.core = core or TrackerCore()
+        self.host = host; self.port = port
+        self._executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix='api-db')
+        self._routes = [
+            ('GET', re.compile(r'/health'), self.health),
+            ('GET', re.compile(r'/metrics'), self.metrics),
+            ('GET', re.compile(r'/users/(\d+)/summary'), self.get_summary),
+            ('GET', re.compile(r'/users/(\d+)/nutrients'), self.get_nutrients),
+            ('GET', re.compile(r'/users/(\d+)/log'), self.get_log),
+            ('GET', re.compile(r'/users/(\d+)/foods'), self.search_foods),
+            ('GET', re.compile(r'/users/(\d+)/foods/search'), self.find_foods),
+            ('GET', re.compile(r'/users/(\d+)/plan'), self.plan_day),
+            ('GET', re.compile(r'/users/(\d+)/recipes'), self.search_recipes),
+            ('GET', re.compile(r'/users/(\d+)/recipe'), self.get_recipe),
+            ('POST', re.compile(r'/users/(\d+)/log'), self.log_food),
+            ('POST', re.compile(r'/users/(\d+)/foods'), self.add_food),
+            ('POST', re.compile(r'/users/(\d+)/meals'), self.log_meal),
+        ]
+
+    async def serve(self):
+        """Listens for connections until cancelled."""
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        print(f"Calorie tracker API listening on http://{self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def handle_connection(self, reader, writer):
+        """Reads requests from one connection and answers them in order until the client closes it."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line: break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''): break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    status, payload = HTTPStatus.BAD_REQUEST, {'error': "Content-Length must be a non-negative integer."}
+                    keep_alive = False
+                elif length > MAX_BODY_BYTES:
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "Request body too large."}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self.dispatch(method, target, body)
+                    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                data = json.dumps(payload).encode()
+                writer.write((f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                              f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode() + data)
+                await writer.drain()
+                if not keep_alive: break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, body):
+        """Routes one request to its handler and returns the (status, payload) to send."""
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path_matched = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.fullmatch(url.path)
+            if not match: continue
+            path_matched = True
+            if route_method != method: continue
+            try:
+                data = json.loads(body) if body else {}
+                if not isinstance(data, dict): raise ApiError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object.")
+                return await handler(*(int(group) for group in match.groups()), query=query, data=data)
+            except ApiError as e:
+                return e.status, {'error': str(e)}
+            except json.JSONDecodeError:
+                return HTTPStatus.BAD_REQUEST, {'error': "Request body is not valid JSON."}
+            except Exception as e:
+                return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+        if path_matched: return HTTPStatus.METHOD_NOT_ALLOWED, {'error': f"{method} is not allowed here."}
+        return HTTPStatus.NOT_FOUND, {'error': f"No route for {url.path}."}
+
+    async def run_db(self, func, *args, **kwargs):
+        """Runs a blocking core call on the database thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    # --- Handlers ---
+
+    async def health(self, query, data):
+        return HTTPStatus.OK, {'status': 'ok'}
+
+    async def metrics(self, query, data):
+        if not get_metrics().enabled: raise ApiError(HTTPStatus.NOT_FOUND, "Metrics are not enabled.")
+        return HTTPStatus.OK, get_metrics().snapshot()
+
+    async def get_summary(self, user_id, query, data):
+        calorie_goal, calories, protein_g, carbs_g, fat_g = await self.run_db(self.core.get_summary, user_id, _date(query, 'date'))
+        return HTTPStatus.OK, {'user_id': user_id, 'calorie_goal': calorie_goal, 'calories': calories,
+                               'protein_g': protein_g, 'carbs_g': carbs_g, 'fat_g': fat_g}
+
+    async def get_nutrients(self, user_id, query, data):
+        nutrients = await self.run_db(self.core.get_nutrient_totals, user_id, _date(query, 'date'))
+        return HTTPStatus.OK, {'user_id': user_id, 'nutrients': nutrients}
+
+    async def get_log(self, user_id, query, data):
+        after_log_id = _int_param(query, 'after', 0, minimum=0)
+        rows = await self.run_db(self.core.get_log, user_id, _date(query, 'date'), after_log_id=after_log_id)
+        return HTTPStatus.OK, {'user_id': user_id, 'entries': [dict(zip(LOG_COLUMNS, row)) for row in rows]}
+
+    async def search_foods(self, user_id, query, data):
+        limit = _int_param(query, 'limit', 50, minimum=1, maximum=MAX_RESULT_LIMIT)
+        names = await self.run_db(self.core.search_foods, user_id, query.get('q', ''), limit=limit)
+        return HTTPStatus.OK, {'user_id': user_id, 'foods': names}
+
+    async def find_foods(self, user_id, query, data):
+        limit = _int_param(query, 'limit', 50, minimum=1, maximum=MAX_RESULT_LIMIT)
+        names = await self.run_db(self.core.find_foods, user_id, query.get('q', ''), limit=limit)
+        return HTTPStatus.OK, {'user_id': user_id, 'foods': names}
+
+    async def plan_day(self, user_id, query, data):
+        max_items = _int_param(query, 'items', DEFAULT_MAX_ITEMS, minimum=1, maximum=MAX_PLAN_ITEMS)
+        plan = await self.run_db(self.core.plan_day, user_id, max_items=max_items, entry_date=_date(query, 'date'))
+        return HTTPStatus.OK, {'user_id': user_id, 'remaining': plan.remaining, 'totals': plan.totals,
+                               'items': [{'food_name': name, 'quantity': quantity, **scaled} for name, quantity, scaled in plan.items]}
+
+    async def log_food(self, user_id, query, data):
+        food_name = _required(data, 'food_name', str)
+        quantity = _number(data.get('quantity', 1), 'quantity')
+        try:
+            log_id = await self.run_db(self.core.log_food, user_id, food_name, quantity, entry_date=_date(data, 'date'))
+        except FoodNotFoundError:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Food '{food_name}' is not in the library.")
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        return HTTPStatus.CREATED, {'log_id': log_id}
+
+    async def log_meal(self, user_id, query, data):
+        foods, recipes = data.get('foods', []), data.get('recipes', [])
+        if not isinstance(foods, list) or not isinstance(recipes, list) or not all(isinstance(item, dict) for item in foods + recipes):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "'foods' and 'recipes' must be lists of objects.")
+        foods = [(_required(item, 'food_name', str), _number(item.get('quantity', 1), 'quantity')) for item in foods]
+        recipes = [(_required(item, 'recipe_name', str), _number(item.get('servings', 1), 'servings')) for item in recipes]
+        if not foods and not recipes: raise ApiError(HTTPStatus.BAD_REQUEST, "Nothing to log.")
+        try:
+            log_ids = await self.run_db(self.core.log_meal, user_id, foods, recipes, entry_date=_date(data, 'date'))
+        except FoodNotFoundError as e:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Food '{e}' is not in the library.")
+        except RecipeNotFoundError as e:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Recipe '{e}' does not exist.")
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        return HTTPStatus.CREATED, {'log_ids': log_ids}
+
+    async def search_recipes(self, user_id, query, data):
+        limit = _int_param(query, 'limit', 50, minimum=1, maximum=MAX_RESULT_LIMIT)
+        names = await self.run_db(self.core.search_recipes, user_id, query.get('q', ''), limit=limit)
+        return HTTPStatus.OK, {'user_id': user_id, 'recipes': names}
+
+    async def get_recipe(self, user_id, query, data):
+        name = _required(query, 'name', str)
+        try:
+            recipe = await self.run_db(self.core.get_recipe, user_id, name)
+        except RecipeNotFoundError:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Recipe '{name}' does not exist.")
+        nutrition = recipe.pop('nutrition')
+        recipe['ingredients'] = [dict(zip(('ingredient', 'amount', 'unit', 'food_name'), row)) for row in recipe['ingredients']]
+        return HTTPStatus.OK, {'user_id': user_id, **recipe, 'per_serving': nutrition.macros, 'nutrients': nutrition.nutrients,
+                               'matched_ingredients': nutrition.matched_ingredients, 'total_ingredients': nutrition.total_ingredients}
+
+    async def add_food(self, user_id, query, data):
+        food_name = _required(data, 'food_name', str)
+        calories = _number(_required(data, 'calories', (int, float)), 'calories', allow_zero=True)
+        macros = [_number(data.get(key, 0), key, allow_zero=True) for key in ('protein_g', 'carbs_g', 'fat_g')]
+        log = data.get('log', True)
+        if not isinstance(log, bool): raise ApiError(HTTPStatus.BAD_REQUEST, "'log' must be true or false.")
+        log_id = await self.run_db(self.core.add_food, user_id, food_name, calories, *macros,
+                                   log=log, entry_date=_date(data, 'date'))
+        return HTTPStatus.CREATED, {'food_name': food_name, 'log_id': log_id}
+
+
+def _int_param(query, name, default, minimum=None, maximum=None):
+    """Reads an integer query parameter clamped to [minimum, maximum], raising ApiError if it is malformed."""
+    try:
+        value = int(query.get(name, default))
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' must be an integer.")
+    if minimum is not None: value = max(value, minimum)
+    if maximum is not None: value = min(value, maximum)
+    return value
+
+def _date(data, name):
+    """Returns an optional ISO date field (YYYY-MM-DD) in canonical form, raising ApiError if it is malformed."""
+    value = data.get(name)
+    if value is None: return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' must be a date as YYYY-MM-DD.")
+
+def _required(data, name, types):
+    """Returns a required JSON field, raising ApiError if it is missing or has the wrong type."""
+    value = data.get(name)
+    if value is None or value == '' or not isinstance(value, types) or isinstance(value, bool):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' is required.")
+    return value
+
+def _number(value, name, allow_zero=False):
+    """Returns a finite, positive (or, with `allow_zero`, non-negative) JSON number as a float, raising ApiError for anything else."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' must be a number.")
+    if value < 0 or (value == 0 and not allow_zero):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' must be {'zero or more' if allow_zero else 'greater than zero'}.")
+    return float(value)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the calorie tracker as a local JSON API.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="interface to listen on (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="port to listen on (default: %(default)s)")
+    parser.add_argument('--db-workers', type=int, default=DEFAULT_DB_WORKERS, help="database threads (default: %(default)s)")
+    parser.add_argument('--metrics', metavar='FILE', help="record latency metrics, served at /metrics and written to FILE on exit")
+    parser.add_argument('--slow-query-ms', type=float, default=DEFAULT_SLOW_QUERY_MS,
+                        help="log database calls slower than this with their SQL (default: %(default)s)")
+    args = parser.parse_args()
+    if args.metrics: get_metrics().enable(args.metrics, args.slow_query_ms)
+    try:
+        asyncio.run(TrackerServer(host=args.host, port=args.port, db_workers=args.db_workers).serve())
+    except KeyboardInterrupt:
+        pass
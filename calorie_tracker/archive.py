@@ -0,0 +1,246 @@
+import argparse
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from database_setup import LOG_ENTRIES_SELECT, LOG_ENTRIES_VIEW
+from repository import Repository
+
+# Define file paths
+DB_FILE = 'calorie_tracker.db'
+
+# Archive settings
+ARCHIVE_BATCH_ROWS = 5000
+ARCHIVE_SCHEMA = 'archive'
+
+# The tables of an archive file mirror the normalized food_log and the food versions its entries reference
+ARCHIVE_TABLES = (
+    '''CREATE TABLE IF NOT EXISTS food_log (
+           log_id INTEGER PRIMARY KEY,
+           user_id INTEGER NOT NULL,
+           entry_date TEXT NOT NULL,
+           quantity REAL NOT NULL,
+           version_id INTEGER NOT NULL
+       )''',
+    'CREATE INDEX IF NOT EXISTS idx_food_log_user_date_log ON food_log (user_id, entry_date, log_id)',
+    '''CREATE TABLE IF NOT EXISTS food_versions (
+           version_id INTEGER PRIMARY KEY,
+           food_id INTEGER,
+           food_name TEXT NOT NULL,
+           calories REAL NOT NULL,
+           protein_g REAL NOT NULL,
+           carbs_g REAL NOT NULL,
+           fat_g REAL NOT NULL
+       )''',
+    f'CREATE VIEW IF NOT EXISTS {LOG_ENTRIES_VIEW} AS {LOG_ENTRIES_SELECT}',
+)
+
+# One batch: a user's oldest hot entries in the period, up to and including a bound (entry_date, log_id)
+_BATCH_RANGE = 'user_id = :user_id AND entry_date >= :start_date AND (entry_date, log_id) <= (:bound_date, :bound_id)'
+SELECT_BATCH_BOUND = '''SELECT entry_date, log_id FROM main.food_log WHERE user_id = :user_id AND entry_date BETWEEN :start_date AND :end_date
+                        ORDER BY entry_date, log_id LIMIT 1 OFFSET :offset'''
+SELECT_LAST_ENTRY = '''SELECT entry_date, log_id FROM main.food_log WHERE user_id = :user_id AND entry_date BETWEEN :start_date AND :end_date
+                       ORDER BY entry_date DESC, log_id DESC LIMIT 1'''
+COPY_BATCH_VERSIONS = f'''INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.food_versions (version_id, food_id, food_name, calories, protein_g, carbs_g, fat_g)
+                          SELECT version_id, food_id, food_name, calories, protein_g, carbs_g, fat_g FROM main.food_versions WHERE version_id IN (SELECT version_id FROM main.food_log WHERE {_BATCH_RANGE})'''
+COPY_BATCH_ENTRIES = f'''INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.food_log (log_id, user_id, entry_date, quantity, version_id)
+                         SELECT log_id, user_id, entry_date, quantity, version_id FROM main.food_log WHERE {_BATCH_RANGE}'''
+# Only entries whose archived copy is identical are deleted; one changed after it was copied stays for the next run
+DELETE_BATCH_ENTRIES = f'''DELETE FROM main.food_log WHERE {_BATCH_RANGE} AND EXISTS (
+                               SELECT 1 FROM {ARCHIVE_SCHEMA}.food_log AS a WHERE a.log_id = food_log.log_id AND a.user_id = food_log.user_id
+                               AND a.entry_date = food_log.entry_date AND a.quantity = food_log.quantity AND a.version_id = food_log.version_id)'''
+
+
+@dataclass
+class ArchiveReport:
+    """
+    Counts the entries moved while archiving one period.
+
+    Attributes:
+        period (str): The archived period, a year such as '2023'.
+        file_name (str): The archive database file, next to the main database.
+        rows_archived (int): Entries moved out of the main database by this run.
+        batches (int): The copy-and-delete batches the entries were moved in.
+        seconds (float): Wall-clock time spent on the period.
+        completed (bool): True if no entries of the period are left in the main database.
+    """
+    period: str
+    file_name: str
+    rows_archived: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    completed: bool = False
+
+    def __str__(self):
+        state = 'complete' if self.completed else 'incomplete, run again to finish'
+        return f"{self.period}: {self.rows_archived} entries moved to '{self.file_name}' in {self.batches} batches, {self.seconds:.2f}s ({state})."
+
+
+def archive_file_name(db_file, period):
+    """Returns the name of the archive file for a period, such as 'calorie_tracker_archive_2023.db'."""
+    return f'{os.path.splitext(os.path.basename(db_file))[0]}_archive_{period}.db'
+
+def create_archive(path):
+    """Creates an archive database file, or completes the schema of an existing one."""
+    archive = sqlite3.connect(path, isolation_level=None)
+    try:
+        archive.execute('PRAGMA journal_mode = WAL')
+        for statement in ARCHIVE_TABLES:
+            archive.execute(statement)
+    finally:
+        archive.close()
+
+def closed_years(conn, before_year):
+    """Returns the years before `before_year` that still have entries in the main database, oldest first."""
+    return [row[0] for row in conn.execute(
+        'SELECT DISTINCT substr(entry_date, 1, 4) FROM food_log WHERE entry_date < ? ORDER BY 1', (f'{before_year:04d}-01-01',))]
+
+def _move_batch(repo, conn, params):
+    """
+    Moves one batch of entries to the attached archive in two short transactions and returns the number moved.
+
+    The copy only reads the main database, so it takes no write lock there. The
+    delete then runs in its own immediate transaction with the archive_state
+    flag set, so daily_totals and the library's log counts keep the moved
+    entries, and records the archive's log_id bounds in the same commit. If the
+    job stops between the two, the entries are left in both stores until the
+    next run, and readers see them once.
+    """
+    conn.execute('BEGIN')
+    try:
+        conn.execute(COPY_BATCH_VERSIONS, params)
+        conn.execute(COPY_BATCH_ENTRIES, params)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    with repo.transaction():
+        conn.execute('UPDATE archive_state SET moving = 1')
+        moved = conn.execute(DELETE_BATCH_ENTRIES, params).rowcount
+        conn.execute('UPDATE archive_state SET moving = 0')
+        conn.execute(f'''UPDATE log_archives SET rows_archived = rows_archived + :moved,
+                                min_log_id = (SELECT MIN(log_id) FROM {ARCHIVE_SCHEMA}.food_log),
+                                max_log_id = (SELECT MAX(log_id) FROM {ARCHIVE_SCHEMA}.food_log)
+                         WHERE period = :period''', {**params, 'moved': moved})
+    return moved
+
+def archive_period(repo, period, start_date, end_date, batch_rows=ARCHIVE_BATCH_ROWS):
+    """
+    Moves a closed period's food_log entries from the main database into its archive file.
+
+    The archive is registered in 'log_archives' before any entry moves, so
+    reads of the period span both stores while the job runs. Each user's
+    entries are moved oldest first in batches of `batch_rows`, and each batch
+    holds the main database's write lock only for its delete, so logging
+    carries on between batches. Running the job again moves whatever is left,
+    such as entries logged into the period since, or a batch interrupted by a
+    crash.
+
+    Returns:
+        ArchiveReport: The entries moved and the time taken.
+    """
+    conn = repo.connection()
+    file_name = archive_file_name(repo.db_file, period)
+    report = ArchiveReport(period, file_name)
+    start = time.perf_counter()
+    path = os.path.join(os.path.dirname(os.path.abspath(repo.db_file)), file_name)
+    create_archive(path)
+    with repo.transaction():
+        conn.execute('INSERT OR IGNORE INTO log_archives (period, start_date, end_date, file_name) VALUES (?, ?, ?, ?)',
+                     (period, start_date, end_date, file_name))
+    conn.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (path,))
+    try:
+        report.completed = True
+        users = [row[0] for row in conn.execute('SELECT DISTINCT user_id FROM daily_totals WHERE entry_date BETWEEN ? AND ?', (start_date, end_date))]
+        for user_id in users:
+            params = {'user_id': user_id, 'start_date': start_date, 'end_date': end_date, 'offset': batch_rows - 1, 'period': period}
+            while bound := (conn.execute(SELECT_BATCH_BOUND, params).fetchone() or conn.execute(SELECT_LAST_ENTRY, params).fetchone()):
+                moved = _move_batch(repo, conn, {**params, 'bound_date': bound[0], 'bound_id': bound[1]})
+                report.rows_archived += moved; report.batches += 1
+                if not moved:
+                    report.completed = False; break
+        if report.completed:
+            with repo.transaction():
+                conn.execute('UPDATE log_archives SET completed_at = ? WHERE period = ?', (datetime.now().isoformat(timespec='seconds'), period))
+    finally:
+        conn.execute(f'DETACH DATABASE {ARCHIVE_SCHEMA}')
+    report.seconds = time.perf_counter() - start
+    return report
+
+def export_parquet(archive_path, parquet_path):
+    """
+    Writes an archive's entries, in the food_log_entries layout, to a Parquet file for analytics.
+
+    Food names are stored as a dictionary-encoded category, so the file stays
+    compact. Writing Parquet needs pyarrow (or fastparquet) besides pandas.
+
+    Returns:
+        int: The number of entries written.
+    """
+    import pandas as pd
+    archive = sqlite3.connect(archive_path)
+    try:
+        frame = pd.read_sql_query(f'''SELECT log_id, user_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g
+                                      FROM {LOG_ENTRIES_VIEW} ORDER BY user_id, entry_date, log_id''', archive)
+    finally:
+        archive.close()
+    frame['entry_date'] = pd.to_datetime(frame['entry_date'])
+    frame['food_name'] = frame['food_name'].astype('category')
+    frame.to_parquet(parquet_path, index=False)
+    return len(frame)
+
+def archive_food_log(db_file=DB_FILE, before_year=None, batch_rows=ARCHIVE_BATCH_ROWS, vacuum=False, export_dir=None):
+    """
+    Archives the food_log entries of every closed year into one archive file per year.
+
+    A year is closed once it is before `before_year`, which defaults to the
+    current year and cannot be later. A report is printed for every year
+    archived.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+        before_year (int | None): Archive the years before this one.
+        batch_rows (int): The number of entries moved per batch.
+        vacuum (bool): Run VACUUM afterwards to return the freed pages to the
+            file system. It holds the write lock for the whole rebuild.
+        export_dir (str | None): Also export every completed archive to a
+            Parquet file of the same name in this directory.
+
+    Returns:
+        list[ArchiveReport]: One report per year that was processed.
+    """
+    current_year = date.today().year
+    if before_year is None: before_year = current_year
+    if before_year > current_year: raise ValueError(f"Only closed years can be archived; {current_year} is still open.")
+    repo = Repository(db_file)
+    reports = []
+    try:
+        conn = repo.connection()
+        for year in closed_years(conn, before_year):
+            report = archive_period(repo, year, f'{year}-01-01', f'{year}-12-31', batch_rows)
+            print(report); reports.append(report)
+        if vacuum: conn.execute('VACUUM')
+        if export_dir:
+            os.makedirs(export_dir, exist_ok=True)
+            directory = os.path.dirname(os.path.abspath(db_file))
+            for (file_name,) in conn.execute('SELECT file_name FROM log_archives WHERE completed_at IS NOT NULL ORDER BY period').fetchall():
+                parquet_path = os.path.join(export_dir, os.path.splitext(file_name)[0] + '.parquet')
+                rows = export_parquet(os.path.join(directory, file_name), parquet_path)
+                print(f"Exported {rows} entries to '{parquet_path}'.")
+    finally:
+        repo.close()
+    return reports
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move the food_log entries of closed years into per-year archive files.")
+    parser.add_argument('--before', type=int, metavar='YEAR', help="archive the years before this one (default: the current year)")
+    parser.add_argument('--batch-rows', type=int, default=ARCHIVE_BATCH_ROWS, help="entries moved per batch")
+    parser.add_argument('--vacuum', action='store_true', help="VACUUM the main database afterwards to shrink the file")
+    parser.add_argument('--export', metavar='DIR', help="also export completed archives to Parquet files in DIR (needs pyarrow)")
+    args = parser.parse_args()
+    try:
+        archive_food_log(before_year=args.before, batch_rows=args.batch_rows, vacuum=args.vacuum, export_dir=args.export)
+    except (ValueError, ImportError) as e:
+        parser.exit(1, f"Error: {e}\n")
@@ -0,0 +1,12 @@
+"""
+Benchmarks for the calorie tracker's hot paths.
+
+`generate_data` builds synthetic calorie_tracker.db files at a configurable
+scale, and `run_benchmarks` times the queries behind the UI against such a file
+and writes the timings as JSON, optionally comparing them with an earlier run.
+Run both from the calorie_tracker directory:
+
+    python -m benchmarks.generate_data bench.db --foods 100000 --log-rows 10000000
+    python -m benchmarks.run_benchmarks bench.db --output results.json
+    python -m benchmarks.run_benchmarks bench.db --compare results.json
+"""
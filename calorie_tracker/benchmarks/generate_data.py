@@ -0,0 +1,103 @@
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from database_setup import migrate
+
+# Default scale
+DEFAULT_FOODS = 100_000
+DEFAULT_LOG_ROWS = 10_000_000
+DEFAULT_USERS = 1_000
+DEFAULT_YEARS = 5
+BATCH_SIZE = 50_000
+
+_WORDS = ('rice', 'dal', 'paneer', 'chicken', 'masala', 'curry', 'roti', 'naan', 'tikka', 'butter', 'aloo', 'gobi',
+          'palak', 'chana', 'rajma', 'egg', 'fish', 'mutton', 'idli', 'dosa', 'sambar', 'upma', 'poha', 'halwa',
+          'kheer', 'lassi', 'chai', 'coffee', 'salad', 'soup', 'biryani', 'pulao', 'khichdi', 'paratha', 'raita', 'pakora')
+
+
+def food_name(i):
+    """Returns a unique, pronounceable synthetic food name for index `i`."""
+    rng = random.Random(i)
+    return f"{rng.choice(_WORDS).title()} {rng.choice(_WORDS)} {rng.choice(_WORDS)} #{i}"
+
+def _batched(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch; batch = []
+    if batch: yield batch
+
+def generate_database(db_file, foods=DEFAULT_FOODS, log_rows=DEFAULT_LOG_ROWS, users=DEFAULT_USERS, years=DEFAULT_YEARS, seed=0, end_date=None):
+    """
+    Creates a synthetic calorie tracker database at the given scale.
+
+    The food library is shared by user 1 (the user the app and the benchmarks
+    search), and log entries are spread uniformly over `users` users and the
+    `years` years ending on `end_date`. Rows are bulk-inserted right after the
+    base tables are created; the remaining migrations then build the indexes
+    and the daily_totals table in one pass each, which is much faster than
+    maintaining them row by row.
+
+    Args:
+        db_file (str): Path of the database to create. It must not exist yet.
+        foods (int): Number of food_library rows.
+        log_rows (int): Number of food_log rows.
+        users (int): Number of users.
+        years (int): Number of years of history.
+        seed (int): Random seed, so the same arguments produce the same data.
+        end_date (date | None): The last logged day. Defaults to today.
+
+    Returns:
+        dict: The scale parameters and the time taken, in seconds.
+    """
+    if os.path.exists(db_file): raise FileExistsError(f"'{db_file}' already exists.")
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    days = max(1, int(years * 365.25))
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_file)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF'); conn.execute('PRAGMA synchronous = OFF')
+        migrate(conn, target_version=1)
+
+        conn.execute('BEGIN')
+        conn.executemany('INSERT OR IGNORE INTO users (user_id, username, daily_calorie_goal, daily_protein_goal, daily_carbs_goal, daily_fat_goal) VALUES (?, ?, ?, ?, ?, ?)',
+                         ((u, f'user_{u}', rng.randrange(1500, 3001, 100), rng.randrange(50, 151, 5), rng.randrange(150, 351, 10), rng.randrange(40, 101, 5))
+                          for u in range(1, users + 1)))
+        library = [(food_name(i), rng.uniform(20, 600), rng.uniform(0, 40), rng.uniform(0, 80), rng.uniform(0, 30)) for i in range(foods)]
+        for batch in _batched((1, *food) for food in library):
+            conn.executemany('INSERT INTO food_library (user_id, food_name, calories, protein_g, carbs_g, fat_g) VALUES (?, ?, ?, ?, ?, ?)', batch)
+
+        def log_entries():
+            for _ in range(log_rows):
+                name, cal, pro, carb, fat = library[rng.randrange(foods)]
+                quantity = rng.choice((0.5, 1.0, 1.0, 1.0, 1.5, 2.0, 3.0))
+                entry_date = (end_date - timedelta(days=rng.randrange(days))).isoformat()
+                yield (rng.randint(1, users), entry_date, quantity, name, cal * quantity, pro * quantity, carb * quantity, fat * quantity)
+        for batch in _batched(log_entries()):
+            conn.executemany('INSERT INTO food_log (user_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+        conn.commit()
+
+        migrate(conn)
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    return {'foods': foods, 'log_rows': log_rows, 'users': users, 'years': years, 'seed': seed,
+            'end_date': end_date.isoformat(), 'seconds': round(time.perf_counter() - start, 3)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic calorie tracker database for benchmarking.")
+    parser.add_argument('db_file', help="path of the database to create")
+    parser.add_argument('--foods', type=int, default=DEFAULT_FOODS, help="food_library rows (default: %(default)s)")
+    parser.add_argument('--log-rows', type=int, default=DEFAULT_LOG_ROWS, help="food_log rows (default: %(default)s)")
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS, help="users (default: %(default)s)")
+    parser.add_argument('--years', type=float, default=DEFAULT_YEARS, help="years of history (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: %(default)s)")
+    args = parser.parse_args()
+    stats = generate_database(args.db_file, args.foods, args.log_rows, args.users, args.years, args.seed)
+    print(f"Generated {args.db_file}: {stats['foods']} foods, {stats['log_rows']} log rows, {stats['users']} users in {stats['seconds']}s.")
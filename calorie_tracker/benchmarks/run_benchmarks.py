@@ -0,0 +1,168 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import import_data
+from database_setup import LOG_ENTRIES_VIEW
+from repository import Repository
+from tracker_core import TrackerCore
+
+# Benchmark settings
+DEFAULT_ITERATIONS = 200
+DEFAULT_THRESHOLD = 0.20
+
+# The aggregate SummaryFrame.update_summary ran over food_log before daily_totals existed
+SUMMARY_AGGREGATE = f'SELECT SUM(calories), SUM(protein_g), SUM(carbs_g), SUM(fat_g) FROM {LOG_ENTRIES_VIEW} WHERE user_id = ? AND entry_date = ?'
+
+
+def time_calls(func, calls):
+    """
+    Times `func(*args)` for each argument tuple in `calls`.
+
+    Returns:
+        dict: The number of calls and the mean, median, 95th percentile, minimum
+        and maximum latency in milliseconds.
+    """
+    samples = []
+    for args in calls:
+        start = time.perf_counter_ns()
+        func(*args)
+        samples.append((time.perf_counter_ns() - start) / 1e6)
+    samples.sort()
+    return {'n': len(samples), 'mean_ms': round(statistics.fmean(samples), 4), 'p50_ms': round(statistics.median(samples), 4),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+            'min_ms': round(samples[0], 4), 'max_ms': round(samples[-1], 4)}
+
+def _drop_letter(rng, word):
+    """Returns `word` with one random letter removed, as a typo."""
+    i = rng.randrange(len(word))
+    return word[:i] + word[i + 1:]
+
+def benchmark_import():
+    """Times import_data.populate_food_library into an empty scratch database, reporting rows per second."""
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            reports = import_data.populate_food_library(db_file=os.path.join(tmp, 'import.db'))
+        seconds = time.perf_counter() - start
+    rows = sum(report.rows for report in reports)
+    return {'n': 1, 'mean_ms': round(seconds * 1000, 4), 'p50_ms': round(seconds * 1000, 4), 'rows': rows,
+            'rows_per_second': round(rows / seconds, 1) if seconds else 0.0}
+
+def run_benchmarks(db_file, iterations=DEFAULT_ITERATIONS, seed=0, include_import=True):
+    """
+    Times the tracker's hot paths against a database.
+
+    - search_sql: the prefix LIKE query DataEntryFrame.update_search_results used to run.
+    - search_index: the in-memory prefix index the search box shows first.
+    - search_ranked: the FTS5 search the search box then shows, ranked by bm25.
+    - search_fuzzy: the same search with one letter of each word dropped, which
+      falls back to the trigram index.
+    - summary_aggregate: the SUM over the day's log entries SummaryFrame.update_summary used to run.
+    - summary: the daily_totals lookup behind the summary today.
+    - load_log: the day query behind DailyLogFrame.load_log.
+    - insert: logging a library food, as DataEntryFrame.add_selected_food does.
+      Foods are logged for user 1, who owns the library; the inserted entries are deleted afterwards, so runs are repeatable.
+    - import: import_data.populate_food_library into an empty scratch database.
+
+    Users, dates and prefixes are sampled with a seeded random generator, so two
+    runs against the same database time the same calls.
+
+    Returns:
+        dict: {'meta': {...}, 'results': {name: timings}}, ready to dump as JSON.
+    """
+    rng = random.Random(seed)
+    repo = Repository(db_file); core = TrackerCore(repo)
+    try:
+        conn = repo.connection()
+        min_user, max_user = conn.execute('SELECT MIN(user_id), MAX(user_id) FROM users').fetchone()
+        first_date, last_date = conn.execute('SELECT MIN(entry_date), MAX(entry_date) FROM food_log').fetchone()
+        dates = [row[0] for row in conn.execute('SELECT DISTINCT entry_date FROM daily_totals WHERE user_id = ?', (min_user,))] or [last_date]
+        names = repo.get_food_names(1)
+        if not names: raise ValueError(f"'{db_file}' has no foods for user 1 to search.")
+
+        days = [(rng.randint(min_user, max_user), rng.choice(dates)) for _ in range(iterations)]
+        prefixes = [(rng.choice(names)[:rng.randint(1, 4)],) for _ in range(iterations)]
+        index = core.get_search_index(1)
+        queries = [(' '.join(word[:rng.randint(2, 6)] for word in rng.choice(names).split()[:2]),) for _ in range(iterations)]
+        typos = [(' '.join(_drop_letter(rng, word) for word in text.split()),) for text, in queries]
+
+        results = {
+            'search_sql': time_calls(lambda prefix: repo.search_food_names(1, prefix), prefixes),
+            'search_index': time_calls(lambda prefix: index.search(prefix), prefixes),
+            'search_ranked': time_calls(lambda text: core.find_foods(1, text), queries),
+            'search_fuzzy': time_calls(lambda text: core.find_foods(1, text), typos),
+            'summary_aggregate': time_calls(lambda user_id, day: conn.execute(SUMMARY_AGGREGATE, (user_id, day)).fetchone(), days),
+            'summary': time_calls(repo.get_daily_summary, days),
+            'load_log': time_calls(repo.get_daily_log, days),
+        }
+        log_ids = []
+        inserts = [(1, rng.choice(names), rng.choice((0.5, 1.0, 2.0)), last_date) for _ in range(iterations)]
+        results['insert'] = time_calls(lambda *args: log_ids.append(core.log_food(*args)), inserts)
+        with repo.transaction():
+            conn.executemany('DELETE FROM food_log WHERE log_id = ?', ((log_id,) for log_id in log_ids))
+        if include_import:
+            results['import'] = benchmark_import()
+
+        food_rows, log_rows = (conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in ('food_library', 'food_log'))
+    finally:
+        repo.close()
+    meta = {'db_file': db_file, 'food_rows': food_rows, 'log_rows': log_rows, 'users': max_user - min_user + 1,
+            'date_range': [first_date, last_date], 'iterations': iterations, 'seed': seed,
+            'timestamp': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version, 'platform': platform.platform()}
+    return {'meta': meta, 'results': results}
+
+def compare_results(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares the median latency of each benchmark with a baseline run.
+
+    Returns:
+        list[dict]: One entry per benchmark present in both runs, with the baseline
+        and current p50_ms, their ratio, and whether it regressed by more than
+        `threshold` (0.2 means 20% slower).
+    """
+    comparison = []
+    for name, timings in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before or not before.get('p50_ms'): continue
+        ratio = timings['p50_ms'] / before['p50_ms']
+        comparison.append({'name': name, 'baseline_p50_ms': before['p50_ms'], 'current_p50_ms': timings['p50_ms'],
+                           'ratio': round(ratio, 3), 'regressed': ratio > 1 + threshold})
+    return comparison
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the calorie tracker's hot paths and report JSON.")
+    parser.add_argument('db_file', help="database to benchmark, e.g. one made by benchmarks.generate_data")
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS, help="calls per benchmark (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the sampled calls (default: %(default)s)")
+    parser.add_argument('--skip-import', action='store_true', help="don't time the dataset import")
+    parser.add_argument('--output', help="write the results to this JSON file instead of stdout")
+    parser.add_argument('--compare', metavar='BASELINE', help="compare with an earlier results file; exit 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="allowed p50 slowdown before a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.db_file, args.iterations, args.seed, include_import=not args.skip_import)
+    if args.compare:
+        with open(args.compare) as f:
+            report['comparison'] = compare_results(report, json.load(f), args.threshold)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2); print()
+    regressions = [entry for entry in report.get('comparison', []) if entry['regressed']]
+    for entry in regressions:
+        print(f"Regression: {entry['name']} p50 {entry['baseline_p50_ms']}ms -> {entry['current_p50_ms']}ms ({entry['ratio']}x)", file=sys.stderr)
+    if regressions:
+        raise SystemExit(1)
@@ -1,92 +1,1039 @@
+import argparse
+import os
 import sqlite3
+import statistics
+import time
+import urllib.parse
 
-def initialize_database():
-    """
-    Initializes the calorie tracker database.
-
-    This function connects to the 'calorie_tracker.db' SQLite database
-    and creates the necessary tables: 'users', 'food_log', and 'food_library'.
-    It defines the schema for each table, including column names, data types,
-    and constraints like primary keys and unique constraints.
-
-    - The 'users' table stores user information, including their ID, username,
-      and daily nutritional goals.
-    - The 'food_log' table records the food items consumed by users on specific
-      dates, including the quantity and nutritional information.
-    - The 'food_library' table serves as a repository of food items, storing
-      their nutritional details per serving.
-
-    If a default user with user_id = 1 does not exist, this function also
-    inserts a default user with a daily calorie goal of 2000 kcal.
-
-    The function handles SQLite errors by printing them to the console and ensures
-    that the database connection is closed upon completion.
-    """
-    conn = None
-    try:
-        conn = sqlite3.connect('calorie_tracker.db')
-        cursor = conn.cursor()
-
-        # Create 'users' table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                daily_calorie_goal INTEGER NOT NULL,
-                daily_protein_goal INTEGER,
-                daily_carbs_goal INTEGER,
-                daily_fat_goal INTEGER
-            )
+# Define file paths
+DB_FILE = 'calorie_tracker.db'
+
+# Compaction report settings
+REPORT_SAMPLE_DAYS = 50
+
+
+# --- MIGRATIONS ---
+
+def _create_tables(cursor):
+    """
+    Migration 1: creates the 'users', 'food_log' and 'food_library' tables.
+
+    - The 'users' table stores user information, including their ID, username,
+      and daily nutritional goals.
+    - The 'food_log' table records the food items consumed by users on specific
+      dates, including the quantity and nutritional information.
+    - The 'food_library' table serves as a repository of food items, storing
+      their nutritional details per serving.
+
+    The statements use IF NOT EXISTS so databases created before schema versioning
+    are adopted as version 1 without changes. A default user with user_id = 1 and
+    a daily calorie goal of 2000 kcal is added if one does not exist.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            daily_calorie_goal INTEGER NOT NULL,
+            daily_protein_goal INTEGER,
+            daily_carbs_goal INTEGER,
+            daily_fat_goal INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS food_log (
+            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            entry_date TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            food_name TEXT NOT NULL,
+            calories INTEGER NOT NULL,
+            protein_g REAL,
+            carbs_g REAL,
+            fat_g REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS food_library (
+            food_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            food_name TEXT NOT NULL,
+            calories INTEGER NOT NULL,
+            protein_g REAL,
+            carbs_g REAL,
+            fat_g REAL,
+            UNIQUE (user_id, food_name)
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO users (user_id, username, daily_calorie_goal)
+        VALUES (1, 'default_user', 2000)
+    ''')
+
+def _add_query_indexes(cursor):
+    """
+    Migration 2: adds indexes for the summary, daily log and food search queries.
+
+    - 'idx_food_log_user_date' leads with (user_id, entry_date), which every
+      summary and log query filters on, and also carries the four nutrient
+      columns so the daily totals are summed from the index alone.
+    - 'idx_food_library_user_name_nocase' orders names case-insensitively, which
+      lets SQLite answer `food_name LIKE 'prefix%'` with an index range search.
+    """
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_food_log_user_date ON food_log (user_id, entry_date, calories, protein_g, carbs_g, fat_g)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_food_library_user_name_nocase ON food_library (user_id, food_name COLLATE NOCASE)')
+
+# Trigger bodies that apply one food_log row to daily_totals
+_ADD_TO_DAILY_TOTALS = '''
+            INSERT INTO daily_totals (user_id, entry_date, calories, protein_g, carbs_g, fat_g, entry_count)
+            VALUES ({row}.user_id, {row}.entry_date, {row}.calories, IFNULL({row}.protein_g, 0), IFNULL({row}.carbs_g, 0), IFNULL({row}.fat_g, 0), 1)
+            ON CONFLICT (user_id, entry_date) DO UPDATE SET
+                calories = calories + excluded.calories, protein_g = protein_g + excluded.protein_g,
+                carbs_g = carbs_g + excluded.carbs_g, fat_g = fat_g + excluded.fat_g,
+                entry_count = entry_count + 1;'''
+_SUBTRACT_FROM_DAILY_TOTALS = '''
+            UPDATE daily_totals SET
+                calories = calories - {row}.calories, protein_g = protein_g - IFNULL({row}.protein_g, 0),
+                carbs_g = carbs_g - IFNULL({row}.carbs_g, 0), fat_g = fat_g - IFNULL({row}.fat_g, 0),
+                entry_count = entry_count - 1
+            WHERE user_id = {row}.user_id AND entry_date = {row}.entry_date;
+            DELETE FROM daily_totals WHERE user_id = {row}.user_id AND entry_date = {row}.entry_date AND entry_count <= 0;'''
+
+def _rebuild_daily_totals(cursor, log_table='food_log'):
+    """Recomputes every 'daily_totals' row from `log_table`, 'food_log' or (from version 9) its entries view."""
+    cursor.execute('DELETE FROM daily_totals')
+    cursor.execute(f'''
+        INSERT INTO daily_totals (user_id, entry_date, calories, protein_g, carbs_g, fat_g, entry_count)
+        SELECT user_id, entry_date, SUM(calories), TOTAL(protein_g), TOTAL(carbs_g), TOTAL(fat_g), COUNT(*)
+        FROM {log_table} GROUP BY user_id, entry_date
+    ''')
+
+def _add_daily_totals(cursor):
+    """
+    Migration 3: adds the 'daily_totals' table, kept up to date by triggers on 'food_log'.
+
+    'daily_totals' holds one row per user and date with the summed nutrients and
+    the number of log entries, so the daily summary is a primary-key lookup
+    instead of an aggregate over 'food_log'. The triggers adjust the matching row
+    on every insert, update and delete, and a row is removed once its last entry
+    is deleted. Existing log entries are aggregated into the table here.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_totals (
+            user_id INTEGER NOT NULL,
+            entry_date TEXT NOT NULL,
+            calories REAL NOT NULL DEFAULT 0,
+            protein_g REAL NOT NULL DEFAULT 0,
+            carbs_g REAL NOT NULL DEFAULT 0,
+            fat_g REAL NOT NULL DEFAULT 0,
+            entry_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, entry_date)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS food_log_totals_insert AFTER INSERT ON food_log
+        BEGIN
+            {_ADD_TO_DAILY_TOTALS.format(row='NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS food_log_totals_delete AFTER DELETE ON food_log
+        BEGIN
+            {_SUBTRACT_FROM_DAILY_TOTALS.format(row='OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS food_log_totals_update
+        AFTER UPDATE OF user_id, entry_date, calories, protein_g, carbs_g, fat_g ON food_log
+        BEGIN
+            {_SUBTRACT_FROM_DAILY_TOTALS.format(row='OLD')}
+            {_ADD_TO_DAILY_TOTALS.format(row='NEW')}
+        END
+    ''')
+    _rebuild_daily_totals(cursor)
+
+def _add_log_order_index(cursor):
+    """
+    Migration 4: adds an index on food_log (user_id, entry_date, log_id).
+
+    It returns a user's entries already ordered by date and log_id, which the
+    paged history view and the incremental "entries after log_id" refresh of the
+    daily log read without a separate sort.
+    """
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_food_log_user_date_log ON food_log (user_id, entry_date, log_id)')
+
+def _add_import_history(cursor):
+    """
+    Migration 5: adds the 'import_history' table used by import_data.py.
+
+    Each row records a dataset file imported for a user, identified by the
+    SHA-256 of its contents, so re-running an import skips files (including
+    byte-identical copies) that have already been loaded.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_history (
+            user_id INTEGER NOT NULL,
+            content_sha256 TEXT NOT NULL,
+            source_name TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            imported_at TEXT NOT NULL,
+            rows_inserted INTEGER NOT NULL,
+            rows_updated INTEGER NOT NULL,
+            rows_skipped INTEGER NOT NULL,
+            PRIMARY KEY (user_id, content_sha256)
+        )
+    ''')
+
+# The nutrients known when the 'nutrients' dictionary was introduced, as
+# (nutrient_id, name, unit). A nutrient's id fixes its position in every food's
+# nutrient vector (position = nutrient_id - 1), so ids are never reused.
+_NUTRIENT_CATALOGUE = [
+    (1, 'calories', 'kcal'), (2, 'protein_g', 'g'), (3, 'carbs_g', 'g'), (4, 'fat_g', 'g'),
+    (5, 'sugar_g', 'g'), (6, 'fiber_g', 'g'), (7, 'sodium_mg', 'mg'), (8, 'calcium_mg', 'mg'),
+    (9, 'iron_mg', 'mg'), (10, 'vitamin_c_mg', 'mg'), (11, 'folate_ug', '\u00b5g'),
+    (12, 'saturated_fat_g', 'g'), (13, 'monounsaturated_fat_g', 'g'), (14, 'polyunsaturated_fat_g', 'g'),
+    (15, 'cholesterol_mg', 'mg'), (16, 'water_g', 'g'), (17, 'ash_g', 'g'),
+    (18, 'potassium_mg', 'mg'), (19, 'magnesium_mg', 'mg'), (20, 'phosphorus_mg', 'mg'),
+    (21, 'zinc_mg', 'mg'), (22, 'copper_mg', 'mg'), (23, 'manganese_mg', 'mg'), (24, 'selenium_ug', '\u00b5g'),
+    (25, 'vitamin_a_iu', 'IU'), (26, 'vitamin_a_rae_ug', '\u00b5g'), (27, 'retinol_ug', '\u00b5g'),
+    (28, 'alpha_carotene_ug', '\u00b5g'), (29, 'beta_carotene_ug', '\u00b5g'), (30, 'beta_cryptoxanthin_ug', '\u00b5g'),
+    (31, 'lutein_zeaxanthin_ug', '\u00b5g'), (32, 'lycopene_ug', '\u00b5g'),
+    (33, 'thiamin_mg', 'mg'), (34, 'riboflavin_mg', 'mg'), (35, 'niacin_mg', 'mg'), (36, 'pantothenic_acid_mg', 'mg'),
+    (37, 'vitamin_b6_mg', 'mg'), (38, 'vitamin_b12_ug', '\u00b5g'), (39, 'choline_mg', 'mg'),
+    (40, 'vitamin_e_mg', 'mg'), (41, 'vitamin_k_ug', '\u00b5g'),
+]
+
+def _add_nutrient_vectors(cursor):
+    """
+    Migration 6: stores every nutrient of a food as a packed vector.
+
+    - 'nutrients' is the dictionary of nutrient names and units. A nutrient's id
+      gives its position in the vectors, and new nutrients are appended.
+    - 'food_library.nutrients' holds a food's values as a little-endian float32
+      blob in dictionary order, NaN where a value is unknown. Foods without a
+      vector fall back to their calorie and macro columns.
+
+    import_history is cleared so the next import_data.py run re-reads the
+    datasets and fills in the vectors of the foods already in the library.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS nutrients (
+            nutrient_id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            unit TEXT NOT NULL
+        )
+    ''')
+    cursor.executemany('INSERT OR IGNORE INTO nutrients (nutrient_id, name, unit) VALUES (?, ?, ?)', _NUTRIENT_CATALOGUE)
+    cursor.execute('ALTER TABLE food_library ADD COLUMN nutrients BLOB')
+    cursor.execute('DELETE FROM import_history')
+
+def _add_recipes(cursor):
+    """
+    Migration 7: adds recipes made of library foods, with cached per-serving nutrition.
+
+    - 'recipes' names a user's dish and how many servings its ingredients make.
+    - 'recipe_ingredients' lists each ingredient as written (with its amount and
+      unit), and the library food and number of its servings it stands for;
+      'food_name' is NULL for ingredients that are not in the library.
+    - 'recipe_nutrition' caches each recipe's per-serving nutrition. Triggers
+      delete a recipe's row whenever its ingredients, its servings, or a library
+      food it uses change, so the cache is never stale, whichever process writes.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recipes (
+            recipe_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            recipe_name TEXT NOT NULL,
+            servings REAL NOT NULL DEFAULT 1,
+            serving_size TEXT,
+            UNIQUE (user_id, recipe_name)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recipe_ingredients (
+            recipe_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            ingredient TEXT NOT NULL,
+            amount REAL,
+            unit TEXT,
+            food_name TEXT,
+            quantity REAL,
+            PRIMARY KEY (recipe_id, position)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_food ON recipe_ingredients (food_name)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recipe_nutrition (
+            recipe_id INTEGER PRIMARY KEY,
+            calories REAL NOT NULL,
+            protein_g REAL NOT NULL,
+            carbs_g REAL NOT NULL,
+            fat_g REAL NOT NULL,
+            nutrients BLOB,
+            matched_ingredients INTEGER NOT NULL,
+            total_ingredients INTEGER NOT NULL
+        )
+    ''')
+    for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS recipe_ingredients_{event.lower()}_nutrition AFTER {event} ON recipe_ingredients
+            BEGIN
+                DELETE FROM recipe_nutrition WHERE recipe_id = {row}.recipe_id;
+            END
+        ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS recipes_update_nutrition AFTER UPDATE OF servings ON recipes
+        BEGIN
+            DELETE FROM recipe_nutrition WHERE recipe_id = NEW.recipe_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS recipes_delete AFTER DELETE ON recipes
+        BEGIN
+            DELETE FROM recipe_ingredients WHERE recipe_id = OLD.recipe_id;
+            DELETE FROM recipe_nutrition WHERE recipe_id = OLD.recipe_id;
+        END
+    ''')
+    for event, row, columns in (('INSERT', 'NEW', ''), ('UPDATE', 'NEW', ' OF calories, protein_g, carbs_g, fat_g, nutrients'), ('DELETE', 'OLD', '')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS food_library_{event.lower()}_recipe_nutrition AFTER {event}{columns} ON food_library
+            BEGIN
+                DELETE FROM recipe_nutrition WHERE recipe_id IN (
+                    SELECT i.recipe_id FROM recipe_ingredients AS i JOIN recipes AS r ON r.recipe_id = i.recipe_id
+                    WHERE i.food_name = {row}.food_name AND r.user_id = {row}.user_id);
+            END
         ''')
-        print("Table 'users' is ready.")
-
-        # Create 'food_log' table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS food_log (
-                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                entry_date TEXT NOT NULL,
-                quantity REAL NOT NULL, 
-                food_name TEXT NOT NULL,
-                calories INTEGER NOT NULL,
-                protein_g REAL,
-                carbs_g REAL,
-                fat_g REAL
-            )
+
+# The FTS5 tables over food_library as (table, indexed columns, options)
+_FOOD_SEARCH_TABLES = (
+    ('food_search', 'food_name, category, aliases', "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"),
+    ('food_search_trigram', 'food_name', "tokenize = 'trigram'"),
+)
+
+def _add_food_search(cursor):
+    """
+    Migration 8: adds full-text search over the food library.
+
+    - 'food_library.category' and 'food_library.aliases' hold a food's dataset
+      category and any other names or tags it should be found by.
+    - 'food_library.log_count' counts the user's log entries of the food. Triggers
+      on 'food_log' keep it up to date so often-logged foods can rank higher.
+    - 'food_search' is an FTS5 index over the name, category and aliases,
+      tokenized into words with diacritics removed, with prefix indexes for
+      two- and three-character prefixes. 'food_search_trigram' indexes the names
+      by trigram, which still matches words typed with a typo.
+
+    Both are external-content tables that read their text from 'food_library'
+    and are kept in sync by triggers on it. import_history is cleared so the next
+    import_data.py run fills in the categories and aliases of existing foods.
+    """
+    cursor.execute('ALTER TABLE food_library ADD COLUMN category TEXT')
+    cursor.execute('ALTER TABLE food_library ADD COLUMN aliases TEXT')
+    cursor.execute('ALTER TABLE food_library ADD COLUMN log_count INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+        UPDATE food_library SET log_count = counts.n
+        FROM (SELECT user_id, food_name, COUNT(*) AS n FROM food_log GROUP BY user_id, food_name) AS counts
+        WHERE counts.user_id = food_library.user_id AND counts.food_name = food_library.food_name
+    ''')
+    count_up = 'UPDATE food_library SET log_count = log_count + 1 WHERE user_id = NEW.user_id AND food_name = NEW.food_name;'
+    count_down = 'UPDATE food_library SET log_count = log_count - 1 WHERE user_id = OLD.user_id AND food_name = OLD.food_name;'
+    for event, body in (('INSERT', count_up), ('DELETE', count_down), ('UPDATE OF user_id, food_name', f'{count_down}\n                {count_up}')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS food_log_{event.split()[0].lower()}_log_count AFTER {event} ON food_log
+            BEGIN
+                {body}
+            END
         ''')
-        print("Table 'food_log' is ready.")
-
-        # Create 'food_library' table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS food_library (
-                food_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                food_name TEXT NOT NULL,
-                calories INTEGER NOT NULL,
-                protein_g REAL,
-                carbs_g REAL,
-                fat_g REAL,
-                UNIQUE (user_id, food_name)
-            )
+    for table, columns, options in _FOOD_SEARCH_TABLES:
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({columns}, content = 'food_library', content_rowid = 'food_id', {options})")
+        old = ', '.join(f'OLD.{column}' for column in columns.split(', '))
+        new = ', '.join(f'NEW.{column}' for column in columns.split(', '))
+        delete = f"INSERT INTO {table} ({table}, rowid, {columns}) VALUES ('delete', OLD.food_id, {old});"
+        insert = f"INSERT INTO {table} (rowid, {columns}) VALUES (NEW.food_id, {new});"
+        for event, body in (('INSERT', insert), ('DELETE', delete), (f'UPDATE OF {columns}', f'{delete}\n                {insert}')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS food_library_{event.split()[0].lower()}_{table} AFTER {event} ON food_library
+                BEGIN
+                    {body}
+                END
+            ''')
+        cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+    cursor.execute('DELETE FROM import_history')
+
+# The view that presents food_log in its original layout, with the nutrients scaled by quantity
+LOG_ENTRIES_VIEW = 'food_log_entries'
+LOG_ENTRIES_SELECT = '''
+        SELECT l.log_id, l.user_id, l.entry_date, l.quantity, v.food_name,
+               l.quantity * v.calories AS calories, l.quantity * v.protein_g AS protein_g,
+               l.quantity * v.carbs_g AS carbs_g, l.quantity * v.fat_g AS fat_g, v.food_id, l.version_id
+        FROM food_log AS l JOIN food_versions AS v ON v.version_id = l.version_id'''
+
+# Trigger bodies that apply one normalized food_log row, valued through its food version, to daily_totals
+_ADD_ENTRY_TO_DAILY_TOTALS = '''
+            INSERT INTO daily_totals (user_id, entry_date, calories, protein_g, carbs_g, fat_g, entry_count)
+            SELECT {row}.user_id, {row}.entry_date, {row}.quantity * v.calories, {row}.quantity * v.protein_g,
+                   {row}.quantity * v.carbs_g, {row}.quantity * v.fat_g, 1
+            FROM food_versions AS v WHERE v.version_id = {row}.version_id
+            ON CONFLICT (user_id, entry_date) DO UPDATE SET
+                calories = calories + excluded.calories, protein_g = protein_g + excluded.protein_g,
+                carbs_g = carbs_g + excluded.carbs_g, fat_g = fat_g + excluded.fat_g,
+                entry_count = entry_count + 1;'''
+_SUBTRACT_ENTRY_FROM_DAILY_TOTALS = '''
+            UPDATE daily_totals SET
+                calories = daily_totals.calories - {row}.quantity * v.calories, protein_g = daily_totals.protein_g - {row}.quantity * v.protein_g,
+                carbs_g = daily_totals.carbs_g - {row}.quantity * v.carbs_g, fat_g = daily_totals.fat_g - {row}.quantity * v.fat_g,
+                entry_count = entry_count - 1
+            FROM food_versions AS v
+            WHERE v.version_id = {row}.version_id AND daily_totals.user_id = {row}.user_id AND daily_totals.entry_date = {row}.entry_date;
+            DELETE FROM daily_totals WHERE user_id = {row}.user_id AND entry_date = {row}.entry_date AND entry_count <= 0;'''
+_COUNT_ENTRY_IN_LIBRARY = '''
+            UPDATE food_library SET log_count = log_count {sign} 1
+            WHERE user_id = {row}.user_id AND food_name = (SELECT food_name FROM food_versions WHERE version_id = {row}.version_id);'''
+
+def _normalize_food_log(cursor):
+    """
+    Migration 9: replaces the food name and nutrients copied into every food_log row with a food version reference.
+
+    - 'food_versions' stores each distinct definition of a logged food once, for
+      all users: its name and per-serving calories and macros, and the
+      food_library row it was first logged from ('food_id', NULL for recipes and
+      foods no longer in the library). A new version is only added when a food
+      is logged with values no earlier version has, such as after its library
+      entry changed.
+    - 'food_log' keeps (log_id, user_id, entry_date, quantity, version_id), so a
+      row is a few integers and a date. Existing rows are rewritten with the
+      per-serving values their nutrients and quantity imply, and the log_id
+      sequence is kept.
+    - The 'food_log_entries' view joins the two back into the original layout,
+      with the nutrients scaled by quantity, for the queries that read entries.
+
+    The daily_totals and log_count triggers are recreated to value entries
+    through their version, and daily_totals is recomputed from the view. The
+    freed pages are only returned to the file system by VACUUM, which
+    `compact_database` (database_setup.py --compact) runs.
+    """
+    cursor.execute('''
+        CREATE TABLE food_versions (
+            version_id INTEGER PRIMARY KEY,
+            food_id INTEGER,
+            food_name TEXT NOT NULL,
+            calories REAL NOT NULL,
+            protein_g REAL NOT NULL,
+            carbs_g REAL NOT NULL,
+            fat_g REAL NOT NULL,
+            UNIQUE (food_name, calories, protein_g, carbs_g, fat_g)
+        )
+    ''')
+    per_serving = ', '.join(f'ROUND(IFNULL(l.{column}, 0) / IFNULL(NULLIF(l.quantity, 0), 1), 9)' for column in ('calories', 'protein_g', 'carbs_g', 'fat_g'))
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO food_versions (food_id, food_name, calories, protein_g, carbs_g, fat_g)
+        SELECT f.food_id, l.food_name, {per_serving}
+        FROM food_log AS l LEFT JOIN food_library AS f ON f.user_id = l.user_id AND f.food_name = l.food_name
+    ''')
+    sequence = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'food_log'").fetchone()
+    cursor.execute('''
+        CREATE TABLE food_log_normalized (
+            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            entry_date TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            version_id INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute(f'''
+        INSERT INTO food_log_normalized (log_id, user_id, entry_date, quantity, version_id)
+        SELECT l.log_id, l.user_id, l.entry_date, l.quantity, v.version_id
+        FROM food_log AS l JOIN food_versions AS v
+            ON v.food_name = l.food_name
+            AND (v.calories, v.protein_g, v.carbs_g, v.fat_g) = ({per_serving})
+    ''')
+    cursor.execute('DROP TABLE food_log')
+    cursor.execute('ALTER TABLE food_log_normalized RENAME TO food_log')
+    if sequence: cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'food_log'", sequence)
+    cursor.execute('CREATE INDEX idx_food_log_user_date_log ON food_log (user_id, entry_date, log_id)')
+    cursor.execute(f'CREATE VIEW {LOG_ENTRIES_VIEW} AS {LOG_ENTRIES_SELECT}')
+    for event, body in (('INSERT', _ADD_ENTRY_TO_DAILY_TOTALS.format(row='NEW') + _COUNT_ENTRY_IN_LIBRARY.format(row='NEW', sign='+')),
+                        ('DELETE', _SUBTRACT_ENTRY_FROM_DAILY_TOTALS.format(row='OLD') + _COUNT_ENTRY_IN_LIBRARY.format(row='OLD', sign='-')),
+                        ('UPDATE OF user_id, entry_date, quantity, version_id',
+                         _SUBTRACT_ENTRY_FROM_DAILY_TOTALS.format(row='OLD') + _COUNT_ENTRY_IN_LIBRARY.format(row='OLD', sign='-')
+                         + _ADD_ENTRY_TO_DAILY_TOTALS.format(row='NEW') + _COUNT_ENTRY_IN_LIBRARY.format(row='NEW', sign='+'))):
+        cursor.execute(f'''
+            CREATE TRIGGER food_log_{event.split()[0].lower()}_totals AFTER {event} ON food_log
+            BEGIN{body}
+            END
         ''')
-        print("Table 'food_library' is ready.")
-        
-        # Add a default user IF one doesn't exist
-        cursor.execute("SELECT * FROM users WHERE user_id = 1")
-        if not cursor.fetchone():
-            cursor.execute('''
-                INSERT INTO users (user_id, username, daily_calorie_goal) 
-                VALUES (1, 'default_user', 2000)
+    _rebuild_daily_totals(cursor, LOG_ENTRIES_VIEW)
+
+def _add_log_archives(cursor):
+    """
+    Migration 10: adds the registry of food_log archives used by archive.py.
+
+    - 'log_archives' lists each archive database file with the closed period
+      (an inclusive date range) whose entries it holds, and the lowest and
+      highest log_id moved into it so a single entry can be found without
+      opening every archive. 'completed_at' is NULL while the period is still
+      being moved.
+    - 'archive_state' holds a single 'moving' flag. The archive job sets it only
+      inside the transaction that deletes entries it has already copied to an
+      archive, and the food_log delete trigger skips its work while it is set,
+      so 'daily_totals' and the library's log counts keep covering archived
+      entries. Other connections never see the flag set.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_archives (
+            period TEXT PRIMARY KEY,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            rows_archived INTEGER NOT NULL DEFAULT 0,
+            min_log_id INTEGER,
+            max_log_id INTEGER,
+            completed_at TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_state (
+            singleton INTEGER PRIMARY KEY CHECK (singleton = 1),
+            moving INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO archive_state (singleton, moving) VALUES (1, 0)')
+    cursor.execute('DROP TRIGGER IF EXISTS food_log_delete_totals')
+    cursor.execute(f'''
+        CREATE TRIGGER food_log_delete_totals AFTER DELETE ON food_log
+        WHEN (SELECT moving FROM archive_state) = 0
+        BEGIN{_SUBTRACT_ENTRY_FROM_DAILY_TOTALS.format(row='OLD') + _COUNT_ENTRY_IN_LIBRARY.format(row='OLD', sign='-')}
+        END
+    ''')
+
+# The tables whose changes are captured for sync, as (table, primary key, synced columns, row key expression).
+# A row's key identifies it on every device: users by username, library foods by username and name, and log
+# entries by the device that created them and their log_id there.
+SYNC_TABLES = (
+    ('users', 'user_id', 'username, daily_calorie_goal, daily_protein_goal, daily_carbs_goal, daily_fat_goal',
+     'json_array({row}.username)'),
+    ('food_library', 'food_id', 'user_id, food_name, calories, protein_g, carbs_g, fat_g, nutrients, category, aliases',
+     'json_array((SELECT username FROM users WHERE user_id = {row}.user_id), {row}.food_name)'),
+    ('food_log', 'log_id', 'user_id, entry_date, quantity, version_id',
+     'json_array(IFNULL((SELECT device_uuid FROM sync_devices WHERE device_id = {row}.origin_device), (SELECT device_uuid FROM sync_state)), '
+     'IFNULL({row}.origin_log_id, {row}.log_id))'),
+)
+# Trigger body that records a row's latest change under the next sequence number
+_CAPTURE_CHANGE = '''
+            UPDATE sync_state SET seq = seq + 1 WHERE {condition};
+            INSERT INTO sync_changes (table_name, row_key, row_id, op, seq, changed_at)
+            SELECT '{table}', {key}, {row_id}, '{op}', seq, strftime('%Y-%m-%dT%H:%M:%fZ', 'now') FROM sync_state WHERE {condition}
+            ON CONFLICT (table_name, row_key) DO UPDATE SET
+                row_id = excluded.row_id, op = excluded.op, seq = excluded.seq, changed_at = excluded.changed_at, origin = NULL;'''
+
+def _add_sync_log(cursor):
+    """
+    Migration 11: adds the change log and sync state used by sync.py.
+
+    - 'sync_changes' holds the latest change of every users, food_library and
+      food_log row changed since sync was first used on this device: its key,
+      its local id, whether it was inserted, updated or deleted (a tombstone),
+      and its version, the UTC time of the change and the device it was made
+      on ('origin', NULL for this device). Every change takes the next number
+      of a sequence in 'sync_state', so the changes since a sync point are a
+      range scan of the 'seq' index, however large the database is.
+    - 'sync_state' holds this device's id, the sequence, and two flags: capture
+      is off until the device first syncs ('enabled'), and is suspended while
+      sync.py applies changes from another device ('applying'), which records
+      those under their original version itself.
+    - 'sync_devices' numbers the other devices, so that 'food_log.origin_device'
+      and 'food_log.origin_log_id' identify an entry received from one of them
+      in two small integers; both are NULL for entries logged on this device.
+    - 'sync_peers' keeps, per device synced with, the last of its sequence
+      numbers imported here and the last of ours it has acknowledged.
+
+    Capture triggers skip the deletes of the archive job, which are moves.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            singleton INTEGER PRIMARY KEY CHECK (singleton = 1),
+            device_uuid TEXT NOT NULL,
+            seq INTEGER NOT NULL DEFAULT 0,
+            enabled INTEGER NOT NULL DEFAULT 0,
+            applying INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO sync_state (singleton, device_uuid) VALUES (1, lower(hex(randomblob(16))))")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_changes (
+            table_name TEXT NOT NULL,
+            row_key TEXT NOT NULL,
+            row_id INTEGER,
+            op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D')),
+            seq INTEGER NOT NULL UNIQUE,
+            changed_at TEXT NOT NULL,
+            origin TEXT,
+            PRIMARY KEY (table_name, row_key)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_devices (
+            device_id INTEGER PRIMARY KEY,
+            device_uuid TEXT UNIQUE NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_peers (
+            device_uuid TEXT PRIMARY KEY,
+            imported_seq INTEGER NOT NULL DEFAULT 0,
+            exported_seq INTEGER NOT NULL DEFAULT 0,
+            synced_at TEXT
+        )
+    ''')
+    cursor.execute('ALTER TABLE food_log ADD COLUMN origin_device INTEGER')
+    cursor.execute('ALTER TABLE food_log ADD COLUMN origin_log_id INTEGER')
+    cursor.execute('CREATE UNIQUE INDEX idx_food_log_origin ON food_log (origin_device, origin_log_id) WHERE origin_device IS NOT NULL')
+    capturing = '(SELECT enabled AND NOT applying FROM sync_state) AND (SELECT moving FROM archive_state) = 0'
+    for table, pk, columns, key in SYNC_TABLES:
+        new_key, old_key = key.format(row='NEW'), key.format(row='OLD')
+        bodies = (
+            ('INSERT', _CAPTURE_CHANGE.format(table=table, key=new_key, row_id=f'NEW.{pk}', op='I', condition='true')),
+            # A changed key leaves a tombstone under the old one
+            (f'UPDATE OF {columns}', _CAPTURE_CHANGE.format(table=table, key=old_key, row_id=f'OLD.{pk}', op='D', condition=f'{old_key} IS NOT {new_key}')
+                                     + _CAPTURE_CHANGE.format(table=table, key=new_key, row_id=f'NEW.{pk}', op='U', condition='true')),
+            ('DELETE', _CAPTURE_CHANGE.format(table=table, key=old_key, row_id=f'OLD.{pk}', op='D', condition='true')),
+        )
+        for event, body in bodies:
+            cursor.execute(f'''
+                CREATE TRIGGER {table}_{event.split()[0].lower()}_sync AFTER {event} ON {table}
+                WHEN {capturing}
+                BEGIN{body}
+                END
             ''')
-            print("Default user with a 2000 calorie goal has been added.")
 
+def _add_food_sources(cursor):
+    """
+    Migration 12: records which dataset each library food was imported from.
+
+    'food_library.source' names the import_data.py source that first wrote a
+    food, so a later dataset with a food of the same name no longer overwrites
+    it. It is NULL for foods added by hand, synced from another device, or
+    imported before this migration; the next import claims those for the first
+    source that has them. import_history is cleared so the next import_data.py
+    run re-reads every dataset and claims its foods.
+    """
+    cursor.execute('ALTER TABLE food_library ADD COLUMN source TEXT')
+    cursor.execute('DELETE FROM import_history')
+
+_VERSION_VALUES = 'food_name, calories, protein_g, carbs_g, fat_g'
+
+def _own_food_versions(cursor):
+    """
+    Migration 13: gives each user's library food its own food versions.
+
+    Versions were shared by every user who logged a food with the same name and
+    values, so one user's entries could reference the version (and through its
+    'food_id', the library row and nutrients) of another user's food. The
+    version key now includes 'food_id', so an entry only references a version of
+    its own user's library food (or, for recipes and foods not in the library, a
+    version without one). Existing versions keep their ids; entries whose version
+    belongs to another user's food are moved to a version of their own.
+
+    Sync capture is suspended meanwhile, as the moved entries keep their values.
+    """
+    cursor.execute('''
+        CREATE TABLE food_versions_owned (
+            version_id INTEGER PRIMARY KEY,
+            food_id INTEGER,
+            food_name TEXT NOT NULL,
+            calories REAL NOT NULL,
+            protein_g REAL NOT NULL,
+            carbs_g REAL NOT NULL,
+            fat_g REAL NOT NULL
+        )
+    ''')
+    cursor.execute(f'CREATE UNIQUE INDEX idx_food_versions_owner ON food_versions_owned (IFNULL(food_id, 0), {_VERSION_VALUES})')
+    cursor.execute(f'INSERT INTO food_versions_owned (version_id, food_id, {_VERSION_VALUES}) SELECT version_id, food_id, {_VERSION_VALUES} FROM food_versions')
+    owner = 'SELECT food_id FROM food_library WHERE user_id = l.user_id AND food_name = v.food_name'
+    cursor.execute(f'''
+        CREATE TEMP TABLE foreign_versions AS
+        SELECT l.log_id, ({owner}) AS food_id, {', '.join(f'v.{column}' for column in _VERSION_VALUES.split(', '))}
+        FROM food_log AS l JOIN food_versions AS v ON v.version_id = l.version_id
+        WHERE v.food_id IS NOT ({owner})
+    ''')
+    cursor.execute(f'INSERT OR IGNORE INTO food_versions_owned (food_id, {_VERSION_VALUES}) SELECT food_id, {_VERSION_VALUES} FROM temp.foreign_versions')
+    # The view and triggers reading food_versions are recreated around the swap, as RENAME checks them
+    dependents = cursor.execute("SELECT type, name, sql FROM sqlite_master WHERE type IN ('view', 'trigger') AND sql LIKE '%food_versions%'").fetchall()
+    for kind, name, _ in dependents: cursor.execute(f'DROP {kind.upper()} {name}')
+    cursor.execute('DROP TABLE food_versions')
+    cursor.execute('ALTER TABLE food_versions_owned RENAME TO food_versions')
+    for _, _, sql in dependents: cursor.execute(sql)
+    applying = cursor.execute('SELECT applying FROM sync_state').fetchone()[0]
+    cursor.execute('UPDATE sync_state SET applying = 1')
+    cursor.execute('''
+        UPDATE food_log SET version_id = o.version_id
+        FROM temp.foreign_versions AS f JOIN food_versions AS o
+            ON IFNULL(o.food_id, 0) = IFNULL(f.food_id, 0) AND o.food_name = f.food_name AND o.calories = f.calories
+            AND o.protein_g = f.protein_g AND o.carbs_g = f.carbs_g AND o.fat_g = f.fat_g
+        WHERE food_log.log_id = f.log_id
+    ''')
+    cursor.execute('UPDATE sync_state SET applying = ?', (applying,))
+    cursor.execute('DROP TABLE temp.foreign_versions')
+
+# The tables whose rows name a user, which must exist in 'users' for the rows to be synced
+_USER_TABLES = ('food_log', 'food_library')
+_ADD_IMPLICIT_USER = '''
+            INSERT OR IGNORE INTO users (user_id, username, daily_calorie_goal) VALUES ({user_id}, 'user_' || {user_id}, 2000);'''
+
+def _add_implicit_users(cursor):
+    """
+    Migration 14: makes sure every user_id used in the log or the library has a 'users' row.
+
+    The app and the API log for any user_id, but sync keys users and their
+    foods by username, so the rows of a user without one could not be synced.
+    Triggers now add a user named 'user_<id>', with the default calorie goal,
+    before a food_log or food_library row names a user_id that has no row yet,
+    and the users missing so far are added here. If sync is in use, the
+    library foods of those users are recorded as changed under their new key,
+    and the changes captured without a username are dropped.
+    """
+    missing = ' UNION '.join(f'SELECT user_id FROM {table}' for table in _USER_TABLES)
+    cursor.execute(f"CREATE TEMP TABLE implicit_users AS SELECT user_id FROM ({missing}) WHERE user_id NOT IN (SELECT user_id FROM users)")
+    cursor.execute("INSERT OR IGNORE INTO users (user_id, username, daily_calorie_goal) SELECT user_id, 'user_' || user_id, 2000 FROM temp.implicit_users")
+    cursor.execute('UPDATE food_library SET user_id = user_id WHERE user_id IN (SELECT user_id FROM temp.implicit_users)')
+    cursor.execute("DELETE FROM sync_changes WHERE table_name = 'food_library' AND json_extract(row_key, '$[0]') IS NULL")
+    cursor.execute('DROP TABLE temp.implicit_users')
+    for table in _USER_TABLES:
+        for event in ('INSERT', 'UPDATE OF user_id'):
+            cursor.execute(f'''
+                CREATE TRIGGER {table}_{event.split()[0].lower()}_user BEFORE {event} ON {table}
+                WHEN NOT EXISTS (SELECT 1 FROM users WHERE user_id = NEW.user_id)
+                BEGIN{_ADD_IMPLICIT_USER.format(user_id='NEW.user_id')}
+                END
+            ''')
+
+# Ordered (version, description, migration) entries. Applied migrations must never
+# be edited or reordered; schema changes are made by appending a new entry.
+MIGRATIONS = [
+    (1, "Create users, food_log and food_library tables", _create_tables),
+    (2, "Add indexes for the summary, daily log and food search queries", _add_query_indexes),
+    (3, "Add trigger-maintained daily_totals table", _add_daily_totals),
+    (4, "Add ordered food_log index for incremental and paged log views", _add_log_order_index),
+    (5, "Add import_history table for idempotent dataset imports", _add_import_history),
+    (6, "Add nutrient dictionary and packed per-food nutrient vectors", _add_nutrient_vectors),
+    (7, "Add recipes with trigger-invalidated per-serving nutrition", _add_recipes),
+    (8, "Add FTS5 food search with categories, aliases and log counts", _add_food_search),
+    (9, "Normalize food_log to food version references", _normalize_food_log),
+    (10, "Add food_log archive registry", _add_log_archives),
+    (11, "Add change log and state for multi-device sync", _add_sync_log),
+    (12, "Add food_library.source so the first dataset with a food keeps it", _add_food_sources),
+    (13, "Key food versions by their library food so users never share one", _own_food_versions),
+    (14, "Add a users row for every user_id in the log and library", _add_implicit_users),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+NORMALIZED_LOG_VERSION = 9
+
+def get_schema_version(conn):
+    """Returns the schema version recorded in the database's user_version header."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn, target_version=SCHEMA_VERSION):
+    """
+    Upgrades a database in place to `target_version`.
+
+    Each pending migration runs in its own immediate transaction together with
+    the PRAGMA user_version update that records it, so a failed migration leaves
+    the database at the previous version. The version is checked again once the
+    write lock is held, so several tracker instances starting at the same time
+    apply each migration only once.
+
+    Args:
+        conn (sqlite3.Connection): An open connection to the database.
+        target_version (int): The version to upgrade to. Defaults to the latest.
+
+    Returns:
+        list[tuple[int, str]]: The (version, description) of each migration applied.
+    """
+    applied = []
+    for version, description, migration in MIGRATIONS:
+        if version > target_version or version <= get_schema_version(conn): continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= get_schema_version(conn):
+                conn.rollback(); continue
+            migration(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append((version, description))
+    return applied
+
+
+# --- QUERY PLAN CHECK ---
+
+def explain_query_plan(conn, sql, params=()):
+    """Returns the detail column of each EXPLAIN QUERY PLAN row for a query."""
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+def check_query_plans(conn, queries):
+    """
+    Checks that each query is answered with an index rather than a full scan.
+
+    Scans of a virtual table count as index lookups, since the FTS5 tables
+    answer MATCH from their own index.
+
+    Args:
+        conn (sqlite3.Connection): An open connection to a migrated database.
+        queries (dict[str, tuple[str, tuple]]): Maps a query name to its SQL and sample parameters.
+
+    Returns:
+        dict[str, tuple[bool, list[str]]]: Maps each query name to whether it avoids
+        full table scans and its query plan.
+    """
+    results = {}
+    for name, (sql, params) in queries.items():
+        plan = explain_query_plan(conn, sql, params)
+        results[name] = (not any(detail.startswith('SCAN') and 'VIRTUAL TABLE' not in detail for detail in plan), plan)
+    return results
+
+
+# --- DAILY TOTALS MAINTENANCE ---
+
+# Per-day totals recomputed from a log entries view, in the daily_totals layout
+_DAY_TOTALS_QUERY = '''SELECT user_id, entry_date, SUM(calories), TOTAL(protein_g), TOTAL(carbs_g), TOTAL(fat_g), COUNT(*)
+                       FROM {log} GROUP BY user_id, entry_date'''
+
+def archive_files(conn):
+    """Returns the (period, path) of every registered food_log archive, resolving paths next to the main database file."""
+    main_file = next(row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main')
+    directory = os.path.dirname(main_file)
+    return [(period, os.path.join(directory, file_name)) for period, file_name in conn.execute('SELECT period, file_name FROM log_archives ORDER BY period')]
+
+def archived_day_totals(conn):
+    """
+    Returns the per-day totals of the entries held in archive files, summed over every archive.
+
+    Each archive is read through its own read-only connection, so any number
+    of archives can be read without attaching them.
+
+    Returns:
+        dict[tuple[int, str], list]: Maps (user_id, entry_date) to [calories,
+        protein_g, carbs_g, fat_g, entry_count].
+    """
+    totals = {}
+    for _, path in archive_files(conn):
+        archive = sqlite3.connect(f'file:{urllib.parse.quote(path)}?mode=ro', uri=True)
+        try:
+            for row in archive.execute(_DAY_TOTALS_QUERY.format(log=LOG_ENTRIES_VIEW)):
+                day = totals.setdefault(row[:2], [0, 0, 0, 0, 0])
+                for i, value in enumerate(row[2:]): day[i] += value
+        finally:
+            archive.close()
+    return totals
+
+def verify_daily_totals(conn, tolerance=1e-6):
+    """
+    Compares 'daily_totals' with totals recomputed from the 'food_log' entries, including archived ones.
+
+    Args:
+        conn (sqlite3.Connection): An open connection to a migrated database.
+        tolerance (float): The largest difference allowed for each nutrient total,
+            which absorbs floating-point residue from repeated trigger updates.
+
+    Returns:
+        list[tuple[int, str, tuple | None, tuple | None]]: The (user_id, entry_date,
+        stored, expected) of every day whose stored totals have drifted. A side is
+        None when that day is missing from it.
+    """
+    stored = {row[:2]: row[2:] for row in conn.execute(
+        'SELECT user_id, entry_date, calories, protein_g, carbs_g, fat_g, entry_count FROM daily_totals')}
+    expected = archived_day_totals(conn)
+    for row in conn.execute(_DAY_TOTALS_QUERY.format(log=LOG_ENTRIES_VIEW)):
+        day = expected.setdefault(row[:2], [0, 0, 0, 0, 0])
+        for i, value in enumerate(row[2:]): day[i] += value
+    expected = {key: tuple(values) for key, values in expected.items()}
+    drifted = []
+    for key in sorted(stored.keys() | expected.keys()):
+        have, want = stored.get(key), expected.get(key)
+        if have is None or want is None or have[4] != want[4] or any(abs(a - b) > tolerance for a, b in zip(have[:4], want[:4])):
+            drifted.append((*key, have, want))
+    return drifted
+
+def rebuild_daily_totals(conn):
+    """
+    Recomputes 'daily_totals' from the 'food_log' entries, including archived ones, in a single transaction.
+
+    Returns:
+        int: The number of daily rows written.
+    """
+    archived = archived_day_totals(conn)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        _rebuild_daily_totals(conn.cursor(), LOG_ENTRIES_VIEW)
+        conn.executemany('''
+            INSERT INTO daily_totals (user_id, entry_date, calories, protein_g, carbs_g, fat_g, entry_count) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, entry_date) DO UPDATE SET
+                calories = calories + excluded.calories, protein_g = protein_g + excluded.protein_g,
+                carbs_g = carbs_g + excluded.carbs_g, fat_g = fat_g + excluded.fat_g,
+                entry_count = entry_count + excluded.entry_count
+        ''', ((*key, *values) for key, values in archived.items()))
         conn.commit()
-        print("Database has been successfully initialized.")
+    except BaseException:
+        conn.rollback()
+        raise
+    return conn.execute('SELECT COUNT(*) FROM daily_totals').fetchone()[0]
+
+
+# --- STORAGE REPORT AND COMPACTION ---
+
+# Queries over the log in its original layout, timed by compact_database before and after the log is normalized
+LOG_QUERIES = {
+    'day_log': 'SELECT log_id, quantity, food_name, calories, protein_g, carbs_g, fat_g FROM {log} WHERE user_id = ? AND entry_date = ? ORDER BY log_id',
+    'day_sum': 'SELECT TOTAL(calories), TOTAL(protein_g), TOTAL(carbs_g), TOTAL(fat_g) FROM {log} WHERE user_id = ? AND entry_date = ?',
+    'history_sum': 'SELECT COUNT(*), TOTAL(calories), TOTAL(protein_g), TOTAL(carbs_g), TOTAL(fat_g) FROM {log} WHERE user_id = ? AND entry_date <= ?',
+}
+
+def storage_report(conn):
+    """
+    Measures how much space the database and its food log take.
+
+    Returns:
+        dict: 'file_bytes' (the size of the main database file), 'free_bytes'
+        (pages on the freelist, returned by VACUUM), 'log_rows', and
+        'log_bytes', the pages used by 'food_log', its indexes and (once the log
+        is normalized) 'food_versions', or None if SQLite lacks the dbstat table.
+    """
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    report = {'file_bytes': conn.execute('PRAGMA page_count').fetchone()[0] * page_size,
+              'free_bytes': conn.execute('PRAGMA freelist_count').fetchone()[0] * page_size,
+              'log_rows': conn.execute('SELECT COUNT(*) FROM food_log').fetchone()[0]}
+    try:
+        report['log_bytes'] = conn.execute('''SELECT TOTAL(d.pgsize) FROM dbstat AS d JOIN sqlite_schema AS s ON s.name = d.name
+                                              WHERE s.tbl_name IN ('food_log', 'food_versions')''').fetchone()[0]
+    except sqlite3.OperationalError:
+        report['log_bytes'] = None
+    return report
+
+def time_log_queries(conn, log_table, days):
+    """
+    Times each LOG_QUERIES query against `log_table` for every (user_id, entry_date) in `days`.
+
+    Returns:
+        dict[str, float]: The median latency of each query in milliseconds.
+    """
+    timings = {}
+    for name, sql in LOG_QUERIES.items():
+        sql = sql.format(log=log_table); samples = []
+        for day in days:
+            start = time.perf_counter()
+            conn.execute(sql, day).fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[name] = statistics.median(samples) if samples else 0.0
+    return timings
+
+def compact_database(db_file=DB_FILE):
+    """
+    Upgrades a database, normalizing its food log, and rewrites the file with VACUUM.
+
+    The storage report and the LOG_QUERIES timings are taken on the database as
+    it was before the food_log normalization (migration 9) and again after the
+    upgrade and VACUUM, over the same sample of logged days, and both are printed.
+
+    Returns:
+        tuple[dict, dict]: The storage report and timings before and after, each
+        as {'storage': ..., 'timings': ...}.
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        for version, description in migrate(conn, NORMALIZED_LOG_VERSION - 1):
+            print(f"Applied migration {version}: {description}.")
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        days = conn.execute('SELECT user_id, entry_date FROM daily_totals ORDER BY random() LIMIT ?', (REPORT_SAMPLE_DAYS,)).fetchall()
+        log_table = 'food_log' if get_schema_version(conn) < NORMALIZED_LOG_VERSION else LOG_ENTRIES_VIEW
+        before = {'storage': storage_report(conn), 'timings': time_log_queries(conn, log_table, days)}
+        for version, description in migrate(conn):
+            print(f"Applied migration {version}: {description}.")
+        conn.execute('VACUUM')
+        after = {'storage': storage_report(conn), 'timings': time_log_queries(conn, LOG_ENTRIES_VIEW, days)}
+    finally:
+        conn.close()
+    for key in ('file_bytes', 'free_bytes', 'log_bytes'):
+        if before['storage'][key] is not None and after['storage'][key] is not None:
+            print(f"{key}: {before['storage'][key] / 1024:,.0f} KiB -> {after['storage'][key] / 1024:,.0f} KiB")
+    print(f"log_rows: {before['storage']['log_rows']:,} -> {after['storage']['log_rows']:,}")
+    for name in LOG_QUERIES:
+        print(f"{name}: {before['timings'][name]:.3f} ms -> {after['timings'][name]:.3f} ms (median over {len(days)} days)")
+    return before, after
+
+
+def initialize_database(db_file=DB_FILE):
+    """
+    Initializes or upgrades the calorie tracker database.
+
+    This function connects to the 'calorie_tracker.db' SQLite database and
+    applies every pending migration in MIGRATIONS, printing each one. Existing
+    databases are upgraded in place and keep their data.
+
+    The function handles SQLite errors by printing them to the console and ensures
+    that the database connection is closed upon completion.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file)
+        for version, description in migrate(conn):
+            print(f"Applied migration {version}: {description}.")
+        print(f"Database has been successfully initialized (schema version {get_schema_version(conn)}).")
     except sqlite3.Error as e:
         print(f"Database error: {e}")
     finally:
         if conn:
             conn.close()
 
+def print_query_plans(db_file=DB_FILE):
+    """
+    Prints the query plan of each hot query in the repository and whether it uses an index.
+
+    Returns:
+        bool: True if every hot query avoids a full table scan.
+    """
+    from repository import HOT_QUERIES
+
+    conn = sqlite3.connect(db_file)
+    try:
+        results = check_query_plans(conn, HOT_QUERIES)
+    finally:
+        conn.close()
+    for name, (uses_index, plan) in results.items():
+        print(f"[{'OK' if uses_index else 'SCAN'}] {name}: {'; '.join(plan)}")
+    return all(uses_index for uses_index, _ in results.values())
+
+def print_daily_totals_check(db_file=DB_FILE, rebuild=False):
+    """
+    Prints any drift between 'daily_totals' and 'food_log', rebuilding the table if requested.
+
+    Returns:
+        bool: True if the stored totals match 'food_log' (after the rebuild, if one was requested).
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        drifted = verify_daily_totals(conn)
+        for user_id, entry_date, stored, expected in drifted:
+            print(f"Drift for user {user_id} on {entry_date}: stored {stored}, expected {expected}")
+        print(f"{len(drifted)} day(s) out of sync.")
+        if rebuild:
+            print(f"Rebuilt daily_totals with {rebuild_daily_totals(conn)} day(s).")
+            drifted = verify_daily_totals(conn)
+    finally:
+        conn.close()
+    return not drifted
+
 if __name__ == '__main__':
-    initialize_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create or upgrade the calorie tracker database.")
+    parser.add_argument('--check-plans', action='store_true', help="verify that the hot queries use an index")
+    parser.add_argument('--verify-totals', action='store_true', help="compare daily_totals with food_log")
+    parser.add_argument('--rebuild-totals', action='store_true', help="recompute daily_totals from food_log")
+    parser.add_argument('--compact', action='store_true', help="upgrade, VACUUM and report the size and log query timings before and after")
+    args = parser.parse_args()
+    if args.compact: compact_database()
+    else: initialize_database()
+    ok = True
+    if args.check_plans: ok = print_query_plans() and ok
+    if args.verify_totals or args.rebuild_totals: ok = print_daily_totals_check(rebuild=args.rebuild_totals) and ok
+    if not ok:
+        raise SystemExit(1)
@@ -0,0 +1,154 @@
+import queue
+import threading
+import time
+
+from instrumentation import get_metrics
+from tracker_core import get_core
+
+# Polling settings
+POLL_INTERVAL_MS = 15
+
+
+class DbRequest:
+    """
+    A unit of database work submitted to a DatabaseWorker.
+
+    Attributes:
+        func (callable): Called on the worker thread with the tracker core as its only argument.
+        callback (callable | None): Called on the UI thread with the function's result.
+        error_callback (callable | None): Called on the UI thread with the exception if the function raises.
+        key (str | None): Requests that share a key supersede each other.
+        cancelled (bool): Set once the request has been cancelled.
+        submitted_at (float): The perf_counter() time the request was created.
+    """
+    def __init__(self, func, callback=None, error_callback=None, key=None):
+        self.func = func; self.callback = callback; self.error_callback = error_callback; self.key = key
+        self.cancelled = False
+        self.submitted_at = time.perf_counter()
+
+    def cancel(self):
+        """Cancels the request. It is skipped if it has not started, and its result is dropped if it has."""
+        self.cancelled = True
+
+
+class DatabaseWorker:
+    """
+    Runs database requests on a dedicated thread so the Tk main loop never blocks on I/O.
+
+    The worker thread takes requests from a queue and runs them against the shared
+    tracker core, so the repository connection for that thread is owned by the
+    worker. Results are handed back through a second queue that `poll` drains on
+    the UI thread, where the request's callback runs; `attach` makes a widget poll
+    it with `after()`.
+
+    Submitting a request with a key cancels the pending request with the same key,
+    so only the latest of a stream of requests (such as refreshes of the same
+    view) is run and rendered.
+
+    With metrics enabled, the time each request waited in the queue is recorded
+    as 'worker.queue_wait', and a profile armed with `Metrics.arm_profile` covers
+    the next request run.
+
+    Attributes:
+        core (TrackerCore): The tracker core the requests run against.
+    """
+    def __init__(self, core=None):
+        self.core = core or get_core()
+        self._requests = queue.Queue(); self._results = queue.Queue()
+        self._latest = {}; self._lock = threading.Lock()
+        self._thread = None; self._widget = None; self._after_id = None
+
+    def start(self):
+        """Starts the worker thread if it is not already running."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='db-worker', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stops polling, lets the worker finish its current request, and waits for it to exit."""
+        if self._widget is not None and self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+        self._widget = self._after_id = None
+        if self._thread is not None and self._thread.is_alive():
+            self._requests.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, func, callback=None, error_callback=None, key=None):
+        """
+        Queues `func(core)` to run on the worker thread.
+
+        Args:
+            func (callable): The database work. It receives the tracker core.
+            callback (callable | None): Receives the result on the UI thread.
+            error_callback (callable | None): Receives the exception on the UI thread.
+                Errors without a handler are printed.
+            key (str | None): Cancel the pending request submitted with the same key.
+
+        Returns:
+            DbRequest: The queued request, which can be cancelled.
+        """
+        request = DbRequest(func, callback, error_callback, key)
+        if key is not None:
+            with self._lock:
+                previous = self._latest.get(key)
+                if previous is not None: previous.cancel()
+                self._latest[key] = request
+        self.start()
+        self._requests.put(request)
+        return request
+
+    def attach(self, widget, interval_ms=POLL_INTERVAL_MS):
+        """Polls for results every `interval_ms` milliseconds using `widget.after()`."""
+        self._widget = widget
+        def poll_loop():
+            self.poll()
+            self._after_id = widget.after(interval_ms, poll_loop)
+        self._after_id = widget.after(interval_ms, poll_loop)
+
+    def poll(self):
+        """Runs the callbacks of every finished request. Must be called on the UI thread."""
+        while True:
+            try:
+                request, ok, value = self._results.get_nowait()
+            except queue.Empty:
+                return
+            if request.cancelled: continue
+            if ok:
+                if request.callback is not None: request.callback(value)
+            elif request.error_callback is not None:
+                request.error_callback(value)
+            else:
+                print(f"Database worker error: {value}")
+
+    def _run(self):
+        """Worker thread loop: runs queued requests until a None sentinel arrives."""
+        while True:
+            request = self._requests.get()
+            if request is None: return
+            if request.cancelled: continue
+            metrics = get_metrics()
+            if metrics.enabled: metrics.record('worker.queue_wait', (time.perf_counter() - request.submitted_at) * 1000)
+            try:
+                if metrics.enabled and metrics.take_worker_profile():
+                    result = (request, True, metrics.profile(f"worker.{request.key or 'request'}", lambda: request.func(self.core)))
+                else:
+                    result = (request, True, request.func(self.core))
+            except Exception as e:
+                result = (request, False, e)
+            if request.key is not None:
+                with self._lock:
+                    if self._latest.get(request.key) is request: del self._latest[request.key]
+            self._results.put(result)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_worker():
+    """Returns the process-wide database worker, creating it on first use."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = DatabaseWorker()
+        return _worker
@@ -1,68 +1,388 @@
-import pandas as pd
-import sqlite3
+import argparse
+import csv
+import hashlib
+import itertools
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+
+from nutrients import VECTOR_DTYPE, NutrientDictionary
+from repository import Repository
 
 # Define file paths
 DB_FILE = 'calorie_tracker.db'
 INDIAN_FOOD_CSV = 'Indian_Food_Nutrition_Processed.csv'
+USDA_FOOD_CSV = 'food.csv'
+USDA_FOOD_COPY_CSV = 'food1.csv'
+NUTRITION_CF_CSV = 'nutrition_cf - Sheet5.csv'
+
+# Import settings
+CHUNK_SIZE = 500
+NUTRIENT_COLUMNS = ('calories', 'protein_g', 'carbs_g', 'fat_g')
+SEARCH_COLUMNS = ('category', 'aliases')
+# Files smaller than this are parsed with the csv module, so small imports never load pandas
+PANDAS_MIN_FILE_BYTES = 1 << 20
+
+
+@dataclass
+class FoodSource:
+    """
+    Describes a CSV dataset that can be imported into the 'food_library' table.
+
+    Attributes:
+        name (str): A short name used on the command line and in import_history.
+        path (str): Path to the CSV file.
+        column_mapping (dict[str, str]): Maps CSV columns to the 'food_name',
+            'calories', 'protein_g', 'carbs_g' and 'fat_g' database columns.
+        nutrient_columns (dict[str, str]): Maps further CSV columns to names in the
+            'nutrients' dictionary. Together with the calorie and macro columns
+            they make up each food's nutrient vector.
+        nutrient_units (dict[str, str]): Units for nutrient names not yet in the
+            dictionary, which are added to it on import.
+        search_columns (dict[str, str]): Maps CSV columns to the 'category' and
+            'aliases' columns, which the food search matches besides the name.
+    """
+    name: str
+    path: str
+    column_mapping: dict
+    nutrient_columns: dict = field(default_factory=dict)
+    nutrient_units: dict = field(default_factory=dict)
+    search_columns: dict = field(default_factory=dict)
+
+    @property
+    def vector_columns(self):
+        """Maps every CSV column that feeds the nutrient vector to its nutrient name."""
+        return {**{column: name for column, name in self.column_mapping.items() if name != 'food_name'}, **self.nutrient_columns}
+
 
-def populate_food_library():
+@dataclass
+class ImportReport:
     """
-    Populates the food library with data from a CSV file.
+    Counts the rows handled while importing one source.
+
+    Attributes:
+        source (str): The name of the imported source.
+        inserted (int): Foods added to the library.
+        updated (int): Existing foods whose nutrients, category or aliases changed.
+        skipped (int): Rows left alone because they were unchanged, invalid,
+            repeated within the file, or already imported from another source.
+        conflicts (list[tuple[str, str]]): The (food_name, source) of foods kept
+            from the source that imported them first although this one has
+            different values for them.
+        seconds (float): Wall-clock time spent on the import.
+        already_imported (bool): True if the file was skipped because its
+            contents had been imported before.
+    """
+    source: str
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    conflicts: list = field(default_factory=list)
+    seconds: float = 0.0
+    already_imported: bool = False
+
+    @property
+    def rows(self):
+        return self.inserted + self.updated + self.skipped
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        if self.already_imported:
+            return f"{self.source}: already imported, skipped."
+        summary = (f"{self.source}: {self.inserted} inserted, {self.updated} updated, {self.skipped} skipped "
+                   f"in {self.seconds:.2f}s ({self.rows_per_second:,.0f} rows/s).")
+        if not self.conflicts:
+            return summary
+        kept = '\n'.join(f"  {name} (kept from {source})" for name, source in self.conflicts)
+        return f"{summary}\n{len(self.conflicts)} food(s) already imported from another source with different values:\n{kept}"
 
-    This function reads a CSV file containing nutritional information for Indian food items,
-    maps the CSV columns to the corresponding database columns in the 'food_library' table,
-    and performs a bulk insert of the data into the database.
 
-    The CSV file is expected to have the following columns:
-    - 'Dish Name'
-    - 'Calories (kcal)'
-    - 'Protein (g)'
-    - 'Carbohydrates (g)'
-    - 'Fats (g)'
+# Registered sources, imported in this order. Add a dataset with register_source().
+SOURCES = {}
 
-    A 'user_id' of 1 is assigned to all imported records, making them available
-    to the default user.
+def register_source(source):
+    """Adds a source to the registry, replacing any source with the same name."""
+    SOURCES[source.name] = source
+    return source
+
+register_source(FoodSource('indian', INDIAN_FOOD_CSV, {
+    'Dish Name': 'food_name',
+    'Calories (kcal)': 'calories',
+    'Protein (g)': 'protein_g',
+    'Carbohydrates (g)': 'carbs_g',
+    'Fats (g)': 'fat_g'
+}, {
+    'Free Sugar (g)': 'sugar_g',
+    'Fibre (g)': 'fiber_g',
+    'Sodium (mg)': 'sodium_mg',
+    'Calcium (mg)': 'calcium_mg',
+    'Iron (mg)': 'iron_mg',
+    'Vitamin C (mg)': 'vitamin_c_mg',
+    'Folate (µg)': 'folate_ug'
+}))
+register_source(FoodSource('usda', USDA_FOOD_CSV, {
+    'Description': 'food_name',
+    'Data.Kilocalories': 'calories',
+    'Data.Protein': 'protein_g',
+    'Data.Carbohydrate': 'carbs_g',
+    'Data.Fat.Total Lipid': 'fat_g'
+}, {
+    'Data.Sugar Total': 'sugar_g',
+    'Data.Fiber': 'fiber_g',
+    'Data.Major Minerals.Sodium': 'sodium_mg',
+    'Data.Major Minerals.Calcium': 'calcium_mg',
+    'Data.Major Minerals.Iron': 'iron_mg',
+    'Data.Vitamins.Vitamin C': 'vitamin_c_mg',
+    'Data.Fat.Saturated Fat': 'saturated_fat_g',
+    'Data.Fat.Monosaturated Fat': 'monounsaturated_fat_g',
+    'Data.Fat.Polysaturated Fat': 'polyunsaturated_fat_g',
+    'Data.Cholesterol': 'cholesterol_mg',
+    'Data.Water': 'water_g',
+    'Data.Ash': 'ash_g',
+    'Data.Major Minerals.Potassium': 'potassium_mg',
+    'Data.Major Minerals.Magnesium': 'magnesium_mg',
+    'Data.Major Minerals.Phosphorus': 'phosphorus_mg',
+    'Data.Major Minerals.Zinc': 'zinc_mg',
+    'Data.Major Minerals.Copper': 'copper_mg',
+    'Data.Manganese': 'manganese_mg',
+    'Data.Selenium': 'selenium_ug',
+    'Data.Vitamins.Vitamin A - IU': 'vitamin_a_iu',
+    'Data.Vitamins.Vitamin A - RAE': 'vitamin_a_rae_ug',
+    'Data.Retinol': 'retinol_ug',
+    'Data.Alpha Carotene': 'alpha_carotene_ug',
+    'Data.Beta Carotene': 'beta_carotene_ug',
+    'Data.Beta Cryptoxanthin': 'beta_cryptoxanthin_ug',
+    'Data.Lutein and Zeaxanthin': 'lutein_zeaxanthin_ug',
+    'Data.Lycopene': 'lycopene_ug',
+    'Data.Thiamin': 'thiamin_mg',
+    'Data.Riboflavin': 'riboflavin_mg',
+    'Data.Niacin': 'niacin_mg',
+    'Data.Pantothenic Acid': 'pantothenic_acid_mg',
+    'Data.Vitamins.Vitamin B6': 'vitamin_b6_mg',
+    'Data.Vitamins.Vitamin B12': 'vitamin_b12_ug',
+    'Data.Choline': 'choline_mg',
+    'Data.Vitamins.Vitamin E': 'vitamin_e_mg',
+    'Data.Vitamins.Vitamin K': 'vitamin_k_ug'
+}, search_columns={
+    'Category': 'category'
+}))
+register_source(FoodSource('usda_copy', USDA_FOOD_COPY_CSV, SOURCES['usda'].column_mapping, SOURCES['usda'].nutrient_columns,
+                           search_columns=SOURCES['usda'].search_columns))
+register_source(FoodSource('nutrition_cf', NUTRITION_CF_CSV, {
+    'Food': 'food_name',
+    'Energy(kcal)': 'calories',
+    'Proteins': 'protein_g',
+    'Carbohydrates': 'carbs_g',
+    'Fats': 'fat_g'
+}, {
+    'Fiber': 'fiber_g'
+}, search_columns={
+    'Category': 'category',
+    'Type': 'aliases'
+}))
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Returns the hex SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_csv_chunks(path, text_columns, value_columns, chunk_size=CHUNK_SIZE):
+    """
+    Streams a CSV as chunks of (texts, values) holding at most `chunk_size` rows each.
 
-    The function handles 'FileNotFoundError' if the CSV file is not found and
-    prints other exceptions to the console. The database connection is closed
-    after the operation.
+    `texts` holds a tuple of the text columns' values for each row, None where
+    blank, and `values` is a float64 matrix of the value columns, NaN where blank
+    or not a number. Files
+    under PANDAS_MIN_FILE_BYTES are read with the csv module; pandas, which takes
+    longer to import than such a file takes to parse, is only loaded for larger ones.
     """
-    conn = None
+    if os.path.getsize(path) < PANDAS_MIN_FILE_BYTES:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            while rows := list(itertools.islice(reader, chunk_size)):
+                yield ([tuple(row[column] or None for column in text_columns) for row in rows],
+                       np.array([[_to_float(row[column]) for column in value_columns] for row in rows], dtype=np.float64).reshape(len(rows), len(value_columns)))
+        return
+    import pandas as pd
+    for df in pd.read_csv(path, usecols=[*text_columns, *value_columns], chunksize=chunk_size):
+        yield ([tuple(None if pd.isna(text) else str(text) for text in row) for row in df[list(text_columns)].itertuples(index=False, name=None)],
+               df[list(value_columns)].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64))
+
+def _to_float(value):
+    """Parses a CSV field as a float, with NaN for blanks and text."""
     try:
-        # 1. Read the CSV file
-        df = pd.read_csv(INDIAN_FOOD_CSV)
-        print(f"Loaded '{INDIAN_FOOD_CSV}'. Found {len(df)} records to import.")
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def iter_food_chunks(source, dictionary, chunk_size=CHUNK_SIZE):
+    """
+    Streams a source's CSV as chunks of (food_name, calories, protein_g, carbs_g, fat_g, nutrients, category, aliases) tuples.
+
+    Only the mapped columns are parsed and at most `chunk_size` rows are held in
+    memory at a time. Missing macro, category and alias values become None; rows without a name or
+    calories are yielded as None so they can be counted as skipped.
+
+    The nutrient vectors of a chunk are built as one float32 matrix laid out by
+    `dictionary`, with NaN for values the CSV does not have, and each row is
+    packed into the blob stored in 'food_library.nutrients'.
+    """
+    vector_columns = source.vector_columns
+    vector_names = list(vector_columns.values())
+    positions = dictionary.positions(vector_names)
+    macros = [vector_names.index(name) for name in NUTRIENT_COLUMNS]
+    name_column = next(column for column, name in source.column_mapping.items() if name == 'food_name')
+    search_columns = {name: column for column, name in source.search_columns.items()}
+    text_columns = list(dict.fromkeys([name_column, *search_columns.values()]))
+    search_positions = [text_columns.index(search_columns[name]) if name in search_columns else None for name in SEARCH_COLUMNS]
+    for texts, values in read_csv_chunks(source.path, text_columns, list(vector_columns), chunk_size):
+        matrix = np.full((len(texts), len(dictionary)), np.nan, dtype=VECTOR_DTYPE)
+        matrix[:, positions] = values
+        chunk = []
+        for text, row, vector in zip(texts, values[:, macros], matrix):
+            if text[0] is None or np.isnan(row[0]):
+                chunk.append(None); continue
+            chunk.append((text[0], *(None if np.isnan(value) else float(value) for value in row), vector.tobytes(),
+                          *(None if position is None else text[position] for position in search_positions)))
+        yield chunk
+
+def upsert_chunk(conn, user_id, chunk, report):
+    """
+    Writes one chunk of foods to the library, inserting new names and updating changed ones.
+
+    The chunk's names are looked up in one query so each row can be classified
+    as new, changed or unchanged; the inserts and updates are then written with
+    executemany. A food another source imported first is kept as it is, and
+    listed in `report.conflicts` if this source's values differ. Foods without a
+    source (added by hand or imported before sources were recorded) are claimed
+    for this one. Counts are added to `report`.
+    """
+    rows = {}
+    for row in chunk:
+        if row is None or row[0] in rows: report.skipped += 1
+        if row is not None: rows[row[0]] = row[1:]
+    if not rows: return
 
-        # 2. Define the mapping from CSV columns to our database columns
-        column_mapping = {
-            'Dish Name': 'food_name',
-            'Calories (kcal)': 'calories',
-            'Protein (g)': 'protein_g',
-            'Carbohydrates (g)': 'carbs_g',
-            'Fats (g)': 'fat_g'
-        }
+    placeholders = ', '.join('?' * len(rows))
+    existing = {row[0]: row[1:] for row in conn.execute(
+        f"SELECT food_name, source, calories, protein_g, carbs_g, fat_g, nutrients, category, aliases FROM food_library WHERE user_id = ? AND food_name IN ({placeholders})",
+        (user_id, *rows))}
+    inserts, updates, claims = [], [], []
+    for name, nutrients in rows.items():
+        if name not in existing:
+            inserts.append((user_id, name, report.source, *nutrients)); continue
+        source, *values = existing[name]
+        if source not in (None, report.source):
+            if tuple(values) != nutrients: report.conflicts.append((name, source))
+            report.skipped += 1
+        elif tuple(values) != nutrients: updates.append((report.source, *nutrients, user_id, name))
+        else:
+            if source is None: claims.append((report.source, user_id, name))
+            report.skipped += 1
 
-        # 3. Select and rename the columns we need
-        df_to_insert = df[list(column_mapping.keys())].rename(columns=column_mapping)
+    conn.executemany('INSERT INTO food_library (user_id, food_name, source, calories, protein_g, carbs_g, fat_g, nutrients, category, aliases) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', inserts)
+    conn.executemany('UPDATE food_library SET source = ?, calories = ?, protein_g = ?, carbs_g = ?, fat_g = ?, nutrients = ?, category = ?, aliases = ? WHERE user_id = ? AND food_name = ?', updates)
+    conn.executemany('UPDATE food_library SET source = ? WHERE user_id = ? AND food_name = ?', claims)
+    report.inserted += len(inserts); report.updated += len(updates)
 
-        # Add the user_id for all these initial records
-        df_to_insert['user_id'] = 1
+def import_source(repo, source, user_id=1, chunk_size=CHUNK_SIZE, force=False):
+    """
+    Imports one source into the user's food library in a single transaction.
+
+    A file whose SHA-256 is already recorded in 'import_history' for the user is
+    skipped unless `force` is set, which makes re-running the import a no-op and
+    skips byte-identical copies of a dataset.
+
+    Args:
+        repo (Repository): The repository for the target database.
+        source (FoodSource): The dataset to import.
+        user_id (int): The user whose library receives the foods.
+        chunk_size (int): The number of CSV rows read and written at a time.
+        force (bool): Import the file even if its contents were imported before.
+
+    Returns:
+        ImportReport: The rows inserted, updated and skipped, and the time taken.
+    """
+    report = ImportReport(source.name)
+    start = time.perf_counter()
+    content_sha256 = file_sha256(source.path)
+    with repo.transaction() as conn:
+        seen = conn.execute("SELECT 1 FROM import_history WHERE user_id = ? AND content_sha256 = ?", (user_id, content_sha256)).fetchone()
+        if seen and not force:
+            report.already_imported = True
+        else:
+            NutrientDictionary.register(conn, ((name, source.nutrient_units.get(name, '')) for name in source.vector_columns.values()))
+            dictionary = NutrientDictionary.from_connection(conn)
+            for chunk in iter_food_chunks(source, dictionary, chunk_size):
+                upsert_chunk(conn, user_id, chunk, report)
+            conn.execute('''INSERT OR REPLACE INTO import_history (user_id, content_sha256, source_name, file_name, imported_at, rows_inserted, rows_updated, rows_skipped)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                         (user_id, content_sha256, source.name, os.path.basename(source.path), datetime.now().isoformat(timespec='seconds'),
+                          report.inserted, report.updated, report.skipped))
+    report.seconds = time.perf_counter() - start
+    return report
 
-        # 4. Connect to the SQLite database
-        conn = sqlite3.connect(DB_FILE)
+def populate_food_library(source_names=None, db_file=DB_FILE, user_id=1, chunk_size=CHUNK_SIZE, force=False):
+    """
+    Populates the food library from the registered CSV datasets.
+
+    Each source is streamed in chunks and upserted into 'food_library' in its
+    own transaction, keyed on the food name. Foods already in the library are
+    updated only if their nutrients, category or aliases changed, so the import
+    can be re-run safely. A food keeps the values of the first source that
+    imported it; the report lists the foods a later source has different
+    values for.
+    A report with the rows inserted, updated and skipped and the throughput is
+    printed for every source.
+
+    A 'user_id' of 1 is assigned to all imported records by default, making them
+    available to the default user.
 
-        # 5. Use pandas' to_sql() function for an efficient bulk insert
-        df_to_insert.to_sql('food_library', conn, if_exists='append', index=False)
+    The function handles 'FileNotFoundError' for missing files and prints other
+    exceptions to the console, moving on to the next source.
 
-        print(f"Successfully imported {len(df_to_insert)} records into the 'food_library' table.")
+    Args:
+        source_names (list[str] | None): The sources to import. Defaults to all registered sources.
+        db_file (str): Path to the SQLite database file.
+        user_id (int): The user whose library receives the foods.
+        chunk_size (int): The number of CSV rows read and written at a time.
+        force (bool): Re-import files whose contents were imported before.
 
-    except FileNotFoundError:
-        print(f"Error: The file '{INDIAN_FOOD_CSV}' was not found.")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    Returns:
+        list[ImportReport]: One report per source that was processed.
+    """
+    repo = Repository(db_file)
+    reports = []
+    try:
+        for name in source_names or list(SOURCES):
+            source = SOURCES[name]
+            try:
+                report = import_source(repo, source, user_id, chunk_size, force)
+            except FileNotFoundError:
+                print(f"Error: The file '{source.path}' was not found."); continue
+            except Exception as e:
+                print(f"An error occurred while importing '{source.path}': {e}"); continue
+            print(report); reports.append(report)
     finally:
-        if conn:
-            conn.close()
+        repo.close()
+    return reports
 
 if __name__ == '__main__':
-    populate_food_library()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Import the bundled food datasets into the food library.")
+    parser.add_argument('sources', nargs='*', metavar='source', help=f"sources to import: {', '.join(SOURCES)} (default: all)")
+    parser.add_argument('--force', action='store_true', help="re-import files that were imported before")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="rows read and written per chunk")
+    args = parser.parse_args()
+    unknown = [name for name in args.sources if name not in SOURCES]
+    if unknown: parser.error(f"unknown source(s): {', '.join(unknown)}")
+    populate_food_library(args.sources, chunk_size=args.chunk_size, force=args.force)
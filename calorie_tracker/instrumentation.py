@@ -0,0 +1,259 @@
+import atexit
+import bisect
+import functools
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Instrumentation settings
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+DEFAULT_SLOW_QUERY_MS = 50.0
+SLOW_LOG_SIZE = 200
+PROFILE_LOG_SIZE = 5
+PROFILE_STATS_LINES = 40
+MAX_LOGGED_STATEMENTS = 10
+
+
+class Histogram:
+    """
+    Latency distribution of one instrumented call, in fixed millisecond buckets.
+
+    Attributes:
+        buckets (list[int]): Calls per bucket; bucket i counts latencies up to
+            HISTOGRAM_BOUNDS_MS[i], and the last one everything slower.
+        count (int): Number of calls.
+        total_ms (float): Summed latency.
+        max_ms (float): Slowest call.
+        rows (int): Rows returned, summed over the calls.
+    """
+    def __init__(self):
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.count = 0; self.total_ms = 0.0; self.max_ms = 0.0; self.rows = 0
+
+    def add(self, ms, rows=0):
+        self.buckets[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, ms)] += 1
+        self.count += 1; self.total_ms += ms; self.max_ms = max(self.max_ms, ms); self.rows += rows
+
+    def percentile(self, fraction):
+        """Returns the upper bound of the bucket holding the given fraction of calls, capped at the slowest call."""
+        threshold = fraction * self.count; seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= threshold and count: return min(HISTOGRAM_BOUNDS_MS[i], self.max_ms) if i < len(HISTOGRAM_BOUNDS_MS) else self.max_ms
+        return 0.0
+
+    def to_dict(self):
+        return {'count': self.count, 'mean_ms': round(self.total_ms / self.count, 4) if self.count else 0.0,
+                'p50_ms': self.percentile(0.5), 'p95_ms': self.percentile(0.95), 'max_ms': round(self.max_ms, 4),
+                'rows': self.rows, 'buckets': dict(zip([*map(str, HISTOGRAM_BOUNDS_MS), 'inf'], self.buckets))}
+
+
+class Metrics:
+    """
+    Opt-in latency metrics for the tracker's database and UI hot paths.
+
+    Until `enable` is called every instrumented call goes straight through to
+    the wrapped function. Once enabled, each call records its latency and row
+    count in a per-name Histogram. SQL executed on a connection prepared with
+    `attach` is traced and credited to the instrumented calls running on that
+    thread, and 'db.' calls slower than `slow_query_ms` are added to the slow
+    query log with their SQL text.
+
+    `arm_profile` makes the next top-level UI action, and the next request the
+    database worker runs, execute under cProfile; their statistics are kept in
+    `profiles` and written to the dump file.
+
+    Attributes:
+        enabled (bool): Whether calls are being measured.
+        slow_query_ms (float): The latency above which a database call is logged as slow.
+        dump_path (str | None): Where `dump` writes the metrics; also written at exit.
+        profiles (deque[dict]): The latest cProfile captures.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = DEFAULT_SLOW_QUERY_MS
+        self.dump_path = None
+        self.profiles = deque(maxlen=PROFILE_LOG_SIZE)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._histograms = {}
+        self._slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+        self._profile_ui = self._profile_worker = False
+        self._started = datetime.now()
+
+    def enable(self, dump_path=None, slow_query_ms=DEFAULT_SLOW_QUERY_MS):
+        """
+        Starts measuring. Call it before the first database connection is opened,
+        so that connections get the SQL trace callback.
+        """
+        self.enabled = True; self.slow_query_ms = slow_query_ms
+        if dump_path and self.dump_path is None: atexit.register(self.dump)
+        self.dump_path = dump_path or self.dump_path
+
+    def attach(self, conn):
+        """Traces the SQL run on a new connection, if metrics are enabled."""
+        if self.enabled: conn.set_trace_callback(self._trace_sql)
+
+    def record(self, name, ms, rows=0):
+        """Adds one call's latency and row count to the histogram for `name`."""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None: histogram = self._histograms[name] = Histogram()
+            histogram.add(ms, rows)
+
+    def call(self, name, func, args, kwargs):
+        """Runs an instrumented function, measuring it and collecting the SQL it executes."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None: stack = self._local.stack = []
+        if not stack and name.startswith('ui.') and self._profile_ui:
+            self._profile_ui = False
+            return self.profile(name, lambda: self._measure(name, func, args, kwargs, stack))
+        return self._measure(name, func, args, kwargs, stack)
+
+    def _measure(self, name, func, args, kwargs, stack):
+        statements = []
+        stack.append(statements)
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            stack.pop()
+        self.record(name, ms, _row_count(result))
+        if ms >= self.slow_query_ms and name.startswith('db.'):
+            with self._lock:
+                self._slow_queries.append({'name': name, 'ms': round(ms, 3), 'at': datetime.now().isoformat(timespec='milliseconds'),
+                                           'thread': threading.current_thread().name, 'sql': statements[:MAX_LOGGED_STATEMENTS]})
+        return result
+
+    def _trace_sql(self, statement):
+        stack = getattr(self._local, 'stack', None)
+        if not stack: return
+        statement = ' '.join(statement.split())
+        for statements in stack:
+            statements.append(statement)
+
+    # --- Profiling ---
+
+    def arm_profile(self):
+        """Profiles the next top-level UI action and the next database worker request."""
+        self._profile_ui = self._profile_worker = True
+
+    def take_worker_profile(self):
+        """Returns True, once, if the database worker should profile its next request."""
+        if not self._profile_worker: return False
+        self._profile_worker = False
+        return True
+
+    def profile(self, label, func):
+        """Runs `func()` under cProfile and keeps the statistics of its slowest functions."""
+        import cProfile, io, pstats
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func)
+        finally:
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_STATS_LINES)
+            self.profiles.append({'label': label, 'at': datetime.now().isoformat(timespec='seconds'),
+                                  'thread': threading.current_thread().name, 'stats': out.getvalue()})
+
+    # --- Reporting ---
+
+    def snapshot(self):
+        """Returns the metrics as a JSON-serializable dict."""
+        with self._lock:
+            calls = {name: histogram.to_dict() for name, histogram in sorted(self._histograms.items())}
+            slow_queries = list(self._slow_queries)
+        return {'started': self._started.isoformat(timespec='seconds'), 'now': datetime.now().isoformat(timespec='seconds'),
+                'slow_query_ms': self.slow_query_ms, 'calls': calls, 'slow_queries': slow_queries, 'profiles': list(self.profiles)}
+
+    def dump(self, path=None):
+        """Writes the snapshot as JSON to `path` (default: dump_path) and returns the path written, if any."""
+        import json
+        path = path or self.dump_path
+        if not path: return None
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        return path
+
+    def reset(self):
+        """Forgets every measurement, slow query and profile."""
+        with self._lock:
+            self._histograms.clear(); self._slow_queries.clear(); self.profiles.clear()
+            self._started = datetime.now()
+
+
+class StartupProfile:
+    """
+    Times the milestones of the app's cold start for --startup-profile.
+
+    `mark` records when each milestone is first reached, in seconds since
+    `started` (taken by main.py before its imports). Once every expected
+    milestone has been reached the report is printed. Marks are ignored until
+    `enable` is called, and after the report.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.started = 0.0
+        self.expected = ()
+        self.marks = {}
+
+    def enable(self, started, expected):
+        self.enabled = True; self.started = started; self.expected = tuple(expected)
+
+    def mark(self, milestone):
+        """Records a milestone, printing the report if it was the last one expected."""
+        if not self.enabled or milestone in self.marks: return
+        self.marks[milestone] = time.perf_counter() - self.started
+        if all(name in self.marks for name in self.expected):
+            self.enabled = False
+            print(self.report())
+
+    def report(self):
+        """Lists the milestones in the order reached, with the time since launch and since the previous one."""
+        lines = ["Startup profile (ms since launch, +ms since the previous step):"]; previous = 0.0
+        for milestone, seconds in sorted(self.marks.items(), key=lambda item: item[1]):
+            lines.append(f"  {seconds * 1000:8.1f}  +{(seconds - previous) * 1000:7.1f}  {milestone}"); previous = seconds
+        return '\n'.join(lines)
+
+
+def _row_count(result):
+    """Counts the rows a call returned: the length of a list or dict, 0 for None and 1 otherwise."""
+    if result is None: return 0
+    if isinstance(result, (list, dict)): return len(result)
+    return 1
+
+
+_metrics = Metrics()
+
+_startup_profile = StartupProfile()
+
+def get_metrics():
+    """Returns the process-wide Metrics instance."""
+    return _metrics
+
+def get_startup_profile():
+    """Returns the process-wide StartupProfile."""
+    return _startup_profile
+
+def instrumented(name, func):
+    """Wraps `func` so its calls are measured under `name` while metrics are enabled."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _metrics.enabled: return func(*args, **kwargs)
+        return _metrics.call(name, func, args, kwargs)
+    return wrapper
+
+def instrument_class(cls, prefix, exclude=(), include=()):
+    """
+    Instruments the public methods a class defines itself, as '<prefix>.<Class>.<method>'.
+
+    Inherited methods (such as Tk's) and names starting with an underscore are
+    left alone, as are the names in `exclude`. Underscore methods named in
+    `include` are instrumented too.
+    """
+    for attr, value in list(vars(cls).items()):
+        if (attr.startswith('_') and attr not in include) or attr in exclude or not callable(value) or isinstance(value, (staticmethod, classmethod, type)): continue
+        setattr(cls, attr, instrumented(f'{prefix}.{cls.__name__}.{attr}', value))
+    return cls
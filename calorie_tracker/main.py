@@ -1,8 +1,29 @@
+import time
+# Read before the other imports so that --startup-profile counts them
+LAUNCHED_AT = time.perf_counter()
+
+import argparse
+import math
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 from datetime import date
-from ttkthemes import ThemedTk
+from db_worker import get_worker
+from instrumentation import DEFAULT_SLOW_QUERY_MS, get_metrics, get_startup_profile, instrument_class
+from tracker_core import DEFAULT_USER_ID, FoodNotFoundError
+
+# Search settings
+SEARCH_DEBOUNCE_MS = 150
+SEARCH_RESULT_LIMIT = 50
+
+# Trends settings
+TREND_RANGES = {'Last 30 days': 30, 'Last 90 days': 90, 'Last year': 365}
+
+# Metrics settings
+DEFAULT_METRICS_FILE = 'metrics.json'
+
+# Startup settings
+THEME = 'arc'
+STARTUP_MILESTONES = ('window shown', 'theme applied', 'summary shown', 'log shown', 'search ready')
 
 # --- CLASS DEFINITIONS ---
 
@@ -13,17 +34,20 @@ class SummaryFrame(ttk.Frame):
     This frame shows the total calories consumed against the daily goal, a progress bar
     representing the calorie intake, and a breakdown of protein, carbohydrates, and fat.
     The summary is automatically updated when the application starts and whenever a new
-    food item is logged.
+    food item is logged, together with the trends window if it is open.
 
     Attributes:
+        user_id (int): The user whose intake is shown.
+        trends_window (TrendsWindow | None): The open trends window, if any.
         calories_var (tk.StringVar): Holds the formatted string for calorie intake.
         protein_var (tk.StringVar): Holds the formatted string for protein intake.
         carbs_var (tk.StringVar): Holds the formatted string for carbohydrate intake.
         fat_var (tk.StringVar): Holds the formatted string for fat intake.
         progress_var (tk.DoubleVar): Holds the value for the calorie progress bar.
     """
-    def __init__(self, container):
+    def __init__(self, container, user_id=DEFAULT_USER_ID):
         super().__init__(container)
+        self.user_id = user_id
         self.calories_var = tk.StringVar(value='0 / 2000 kcal')
         self.protein_var = tk.StringVar(value='Protein: 0g')
         self.carbs_var = tk.StringVar(value='Carbs: 0g')
@@ -37,32 +61,40 @@ class SummaryFrame(ttk.Frame):
         ttk.Label(macro_frame, textvariable=self.protein_var).pack(side='left', expand=True)
         ttk.Label(macro_frame, textvariable=self.carbs_var).pack(side='left', expand=True)
         ttk.Label(macro_frame, textvariable=self.fat_var).pack(side='left', expand=True)
-        self.update_summary()
+        ttk.Button(self, text="Show Trends", command=self.open_trends_window).pack(pady=(5, 0))
+        self.trends_window = None
 
     def update_summary(self):
         """
-        Fetches and displays the latest nutritional summary from the database.
+        Requests the latest nutritional summary from the database worker.
 
-        This method connects to the database, retrieves the user's daily calorie goal,
-        and calculates the total calories, protein, carbohydrates, and fat consumed
-        for the current day. It then updates the corresponding UI elements with the
-        new values and adjusts the progress bar accordingly.
+        This method asks the worker for the user's daily calorie goal together
+        with the pre-aggregated calories, protein, carbohydrates, and fat totals
+        for the current day, read in a single lookup. A newer request replaces one
+        that is still pending, and the result is shown by `render_summary`.
         """
-        conn = None
-        try:
-            conn = sqlite3.connect('calorie_tracker.db'); cursor = conn.cursor(); today = date.today().isoformat(); user_id = 1
-            cursor.execute("SELECT daily_calorie_goal FROM users WHERE user_id = ?", (user_id,)); result = cursor.fetchone()
-            calorie_goal = result[0] if result else 2000
-            cursor.execute('SELECT SUM(calories), SUM(protein_g), SUM(carbs_g), SUM(fat_g) FROM food_log WHERE user_id = ? AND entry_date = ?', (user_id, today))
-            summary = cursor.fetchone()
-            total_cal, total_pro, total_carb, total_fat = (summary[0] or 0, summary[1] or 0, summary[2] or 0, summary[3] or 0)
-            self.calories_var.set(f'{total_cal:.0f} / {calorie_goal} kcal')
-            self.protein_var.set(f'Protein: {total_pro:.1f}g'); self.carbs_var.set(f'Carbs: {total_carb:.1f}g'); self.fat_var.set(f'Fat: {total_fat:.1f}g')
-            self.progress_var.set((total_cal / calorie_goal) * 100)
-        except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Could not update summary: {e}")
-        finally:
-            if conn: conn.close()
+        today = date.today().isoformat(); user_id = self.user_id
+        get_worker().submit(lambda core: core.get_summary(user_id, today), callback=self.render_summary,
+                            error_callback=lambda e: messagebox.showerror("Database Error", f"Could not update summary: {e}"), key='summary')
+        if self.trends_window is not None: self.trends_window.update_trends()
+
+    def render_summary(self, summary):
+        """Updates the labels and progress bar from a (calorie_goal, calories, protein_g, carbs_g, fat_g) summary."""
+        calorie_goal, total_cal, total_pro, total_carb, total_fat = summary
+        get_startup_profile().mark('summary shown')
+        self.calories_var.set(f'{total_cal:.0f} / {calorie_goal} kcal')
+        self.protein_var.set(f'Protein: {total_pro:.1f}g'); self.carbs_var.set(f'Carbs: {total_carb:.1f}g'); self.fat_var.set(f'Fat: {total_fat:.1f}g')
+        self.progress_var.set((total_cal / calorie_goal) * 100)
+
+    def open_trends_window(self):
+        """Opens the trends window, or raises it if it is already open."""
+        if self.trends_window is not None: self.trends_window.lift(); return
+        self.trends_window = TrendsWindow(self.winfo_toplevel(), self.user_id)
+        self.trends_window.bind('<Destroy>', self.on_trends_closed, add='+')
+
+    def on_trends_closed(self, event):
+        """Forgets the trends window once it is destroyed (the binding also sees its children's Destroy events)."""
+        if event.widget is self.trends_window: self.trends_window = None
 
 class AddNewFoodWindow(tk.Toplevel):
     """
@@ -76,10 +108,11 @@ class AddNewFoodWindow(tk.Toplevel):
     Attributes:
         log_frame (DailyLogFrame): A reference to the daily log frame to refresh it.
         summary_frame (SummaryFrame): A reference to the summary frame to update it.
+        user_id (int): The user whose library receives the food.
     """
-    def __init__(self, master, log_frame, summary_frame):
+    def __init__(self, master, log_frame, summary_frame, user_id=DEFAULT_USER_ID):
         super().__init__(master)
-        self.log_frame = log_frame; self.summary_frame = summary_frame
+        self.log_frame = log_frame; self.summary_frame = summary_frame; self.user_id = user_id
         self.title("Add New Food"); self.geometry("350x250")
         self.frame = ttk.Frame(self, padding="10"); self.frame.pack(fill="both", expand=True)
 
@@ -98,7 +131,8 @@ class AddNewFoodWindow(tk.Toplevel):
         ttk.Label(self.frame, text="Fat (g):").grid(row=4, column=0, padx=5, pady=5, sticky="w")
         self.fat_entry = ttk.Entry(self.frame); self.fat_entry.grid(row=4, column=1, padx=5, pady=5, sticky="ew")
 
-        ttk.Button(self.frame, text="Save Food", command=self.save_food).grid(row=5, column=1, padx=5, pady=10, sticky="e")
+        self.save_button = ttk.Button(self.frame, text="Save Food", command=self.save_food)
+        self.save_button.grid(row=5, column=1, padx=5, pady=10, sticky="e")
 
     def save_food(self):
         """
@@ -106,9 +140,9 @@ class AddNewFoodWindow(tk.Toplevel):
 
         This method retrieves the data from the entry fields, validates that the
         required fields are filled and that the numerical fields contain valid
-        numbers, and then inserts the new food item into both the 'food_library'
-        and 'food_log' tables. After a successful save, it refreshes the daily
-        log and summary frames and closes the window.
+        numbers, and then has the database worker add the new food item to the
+        library and log it, in a single transaction.
+        The Save button is disabled until the worker replies.
         """
         food_name=self.food_name_entry.get(); calories=self.calories_entry.get()
         protein=self.protein_entry.get() or '0'; carbs=self.carbs_entry.get() or '0'; fat=self.fat_entry.get() or '0'
@@ -120,20 +154,20 @@ class AddNewFoodWindow(tk.Toplevel):
         except ValueError:
             messagebox.showerror("Input Error", "Please enter valid numbers.", parent=self); return
 
-        conn = None
-        try:
-            conn = sqlite3.connect('calorie_tracker.db'); cursor = conn.cursor(); user_id=1; today=date.today().isoformat()
-            cursor.execute('INSERT OR IGNORE INTO food_library (user_id, food_name, calories, protein_g, carbs_g, fat_g) VALUES (?, ?, ?, ?, ?, ?)',
-                           (user_id, food_name, base_calories, base_protein, base_carbs, base_fat))
-            cursor.execute('INSERT INTO food_log (user_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                           (user_id, today, 1, food_name, base_calories, base_protein, base_carbs, base_fat))
-            conn.commit()
-            self.log_frame.load_log(); self.summary_frame.update_summary()
-            self.destroy()
-        except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"An error occurred: {e}", parent=self)
-        finally:
-            if conn: conn.close()
+        user_id=self.user_id; today=date.today().isoformat()
+        self.save_button.state(['disabled'])
+        get_worker().submit(lambda core: core.add_food(user_id, food_name, base_calories, base_protein, base_carbs, base_fat, entry_date=today),
+                            callback=self.on_food_saved, error_callback=self.on_save_error)
+
+    def on_food_saved(self, log_id):
+        """Refreshes the daily log and summary frames and closes the window."""
+        self.log_frame.refresh_log(); self.summary_frame.update_summary()
+        self.destroy()
+
+    def on_save_error(self, error):
+        """Reports a failed save and re-enables the Save button."""
+        self.save_button.state(['!disabled'])
+        messagebox.showerror("Database Error", f"An error occurred: {error}", parent=self)
 
 class DataEntryFrame(ttk.Frame):
     """
@@ -143,19 +177,27 @@ class DataEntryFrame(ttk.Frame):
     and buttons to add a selected food to the daily log or to open the window
     for adding a new food item. The search results are displayed in a listbox.
 
+    Searches run against the tracker core's in-memory index of the library's food
+    names, which the database worker loads once in the background, and keystrokes
+    are debounced so a search only runs once the user pauses typing. The prefix
+    matches from the index are shown at once and then replaced by the ranked
+    full-text search, which the database worker runs.
+
     Attributes:
         log_frame (DailyLogFrame): A reference to the daily log frame to refresh it.
         summary_frame (SummaryFrame): A reference to the summary frame to update it.
+        user_id (int): The user whose library is searched and who logs the food.
     """
-    def __init__(self, container, log_frame, summary_frame):
+    def __init__(self, container, log_frame, summary_frame, user_id=DEFAULT_USER_ID):
         super().__init__(container)
-        self.log_frame = log_frame; self.summary_frame = summary_frame
+        self.log_frame = log_frame; self.summary_frame = summary_frame; self.user_id = user_id
+        self._search_after_id = None; self._shown_results = []
         self.columnconfigure(0, weight=3); self.columnconfigure(1, weight=1)
 
         ttk.Label(self, text="Search for Food:").grid(row=0, column=0, padx=5, pady=(0,5), sticky="w")
         ttk.Label(self, text="Qty:").grid(row=0, column=1, padx=5, pady=(0,5), sticky="w")
 
-        self.search_var = tk.StringVar(); self.search_var.trace_add("write", self.update_search_results)
+        self.search_var = tk.StringVar(); self.search_var.trace_add("write", self.schedule_search)
         self.search_entry = ttk.Entry(self, textvariable=self.search_var)
         self.search_entry.grid(row=1, column=0, padx=5, pady=5, sticky="ew")
 
@@ -163,41 +205,74 @@ class DataEntryFrame(ttk.Frame):
         self.quantity_entry = ttk.Entry(self, textvariable=self.quantity_var, width=5)
         self.quantity_entry.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
 
-        self.results_listbox = tk.Listbox(self, height=5)
+        self.results_listbox = tk.Listbox(self, height=5, selectmode='extended')
         self.results_listbox.grid(row=2, column=0, columnspan=2, padx=5, pady=5, sticky="ew")
 
         ttk.Button(self, text="Add Selected", command=self.add_selected_food).grid(row=3, column=0, padx=5, pady=10, sticky="ew")
         ttk.Button(self, text="Add New Food", command=self.open_new_food_window).grid(row=3, column=1, padx=5, pady=10, sticky="ew")
+        ttk.Button(self, text="Plan My Day", command=self.open_planner_window).grid(row=4, column=0, padx=5, sticky="ew")
+        ttk.Button(self, text="Recipes", command=self.open_recipes_window).grid(row=4, column=1, padx=5, sticky="ew")
 
-    def update_search_results(self, *args):
+    def load_search_index(self):
+        """Asks the database worker to build the user's search index from the food library."""
+        user_id = self.user_id
+        get_worker().submit(lambda core: core.get_search_index(user_id), callback=self.on_search_index_loaded,
+                            error_callback=lambda e: print(f"Database search error: {e}"), key='search_index')
+
+    def on_search_index_loaded(self, search_index):
+        """Re-runs any search typed while the index was loading."""
+        get_startup_profile().mark('search ready')
+        if self.search_var.get(): self._shown_results = None; self.update_search_results()
+
+    def schedule_search(self, *args):
         """
-        Updates the search results listbox as the user types in the search bar.
+        Debounces keystrokes in the search bar.
 
         This method is triggered whenever the content of the search entry changes.
-        It queries the 'food_library' table for food names that match the search
-        term and displays the results in the listbox.
+        It cancels any search still waiting to run and schedules a new one, so a
+        burst of typing results in a single search.
         """
-        search_term = self.search_var.get(); self.results_listbox.delete(0, 'end')
-        if not search_term: return
-        conn = None
-        try:
-            conn = sqlite3.connect('calorie_tracker.db'); cursor = conn.cursor()
-            cursor.execute("SELECT food_name FROM food_library WHERE user_id = 1 AND food_name LIKE ?", (f'{search_term}%',))
-            for row in cursor.fetchall():
-                self.results_listbox.insert('end', row[0])
-        except sqlite3.Error as e:
-            print(f"Database search error: {e}")
-        finally:
-            if conn: conn.close()
+        if self._search_after_id is not None: self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(SEARCH_DEBOUNCE_MS, self.update_search_results)
+
+    def update_search_results(self, *args):
+        """
+        Updates the search results listbox with the food names matching the search bar.
+
+        This method looks up the search term in the core's in-memory name index
+        (without touching the database) and shows at most SEARCH_RESULT_LIMIT
+        matches, then asks the database worker for the ranked, typo-tolerant
+        matches, which `render_search_results` shows in their place.
+        """
+        self._search_after_id = None
+        search_term = self.search_var.get(); user_id = self.user_id
+        self.render_search_results(get_worker().core.search_foods(user_id, search_term, limit=SEARCH_RESULT_LIMIT, load=False))
+        if search_term.strip():
+            get_worker().submit(lambda core: core.find_foods(user_id, search_term, limit=SEARCH_RESULT_LIMIT),
+                                callback=lambda results: self.render_search_results(results, search_term),
+                                error_callback=lambda e: print(f"Database search error: {e}"), key='food_search')
+
+    def render_search_results(self, results, search_term=None):
+        """
+        Shows food names in the results listbox, which is only repopulated when they differ from the ones displayed.
+
+        Results for a `search_term` that is no longer in the search bar are dropped.
+        """
+        if search_term is not None and search_term != self.search_var.get(): return
+        if results == self._shown_results: return
+        self.results_listbox.delete(0, 'end')
+        if results: self.results_listbox.insert('end', *results)
+        self._shown_results = results
 
     def add_selected_food(self):
         """
-        Adds the selected food item from the search results to the daily log.
+        Adds the selected food items from the search results to the daily log.
 
-        This method retrieves the selected food and the specified quantity,
-        calculates the nutritional values based on the quantity, and inserts
-        a new record into the 'food_log' table. It then refreshes the daily
-        log and summary frames.
+        This method validates the selection and the specified quantity, then has
+        the database worker log every selected food with that quantity through
+        the tracker core, which scales their nutritional values and writes them
+        all in a single transaction. The result is handled by `on_food_logged`,
+        so the log and summary refresh once however many foods were selected.
         """
         try:
             quantity = float(self.quantity_var.get())
@@ -211,104 +286,598 @@ class DataEntryFrame(ttk.Frame):
             messagebox.showwarning("No Selection", "Please select a food from the list.")
             return
 
-        food_name = self.results_listbox.get(indices[0])
-        conn = None
-        try:
-            conn = sqlite3.connect('calorie_tracker.db'); cursor = conn.cursor()
-            cursor.execute("SELECT * FROM food_library WHERE user_id = 1 AND food_name = ?", (food_name,))
-            food_data = cursor.fetchone()
-
-            if not food_data:
-                messagebox.showerror("Error", "Could not find details."); return
-
-            _, user_id, name, base_cal, base_pro, base_carb, base_fat = food_data
-            final_cal = (base_cal or 0) * quantity
-            final_pro = (base_pro or 0) * quantity
-            final_carb = (base_carb or 0) * quantity
-            final_fat = (base_fat or 0) * quantity
+        foods = [(self.results_listbox.get(i), quantity) for i in indices]; today = date.today().isoformat(); user_id = self.user_id
+        get_worker().submit(lambda core: core.log_meal(user_id, foods=foods, entry_date=today),
+                            callback=self.on_food_logged, error_callback=self.on_log_error)
 
-            today = date.today().isoformat()
-            cursor.execute('''INSERT INTO food_log (user_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g)
-                              VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                           (user_id, today, quantity, name, final_cal, final_pro, final_carb, final_fat))
-            conn.commit()
+    def on_food_logged(self, log_ids):
+        """Refreshes the daily log and summary frames and clears the form once an entry is logged."""
+        self.log_frame.refresh_log(); self.summary_frame.update_summary()
+        self.search_var.set(""); self.quantity_var.set("1")
 
-            self.log_frame.load_log(); self.summary_frame.update_summary()
-            self.search_var.set(""); self.quantity_var.set("1")
-
-        except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Error adding entry: {e}")
-        finally:
-            if conn: conn.close()
+    def on_log_error(self, error):
+        """Reports a food that could not be logged."""
+        if isinstance(error, FoodNotFoundError):
+            messagebox.showerror("Error", "Could not find details.")
+        else:
+            messagebox.showerror("Database Error", f"Error adding entry: {error}")
 
     def open_new_food_window(self):
         """Opens the 'Add New Food' window as a modal dialog."""
-        new_window = AddNewFoodWindow(self.master, self.log_frame, self.summary_frame)
+        new_window = AddNewFoodWindow(self.master, self.log_frame, self.summary_frame, self.user_id)
         new_window.transient(self.master); new_window.grab_set()
         self.master.wait_window(new_window)
 
+    def open_planner_window(self):
+        """Opens the meal planner window."""
+        PlannerWindow(self.master, self.log_frame, self.summary_frame, self.user_id).transient(self.master)
+
+    def open_recipes_window(self):
+        """Opens the recipes window."""
+        RecipesWindow(self.master, self.log_frame, self.summary_frame, self.user_id).transient(self.master)
+
 class DailyLogFrame(ttk.Frame):
     """
-    A ttk.Frame that displays the food items logged for the current day.
+    A ttk.Frame that displays the food items logged for the current day or, on request, the full history.
 
     This frame uses a ttk.Treeview widget to present the logged food items in a
     tabular format, with columns for quantity, food name, calories, protein,
     carbohydrates, and fat. The log is automatically loaded when the application
-    starts and is refreshed whenever a new food item is added.
+    starts. Rows are keyed by log_id, so after an addition `refresh_log` only
+    fetches and appends the newer entries instead of reloading the day.
+
+    In history mode the view is virtualized: only the rows that fit in the visible
+    window are materialized, fetched a page at a time from the database, and the
+    scrollbar is mapped onto the total number of entries. Scrolling reuses the
+    same Treeview items, so browsing thousands of entries stays responsive.
+
+    All reads go through the database worker. Log and page requests share one
+    key, so a newer request (a further scroll, or a switch between modes)
+    cancels any that have not been rendered yet.
+
+    Attributes:
+        user_id (int): The user whose entries are shown.
+        history_var (tk.BooleanVar): Whether the frame shows the paged history instead of today's log.
     """
-    def __init__(self, container):
+    def __init__(self, container, user_id=DEFAULT_USER_ID):
         super().__init__(container)
-        columns = ('quantity', 'food_name', 'calories', 'protein_g', 'carbs_g', 'fat_g')
-        self.tree = ttk.Treeview(self, columns=columns, show='headings', selectmode="browse")
+        self.user_id = user_id
+        columns = ('entry_date', 'quantity', 'food_name', 'calories', 'protein_g', 'carbs_g', 'fat_g')
+        self.tree = ttk.Treeview(self, columns=columns, displaycolumns=columns[1:], show='headings', selectmode="browse")
 
+        self.tree.heading('entry_date', text='Date')
         self.tree.heading('quantity', text='Qty'); self.tree.heading('food_name', text='Food')
         self.tree.heading('calories', text='Calories'); self.tree.heading('protein_g', text='Protein (g)')
         self.tree.heading('carbs_g', text='Carbs (g)'); self.tree.heading('fat_g', text='Fat (g)')
 
+        self.tree.column('entry_date', width=90, anchor='center')
         self.tree.column('quantity', width=40, anchor='center'); self.tree.column('food_name', width=200)
         self.tree.column('calories', width=80, anchor='center'); self.tree.column('protein_g', width=80, anchor='center')
         self.tree.column('carbs_g', width=80, anchor='center'); self.tree.column('fat_g', width=80, anchor='center')
 
-        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scroll)
+        self.tree.configure(yscrollcommand=self.scrollbar.set)
 
-        self.tree.grid(row=0, column=0, sticky='nsew'); scrollbar.grid(row=0, column=1, sticky='ns')
+        self.history_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self, text="Show full history", variable=self.history_var, command=self.toggle_history).grid(row=1, column=0, pady=(5, 0), sticky='w')
+
+        self.tree.grid(row=0, column=0, sticky='nsew'); self.scrollbar.grid(row=0, column=1, sticky='ns')
         self.grid_rowconfigure(0, weight=1); self.grid_columnconfigure(0, weight=1)
-        self.load_log()
+        self.tree.bind('<Configure>', self.on_resize)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'): self.tree.bind(sequence, self.on_mousewheel)
+
+        self._log_date = None; self._last_log_id = 0
+        self._history_range = None; self._history_total = 0; self._history_offset = 0
+
+    # --- Today's log ---
 
     def load_log(self):
         """
-        Clears the current log and loads the food entries for the current day.
+        Clears the current view and loads the food entries for the current day.
+
+        This method switches the frame back to today's log, empties the Treeview
+        and requests every entry for the current user and date from the database
+        worker.
+        """
+        self._history_range = None; self.history_var.set(False)
+        self.tree.configure(displaycolumns=self.tree['columns'][1:], yscrollcommand=self.scrollbar.set)
+        self.tree.delete(*self.tree.get_children())
+        self._log_date = date.today().isoformat(); self._last_log_id = 0
+        self.refresh_log()
+
+    def refresh_log(self):
+        """
+        Brings the view up to date after entries were added.
+
+        For today's log, only the entries with a log_id above the last one shown
+        are fetched and appended; if the date has rolled over since the log was
+        loaded, the new day is loaded instead. In history mode the entry count is
+        re-read and the visible window is redrawn.
+        """
+        if self._history_range is not None:
+            self.show_history(*self._history_range, offset=self._history_offset); return
+        if self._log_date != date.today().isoformat():
+            self.load_log(); return
+        user_id, log_date, after_log_id = self.user_id, self._log_date, self._last_log_id
+        get_worker().submit(lambda core: core.get_log(user_id, log_date, after_log_id=after_log_id),
+                            callback=self._render_rows, error_callback=self.show_error, key='log')
+
+    def _render_rows(self, rows):
+        """Appends or patches fetched rows of today's log."""
+        get_startup_profile().mark('log shown')
+        if self._history_range is not None: return
+        for row in rows: self._upsert_row(row)
+
+    def _upsert_row(self, row):
+        """Inserts or patches the Treeview item whose id is the row's log_id."""
+        log_id = row[0]; iid = str(log_id)
+        if self.tree.exists(iid): self.tree.item(iid, values=row[1:])
+        else: self.tree.insert('', 'end', iid=iid, values=row[1:])
+        self._last_log_id = max(self._last_log_id, log_id)
+
+    # --- Paged history ---
+
+    def toggle_history(self):
+        """Switches between today's log and the paged history view."""
+        if self.history_var.get(): self.show_history()
+        else: self.load_log()
+
+    def show_history(self, start_date='0001-01-01', end_date=None, offset=0):
+        """
+        Shows the entries between two dates as a virtualized, paged view.
+
+        Args:
+            start_date (str): The first ISO date to include.
+            end_date (str | None): The last ISO date to include. Defaults to today.
+            offset (int): The index of the first entry to show.
+        """
+        end_date = end_date or date.today().isoformat()
+        if self._history_range is None:
+            self.tree.delete(*self.tree.get_children())
+            self.tree.configure(displaycolumns=self.tree['columns'], yscrollcommand='')
+        self._history_range = (start_date, end_date); self.history_var.set(True)
+        self._show_window(offset, recount=True)
+
+    def _visible_rows(self):
+        """Returns how many rows fit in the Treeview at its current height."""
+        row_height = int(ttk.Style(self).lookup('Treeview', 'rowheight') or 20)
+        return max(1, self.tree.winfo_height() // row_height - 1)
+
+    def _show_window(self, offset, recount=False):
+        """
+        Requests the page of history starting at `offset`, re-reading the entry count first if `recount` is set.
 
-        This method connects to the database, fetches all food log entries for
-        the current user and date, and populates the Treeview widget with this
-        data.
+        The offset is recorded straight away so that further scrolling continues
+        from it while the page is still being fetched.
         """
-        for item in self.tree.get_children(): self.tree.delete(item)
-        conn = None
+        page_size = self._visible_rows(); user_id = self.user_id; start_date, end_date = self._history_range
+        known_total = None if recount else self._history_total
+        if known_total is not None: offset = min(offset, known_total - page_size)
+        self._history_offset = offset = max(0, offset)
+        get_worker().submit(lambda core: core.get_history_page(user_id, start_date, end_date, offset, page_size, total=known_total), callback=self._render_window, error_callback=self.show_error, key='log')
+
+    def _render_window(self, page):
+        """Draws a fetched (total, offset, rows) page of history into the existing Treeview items."""
+        if self._history_range is None: return
+        self._history_total, self._history_offset, rows = page
+        items = self.tree.get_children()
+        for item, row in zip(items, rows): self.tree.item(item, values=row[1:])
+        for row in rows[len(items):]: self.tree.insert('', 'end', values=row[1:])
+        if len(items) > len(rows): self.tree.delete(*items[len(rows):])
+        total = max(self._history_total, 1)
+        self.scrollbar.set(self._history_offset / total, (self._history_offset + len(rows)) / total)
+
+    def on_scroll(self, *args):
+        """Handles the scrollbar, moving the history window instead of the Treeview when paging."""
+        if self._history_range is None:
+            self.tree.yview(*args); return
+        if args[0] == 'moveto':
+            offset = round(float(args[1]) * self._history_total)
+        else:
+            step = self._visible_rows() if args[2] == 'pages' else 1
+            offset = self._history_offset + int(args[1]) * step
+        self._show_window(offset)
+
+    def on_mousewheel(self, event):
+        """Scrolls the history window with the mouse wheel; today's log keeps the default behaviour."""
+        if self._history_range is None: return None
+        direction = -1 if event.num == 4 or event.delta > 0 else 1
+        self._show_window(self._history_offset + direction * 3)
+        return 'break'
+
+    def on_resize(self, event):
+        """Redraws the history window when the Treeview's height changes how many rows fit."""
+        if self._history_range is not None: self._show_window(self._history_offset)
+
+    def show_error(self, error):
+        """Reports a failed log request."""
+        messagebox.showerror("Database Error", f"Could not load log: {error}")
+
+class PlannerWindow(tk.Toplevel):
+    """
+    A Toplevel window suggesting foods that fill the rest of today's goals.
+
+    The suggestions are computed by the tracker core's meal planner, which
+    scores the whole food library at once against the calories and macros
+    still left for the day. Logging the selected suggestion, or all of them in
+    one transaction, refreshes the log and summary and plans again with the new
+    budget.
+
+    Attributes:
+        log_frame (DailyLogFrame): A reference to the daily log frame to refresh it.
+        summary_frame (SummaryFrame): A reference to the summary frame to update it.
+        user_id (int): The user the plan is for.
+    """
+    def __init__(self, master, log_frame, summary_frame, user_id=DEFAULT_USER_ID):
+        super().__init__(master)
+        self.log_frame = log_frame; self.summary_frame = summary_frame; self.user_id = user_id
+        self.title("Plan My Day"); self.geometry("640x320")
+        self.frame = ttk.Frame(self, padding="10"); self.frame.pack(fill="both", expand=True)
+        self.frame.columnconfigure(0, weight=1); self.frame.rowconfigure(1, weight=1)
+
+        self.budget_var = tk.StringVar(value="Planning...")
+        ttk.Label(self.frame, textvariable=self.budget_var).grid(row=0, column=0, columnspan=2, pady=(0, 5), sticky='w')
+
+        columns = ('food_name', 'quantity', 'calories', 'protein_g', 'carbs_g', 'fat_g')
+        self.tree = ttk.Treeview(self.frame, columns=columns, show='headings', selectmode='browse', height=6)
+        for column, heading, width in zip(columns, ('Food', 'Qty', 'Calories', 'Protein (g)', 'Carbs (g)', 'Fat (g)'), (220, 40, 70, 80, 70, 70)):
+            self.tree.heading(column, text=heading); self.tree.column(column, width=width, anchor='w' if column == 'food_name' else 'center')
+        self.tree.grid(row=1, column=0, columnspan=2, sticky='nsew')
+
+        self.total_var = tk.StringVar()
+        ttk.Label(self.frame, textvariable=self.total_var).grid(row=2, column=0, columnspan=2, pady=5, sticky='w')
+        ttk.Button(self.frame, text="Refresh", command=self.update_plan).grid(row=3, column=0, sticky='w')
+        buttons = ttk.Frame(self.frame); buttons.grid(row=3, column=1, sticky='e')
+        self.log_button = ttk.Button(buttons, text="Log Selected", command=self.log_selected); self.log_button.pack(side='left', padx=(0, 5))
+        self.log_all_button = ttk.Button(buttons, text="Log All", command=self.log_all); self.log_all_button.pack(side='left')
+        self.update_plan()
+
+    def update_plan(self):
+        """Asks the database worker for a plan of the rest of today; `render_plan` shows it."""
+        user_id = self.user_id; today = date.today().isoformat()
+        get_worker().submit(lambda core: core.plan_day(user_id, entry_date=today), callback=self.render_plan,
+                            error_callback=lambda e: self.budget_var.set(f"Could not plan: {e}"), key='plan')
+
+    def render_plan(self, plan):
+        """Shows the remaining budget and the suggested foods of a planner.MealPlan."""
+        if not self.winfo_exists(): return
+        budget = plan.remaining
+        parts = [f"{budget['calories']:.0f} kcal"] + [f"{label} {budget[name]:.0f}g" for name, label in
+                                                     (('protein_g', 'protein'), ('carbs_g', 'carbs'), ('fat_g', 'fat')) if budget[name] is not None]
+        self.budget_var.set("Left for today: " + ", ".join(parts))
+        self.tree.delete(*self.tree.get_children())
+        for food_name, quantity, scaled in plan.items:
+            self.tree.insert('', 'end', values=(food_name, f'{quantity:g}', f"{scaled['calories']:.0f}", f"{scaled['protein_g']:.1f}",
+                                                f"{scaled['carbs_g']:.1f}", f"{scaled['fat_g']:.1f}"))
+        totals = plan.totals
+        self.total_var.set(f"Plan total: {totals['calories']:.0f} kcal, protein {totals['protein_g']:.1f}g, carbs {totals['carbs_g']:.1f}g, fat {totals['fat_g']:.1f}g"
+                           if plan.items else "Nothing to suggest: today's calorie goal has been reached.")
+
+    def log_selected(self):
+        """Logs the selected suggestion with its suggested quantity."""
+        selection = self.tree.selection()
+        if not selection:
+            messagebox.showwarning("No Selection", "Please select a suggestion to log.", parent=self); return
+        self.log_suggestions(selection)
+
+    def log_all(self):
+        """Logs every suggestion with its suggested quantity, in one transaction."""
+        if self.tree.get_children(): self.log_suggestions(self.tree.get_children())
+
+    def log_suggestions(self, items):
+        """Has the database worker log the given suggestion rows as one meal."""
+        foods = [(values[0], float(values[1])) for values in (self.tree.item(item, 'values') for item in items)]
+        user_id = self.user_id; today = date.today().isoformat()
+        self.log_button.state(['disabled']); self.log_all_button.state(['disabled'])
+        get_worker().submit(lambda core: core.log_meal(user_id, foods=foods, entry_date=today),
+                            callback=self.on_food_logged, error_callback=self.on_log_error)
+
+    def on_food_logged(self, log_ids):
+        """Refreshes the log and summary and plans the rest of the day again."""
+        self.log_frame.refresh_log(); self.summary_frame.update_summary()
+        if self.winfo_exists():
+            self.log_button.state(['!disabled']); self.log_all_button.state(['!disabled']); self.update_plan()
+
+    def on_log_error(self, error):
+        """Reports suggestions that could not be logged."""
+        if self.winfo_exists(): self.log_button.state(['!disabled']); self.log_all_button.state(['!disabled'])
+        messagebox.showerror("Database Error", f"Error adding entry: {error}")
+
+class RecipesWindow(tk.Toplevel):
+    """
+    A Toplevel window for browsing the user's recipes and logging servings of them.
+
+    Selecting a recipe shows its ingredients, marking those without a library
+    food, and its per-serving nutrition, which the tracker core reads from the
+    recipe_nutrition cache or computes from the ingredients. A logged recipe is
+    written as one entry for the chosen number of servings.
+
+    Attributes:
+        log_frame (DailyLogFrame): A reference to the daily log frame to refresh it.
+        summary_frame (SummaryFrame): A reference to the summary frame to update it.
+        user_id (int): The user whose recipes are shown.
+    """
+    def __init__(self, master, log_frame, summary_frame, user_id=DEFAULT_USER_ID):
+        super().__init__(master)
+        self.log_frame = log_frame; self.summary_frame = summary_frame; self.user_id = user_id
+        self.title("Recipes"); self.geometry("700x420")
+        self.frame = ttk.Frame(self, padding="10"); self.frame.pack(fill="both", expand=True)
+        self.frame.columnconfigure(1, weight=1); self.frame.rowconfigure(1, weight=1)
+
+        self.search_var = tk.StringVar(); self.search_var.trace_add("write", self.schedule_search)
+        self._search_after_id = None
+        ttk.Entry(self.frame, textvariable=self.search_var).grid(row=0, column=0, padx=(0, 10), pady=(0, 5), sticky='ew')
+        self.recipes_listbox = tk.Listbox(self.frame, width=30, exportselection=False)
+        self.recipes_listbox.grid(row=1, column=0, rowspan=2, padx=(0, 10), sticky='nsew')
+        self.recipes_listbox.bind('<<ListboxSelect>>', self.on_recipe_selected)
+
+        self.nutrition_var = tk.StringVar(value="Select a recipe.")
+        ttk.Label(self.frame, textvariable=self.nutrition_var, justify='left').grid(row=0, column=1, sticky='w')
+        self.ingredients_listbox = tk.Listbox(self.frame)
+        self.ingredients_listbox.grid(row=1, column=1, sticky='nsew')
+
+        controls = ttk.Frame(self.frame); controls.grid(row=2, column=1, pady=(5, 0), sticky='e')
+        ttk.Label(controls, text="Servings:").pack(side='left')
+        self.servings_var = tk.StringVar(value="1")
+        ttk.Entry(controls, textvariable=self.servings_var, width=5).pack(side='left', padx=5)
+        self.log_button = ttk.Button(controls, text="Log Recipe", command=self.log_recipe); self.log_button.pack(side='left')
+
+        self._recipe_name = None
+        self.update_search_results()
+
+    def schedule_search(self, *args):
+        """Debounces keystrokes in the search box, like the food search."""
+        if self._search_after_id is not None: self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(SEARCH_DEBOUNCE_MS, self.update_search_results)
+
+    def update_search_results(self):
+        """Asks the database worker for the recipe names starting with the search text."""
+        self._search_after_id = None
+        prefix = self.search_var.get(); user_id = self.user_id
+        get_worker().submit(lambda core: core.search_recipes(user_id, prefix, limit=SEARCH_RESULT_LIMIT), callback=self.render_search_results,
+                            error_callback=lambda e: self.nutrition_var.set(f"Could not search recipes: {e}"), key='recipe_search')
+
+    def render_search_results(self, names):
+        """Shows the recipe names found for the search text, unless the window has been closed meanwhile."""
+        if not self.winfo_exists(): return
+        self.recipes_listbox.delete(0, 'end')
+        if names: self.recipes_listbox.insert('end', *names)
+
+    def on_recipe_selected(self, event):
+        """Loads the selected recipe's ingredients and nutrition."""
+        indices = self.recipes_listbox.curselection()
+        if not indices: return
+        recipe_name = self.recipes_listbox.get(indices[0]); user_id = self.user_id
+        get_worker().submit(lambda core: core.get_recipe(user_id, recipe_name), callback=self.render_recipe,
+                            error_callback=lambda e: self.nutrition_var.set(f"Could not load recipe: {e}"), key='recipe')
+
+    def render_recipe(self, recipe):
+        """Shows a recipe returned by TrackerCore.get_recipe."""
+        if not self.winfo_exists(): return
+        self._recipe_name = recipe['recipe_name']; nutrition = recipe['nutrition']; macros = nutrition.macros
+        serving = f" ({recipe['serving_size']})" if recipe['serving_size'] else ""
+        text = (f"Per serving{serving}: {macros['calories']:.0f} kcal, protein {macros['protein_g']:.1f}g, "
+                f"carbs {macros['carbs_g']:.1f}g, fat {macros['fat_g']:.1f}g")
+        if nutrition.matched_ingredients < nutrition.total_ingredients:
+            text += f"\nFrom {nutrition.matched_ingredients} of {nutrition.total_ingredients} ingredients; those marked * are not in your library."
+        self.nutrition_var.set(text)
+        self.ingredients_listbox.delete(0, 'end')
+        for ingredient, amount, unit, food_name in recipe['ingredients']:
+            amount_text = f" - {amount:g} {unit or ''}".rstrip() if amount is not None else ""
+            self.ingredients_listbox.insert('end', f"{'' if food_name else '* '}{ingredient}{amount_text}" + (f"  ({food_name})" if food_name else ""))
+
+    def log_recipe(self):
+        """Logs the chosen number of servings of the selected recipe."""
         try:
-            conn = sqlite3.connect('calorie_tracker.db'); cursor = conn.cursor(); today = date.today().isoformat()
-            cursor.execute('SELECT quantity, food_name, calories, protein_g, carbs_g, fat_g FROM food_log WHERE user_id = 1 AND entry_date = ?', (today,))
-            for row in cursor.fetchall():
-                self.tree.insert('', 'end', values=row)
-        except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Could not load log: {e}")
-        finally:
-            if conn: conn.close()
+            servings = float(self.servings_var.get())
+            if servings <= 0: raise ValueError
+        except ValueError:
+            messagebox.showerror("Input Error", "Please enter a valid, positive number of servings.", parent=self); return
+        if self._recipe_name is None:
+            messagebox.showwarning("No Selection", "Please select a recipe.", parent=self); return
+        recipe_name = self._recipe_name; user_id = self.user_id; today = date.today().isoformat()
+        self.log_button.state(['disabled'])
+        get_worker().submit(lambda core: core.log_meal(user_id, recipes=[(recipe_name, servings)], entry_date=today),
+                            callback=self.on_recipe_logged, error_callback=self.on_log_error)
+
+    def on_recipe_logged(self, log_ids):
+        """Refreshes the log and summary once the recipe is logged."""
+        self.log_frame.refresh_log(); self.summary_frame.update_summary()
+        if self.winfo_exists(): self.log_button.state(['!disabled']); self.servings_var.set("1")
+
+    def on_log_error(self, error):
+        """Reports a recipe that could not be logged."""
+        if self.winfo_exists(): self.log_button.state(['!disabled'])
+        messagebox.showerror("Database Error", f"Error adding entry: {error}")
+
+class TrendsWindow(tk.Toplevel):
+    """
+    A Toplevel window showing the user's intake trends over a selectable date range.
+
+    The window charts daily calories against the goal with their 7- and 30-day
+    rolling averages, lists each day's totals and averages, and reports how often
+    each macro was within 10% of its goal. The trends are computed by the tracker
+    core's analytics on the database worker and cached there, so re-opening the
+    window or logging food here only recomputes what changed; a write from
+    another process makes the next look read everything again.
+
+    Attributes:
+        user_id (int): The user whose trends are shown.
+        range_var (tk.StringVar): The selected entry of TREND_RANGES.
+    """
+    def __init__(self, master, user_id=DEFAULT_USER_ID):
+        super().__init__(master)
+        self.user_id = user_id
+        self.title("Trends"); self.geometry("760x560"); self.minsize(600, 450)
+        self.frame = ttk.Frame(self, padding="10"); self.frame.pack(fill="both", expand=True)
+        self.frame.columnconfigure(0, weight=1); self.frame.rowconfigure(2, weight=1); self.frame.rowconfigure(4, weight=1)
+
+        controls = ttk.Frame(self.frame); controls.grid(row=0, column=0, sticky='ew')
+        self.range_var = tk.StringVar(value=next(iter(TREND_RANGES)))
+        range_box = ttk.Combobox(controls, textvariable=self.range_var, values=list(TREND_RANGES), state='readonly', width=14)
+        range_box.pack(side='left'); range_box.bind('<<ComboboxSelected>>', lambda event: self.update_trends())
+        self.status_var = tk.StringVar(value="Loading...")
+        ttk.Label(controls, textvariable=self.status_var).pack(side='left', padx=10)
+
+        self.adherence_var = tk.StringVar()
+        ttk.Label(self.frame, textvariable=self.adherence_var, justify='left').grid(row=1, column=0, pady=5, sticky='w')
+
+        self.canvas = tk.Canvas(self.frame, height=180, background='white', highlightthickness=0)
+        self.canvas.grid(row=2, column=0, pady=5, sticky='nsew')
+        self.canvas.bind('<Configure>', lambda event: self.draw_chart())
+        ttk.Label(self.frame, text="Bars: daily calories   Blue: 7-day average   Orange: 30-day average   Red: goal").grid(row=3, column=0, sticky='w')
+
+        columns = ('entry_date', 'calories', 'calories_avg7', 'calories_avg30', 'protein_g', 'carbs_g', 'fat_g')
+        headings = ('Date', 'Calories', '7-day avg', '30-day avg', 'Protein (g)', 'Carbs (g)', 'Fat (g)')
+        table = ttk.Frame(self.frame); table.grid(row=4, column=0, pady=5, sticky='nsew')
+        self.tree = ttk.Treeview(table, columns=columns, show='headings', height=8)
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading); self.tree.column(column, width=90, anchor='center')
+        scrollbar = ttk.Scrollbar(table, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side='left', fill='both', expand=True); scrollbar.pack(side='right', fill='y')
+
+        self._trends = None
+        self.update_trends()
+
+    def update_trends(self):
+        """Asks the database worker for the trends of the selected range; `render_trends` shows them."""
+        days = TREND_RANGES[self.range_var.get()]; user_id = self.user_id
+        get_worker().submit(lambda core: core.get_trends(user_id, days=days), callback=self.render_trends,
+                            error_callback=lambda e: self.status_var.set(f"Could not load trends: {e}"), key='trends')
+
+    def render_trends(self, trends):
+        """Fills the summary line, chart and table from an analytics.Trends result."""
+        if not self.winfo_exists(): return
+        self._trends = trends
+        self.status_var.set(f"{trends.start_date} to {trends.end_date}: {trends.logged_days} days logged")
+        lines = []
+        for name, label, unit in (('calories', 'Calories', 'kcal'), ('protein_g', 'Protein', 'g'), ('carbs_g', 'Carbs', 'g'), ('fat_g', 'Fat', 'g')):
+            average = trends.averages[name]; goal = trends.goals[name]; adherence = trends.adherence[name]
+            text = f"{label}: " + (f"avg {average:.0f} {unit}" if average is not None else "no entries")
+            if goal is None: text += " (no goal set)"
+            else: text += f" / goal {goal} {unit}" + (f", on target {adherence:.0%} of days" if adherence is not None else "")
+            lines.append(text)
+        self.adherence_var.set('\n'.join(lines))
+
+        self.tree.delete(*self.tree.get_children())
+        daily = trends.daily.iloc[::-1]
+        columns = ['calories', 'calories_avg7', 'calories_avg30', 'protein_g', 'carbs_g', 'fat_g']
+        for day, values in zip(daily.index, daily[columns].itertuples(index=False, name=None)):
+            self.tree.insert('', 'end', values=(day.date().isoformat(), *('-' if math.isnan(value) else f'{value:.1f}' for value in values)))
+        self.draw_chart()
+
+    def draw_chart(self):
+        """Draws daily calories as bars with the rolling averages and the goal as lines."""
+        self.canvas.delete('all')
+        if self._trends is None: return
+        daily = self._trends.daily; goal = self._trends.goals['calories'] or 0
+        width = self.canvas.winfo_width(); height = self.canvas.winfo_height(); pad = 10
+        series = [daily[column].tolist() for column in ('calories', 'calories_avg7', 'calories_avg30')]
+        top = max([goal, *(value for values in series for value in values if not math.isnan(value))]) * 1.1 or 1
+        step = (width - 2 * pad) / len(daily)
+        x_of = lambda i: pad + step * (i + 0.5)
+        y_of = lambda value: height - pad - value / top * (height - 2 * pad)
+        for i, value in enumerate(series[0]):
+            if not math.isnan(value): self.canvas.create_rectangle(x_of(i) - step * 0.4, y_of(value), x_of(i) + step * 0.4, height - pad, fill='#cfd8dc', outline='')
+        for values, color in zip(series[1:], ('#1e88e5', '#fb8c00')):
+            points = [coord for i, value in enumerate(values) if not math.isnan(value) for coord in (x_of(i), y_of(value))]
+            if len(points) > 2: self.canvas.create_line(*points, fill=color, width=2)
+        if goal: self.canvas.create_line(pad, y_of(goal), width - pad, y_of(goal), fill='#e53935', dash=(4, 2))
+
+class MetricsWindow(tk.Toplevel):
+    """
+    A debug panel showing the metrics collected with --metrics.
+
+    It lists every instrumented call (database queries, tracker core operations,
+    UI refresh methods and the worker queue wait) with its call count, latency
+    percentiles and rows, followed by the slow query log. "Profile Next Action"
+    arms cProfile for the next UI action and the database request it triggers;
+    the latest capture is shown at the bottom. Opened with F12.
+    """
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Metrics"); self.geometry("820x560")
+        self.frame = ttk.Frame(self, padding="10"); self.frame.pack(fill="both", expand=True)
+        self.frame.columnconfigure(0, weight=1); self.frame.rowconfigure(0, weight=2); self.frame.rowconfigure(1, weight=1); self.frame.rowconfigure(2, weight=1)
+
+        columns = ('name', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms', 'rows')
+        self.tree = ttk.Treeview(self.frame, columns=columns, show='headings', height=12)
+        for column, heading, width in zip(columns, ('Call', 'Count', 'Mean (ms)', 'p50 (ms)', 'p95 (ms)', 'Max (ms)', 'Rows'), (320, 60, 75, 70, 70, 75, 70)):
+            self.tree.heading(column, text=heading); self.tree.column(column, width=width, anchor='w' if column == 'name' else 'center')
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.slow_list = tk.Listbox(self.frame, height=6); self.slow_list.grid(row=1, column=0, pady=5, sticky='nsew')
+        self.profile_text = tk.Text(self.frame, height=8, wrap='none', font=('Courier', 9)); self.profile_text.grid(row=2, column=0, sticky='nsew')
+
+        buttons = ttk.Frame(self.frame); buttons.grid(row=3, column=0, pady=(5, 0), sticky='ew')
+        ttk.Button(buttons, text="Refresh", command=self.refresh).pack(side='left')
+        ttk.Button(buttons, text="Reset", command=self.reset).pack(side='left', padx=5)
+        ttk.Button(buttons, text="Profile Next Action", command=self.arm_profile).pack(side='left')
+        ttk.Button(buttons, text="Dump to File", command=self.dump).pack(side='right')
+        self.status_var = tk.StringVar()
+        ttk.Label(buttons, textvariable=self.status_var).pack(side='right', padx=10)
+        self.refresh()
+
+    def refresh(self):
+        """Shows the current metrics snapshot."""
+        snapshot = get_metrics().snapshot()
+        self.tree.delete(*self.tree.get_children())
+        for name, call in snapshot['calls'].items():
+            self.tree.insert('', 'end', values=(name, call['count'], f"{call['mean_ms']:.2f}", f"{call['p50_ms']:g}", f"{call['p95_ms']:g}",
+                                                f"{call['max_ms']:.2f}", call['rows']))
+        self.slow_list.delete(0, tk.END)
+        for query in reversed(snapshot['slow_queries']):
+            self.slow_list.insert(tk.END, f"{query['at']}  {query['ms']:.1f} ms  {query['name']}: {' | '.join(query['sql'])}")
+        self.profile_text.delete('1.0', tk.END)
+        if snapshot['profiles']:
+            profile = snapshot['profiles'][-1]
+            self.profile_text.insert('1.0', f"{profile['label']} ({profile['thread']}, {profile['at']})\n{profile['stats']}")
+
+    def reset(self):
+        """Clears the collected metrics."""
+        get_metrics().reset(); self.refresh()
+
+    def arm_profile(self):
+        """Profiles the next UI action and the database request it submits."""
+        get_metrics().arm_profile(); self.status_var.set("Profiling the next action...")
+
+    def dump(self):
+        """Writes the metrics to the dump file."""
+        path = get_metrics().dump() or get_metrics().dump(DEFAULT_METRICS_FILE)
+        self.status_var.set(f"Written to {path}")
+
+# --- INSTRUMENTATION ---
+# Every public method of the frames and windows is timed when metrics are enabled, and so
+# are the private callbacks that redraw the log from worker results
+for ui_class in (SummaryFrame, AddNewFoodWindow, DataEntryFrame, PlannerWindow, RecipesWindow, TrendsWindow):
+    instrument_class(ui_class, 'ui')
+instrument_class(DailyLogFrame, 'ui', include=('_render_rows', '_render_window'))
 
 # --- MAIN APPLICATION CLASS ---
-class CalorieTrackerApp(ThemedTk):
+class CalorieTrackerApp(tk.Tk):
     """
     The main application class for the Calorie Tracker.
 
-    This class initializes the main application window, sets up the theme, and
-    arranges the different frames (Summary, Data Entry, and Daily Log) within
-    the main window. It serves as the root of the Tkinter application.
+    This class initializes the main application window and arranges the
+    different frames (Summary, Data Entry, and Daily Log) within it. It serves
+    as the root of the Tkinter application and polls the database worker for
+    results from its main loop. The frames are clients of the shared tracker
+    core, acting for a single user.
+
+    The window is shown before anything slow happens: the summary, today's log
+    and the search index are requested from the database worker once it is on
+    screen, and filled in as they arrive. The theme engine (ttkthemes, which
+    loads PIL) is imported and applied at the same point, and the worker then
+    preloads the core's numerical modules while the user looks at the window.
+
+    Attributes:
+        user_id (int): The user the window tracks.
     """
-    def __init__(self):
+    def __init__(self, user_id=DEFAULT_USER_ID):
         super().__init__()
-
-        self.set_theme("arc")
+        self.user_id = user_id
+        get_worker().attach(self)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.title("Aura's Calorie Management System"); self.geometry("900x600"); self.minsize(700, 500)
 
@@ -323,15 +892,57 @@ class CalorieTrackerApp(ThemedTk):
         entry_container.grid(row=0, column=1, padx=10, pady=10, sticky="new")
         summary_container.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
 
-        self.summary_frame = SummaryFrame(summary_container)
-        self.daily_log_frame = DailyLogFrame(log_container)
-        self.data_entry_frame = DataEntryFrame(entry_container, self.daily_log_frame, self.summary_frame)
+        self.summary_frame = SummaryFrame(summary_container, user_id)
+        self.daily_log_frame = DailyLogFrame(log_container, user_id)
+        self.data_entry_frame = DataEntryFrame(entry_container, self.daily_log_frame, self.summary_frame, user_id)
 
         self.summary_frame.pack(fill='both', expand=True, padx=5, pady=5)
         self.daily_log_frame.pack(fill="both", expand=True)
         self.data_entry_frame.pack(fill="x")
 
+        if get_metrics().enabled: self.bind('<F12>', lambda event: MetricsWindow(self))
+        self.bind('<Map>', self.on_map)
+
+    def on_map(self, event):
+        """Starts loading once the window has been mapped for the first time."""
+        if event.widget is not self: return
+        self.unbind('<Map>')
+        self.after_idle(self.start_loading)
+
+    def start_loading(self):
+        """Requests the frames' data, applies the theme and preloads the core's heavier modules."""
+        get_startup_profile().mark('window shown')
+        self.summary_frame.update_summary(); self.daily_log_frame.load_log(); self.data_entry_frame.load_search_index()
+        get_worker().submit(lambda core: core.preload(), error_callback=lambda e: print(f"Could not preload: {e}"))
+        self.apply_theme()
+
+    def apply_theme(self):
+        """Loads the theme engine and switches to THEME, keeping the default theme if it is unavailable."""
+        try:
+            from ttkthemes import ThemedStyle
+            ThemedStyle(self).set_theme(THEME)
+        except (ImportError, tk.TclError) as e:
+            print(f"Could not apply the '{THEME}' theme: {e}")
+        get_startup_profile().mark('theme applied')
+
+    def on_close(self):
+        """Stops the database worker and closes the window."""
+        get_worker().stop()
+        self.destroy()
+
 # --- EXECUTION BLOCK ---
 if __name__ == "__main__":
-    app = CalorieTrackerApp()
+    parser = argparse.ArgumentParser(description="Aura's Calorie Management System")
+    parser.add_argument('--user-id', type=int, default=DEFAULT_USER_ID, help="the user to track (default: %(default)s)")
+    parser.add_argument('--metrics', nargs='?', const=DEFAULT_METRICS_FILE, metavar='FILE',
+                        help=f"record latency metrics, written to FILE on exit (default: {DEFAULT_METRICS_FILE}); F12 opens the metrics panel")
+    parser.add_argument('--slow-query-ms', type=float, default=DEFAULT_SLOW_QUERY_MS,
+                        help="log database calls slower than this with their SQL (default: %(default)s)")
+    parser.add_argument('--startup-profile', action='store_true', help="print how long each step of the startup took")
+    args = parser.parse_args()
+    if args.metrics: get_metrics().enable(args.metrics, args.slow_query_ms)
+    if args.startup_profile:
+        get_startup_profile().enable(LAUNCHED_AT, STARTUP_MILESTONES); get_startup_profile().mark('imports')
+    app = CalorieTrackerApp(args.user_id)
+    get_startup_profile().mark('window built')
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,126 @@
+import numpy as np
+
+# Vector settings
+VECTOR_DTYPE = np.dtype('<f4')
+MACRO_NAMES = ('calories', 'protein_g', 'carbs_g', 'fat_g')
+
+
+def pack(vector):
+    """Packs a nutrient vector into the little-endian float32 blob stored in 'food_library.nutrients'."""
+    return np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+def unpack(blob, size):
+    """
+    Unpacks a nutrient blob into a float32 vector of `size` values.
+
+    Blobs written before nutrients were added to the dictionary are shorter than
+    the current layout; the missing tail is NaN.
+    """
+    vector = np.full(size, np.nan, dtype=VECTOR_DTYPE)
+    if blob:
+        values = np.frombuffer(blob, dtype=VECTOR_DTYPE)[:size]
+        vector[:len(values)] = values
+    return vector
+
+
+class NutrientDictionary:
+    """
+    The layout of the nutrient vectors, read from the 'nutrients' table.
+
+    A nutrient's position in every vector is its nutrient_id - 1, so the first
+    four positions always hold calories, protein, carbs and fat, and nutrients
+    added later extend the vector without moving existing values.
+
+    Attributes:
+        names (tuple[str]): The nutrient names in vector order.
+        units (tuple[str]): The unit of each nutrient, in the same order.
+    """
+    def __init__(self, names, units):
+        self.names = tuple(names); self.units = tuple(units)
+        self._positions = {name: i for i, name in enumerate(self.names)}
+
+    @classmethod
+    def from_connection(cls, conn):
+        """Reads the dictionary from a migrated database."""
+        rows = conn.execute('SELECT nutrient_id, name, unit FROM nutrients ORDER BY nutrient_id').fetchall()
+        if [row[0] for row in rows] != list(range(1, len(rows) + 1)):
+            raise ValueError("The 'nutrients' table must have consecutive ids starting at 1.")
+        return cls([row[1] for row in rows], [row[2] for row in rows])
+
+    @staticmethod
+    def register(conn, nutrients):
+        """
+        Appends nutrients missing from the dictionary.
+
+        Args:
+            conn (sqlite3.Connection): A connection inside a write transaction.
+            nutrients (Iterable[tuple[str, str]]): (name, unit) pairs. Names already
+                in the dictionary are left alone.
+        """
+        known = dict(conn.execute('SELECT name, nutrient_id FROM nutrients').fetchall())
+        next_id = max(known.values(), default=0) + 1
+        for name, unit in nutrients:
+            if name in known: continue
+            conn.execute('INSERT INTO nutrients (nutrient_id, name, unit) VALUES (?, ?, ?)', (next_id, name, unit))
+            known[name] = next_id; next_id += 1
+
+    def __len__(self):
+        return len(self.names)
+
+    def position(self, name):
+        """Returns a nutrient's position in the vectors, raising KeyError if it is unknown."""
+        return self._positions[name]
+
+    def positions(self, names):
+        """Returns the positions of several nutrients as an index array."""
+        return np.array([self._positions[name] for name in names], dtype=np.intp)
+
+    def vector(self, values):
+        """Builds a float32 vector from a {name: value} mapping, with NaN for the nutrients not given."""
+        vector = np.full(len(self), np.nan, dtype=VECTOR_DTYPE)
+        if values:
+            names, numbers = zip(*values.items())
+            vector[self.positions(names)] = numbers
+        return vector
+
+    def food_vector(self, blob, macros):
+        """
+        Returns a food's vector from its stored blob and its calorie and macro columns.
+
+        The columns take precedence over the blob's first four values, so a food
+        edited in place is never read with stale macros. Foods saved without a
+        blob (added by hand, or imported before vectors existed) get a vector
+        holding just their columns.
+        """
+        vector = unpack(blob, len(self))
+        known = [(i, value) for i, value in enumerate(macros) if value is not None]
+        if known: vector[[i for i, _ in known]] = [value for _, value in known]
+        return vector
+
+    def to_dict(self, vector, include_missing=False):
+        """Maps a vector back to {name: value}, leaving out unknown (NaN) values unless asked."""
+        return {name: (None if np.isnan(value) else float(value)) for name, value in zip(self.names, vector)
+                if include_missing or not np.isnan(value)}
+
+
+def scale(vector, quantity):
+    """Scales a nutrient vector by a number of servings in one operation."""
+    return np.asarray(vector, dtype=np.float64) * quantity
+
+def total(quantities, vectors):
+    """
+    Sums the nutrients of several servings with one matrix-vector product.
+
+    Args:
+        quantities (Sequence[float]): The number of servings of each food.
+        vectors (Sequence[np.ndarray]): The per-serving vector of each food, all the same length.
+
+    Returns:
+        np.ndarray: The float64 totals. A nutrient is NaN only if no food has a value for it.
+    """
+    if not len(vectors): return np.zeros(0)
+    matrix = np.vstack(vectors).astype(np.float64)
+    known = ~np.isnan(matrix)
+    totals = np.asarray(quantities, dtype=np.float64) @ np.where(known, matrix, 0.0)
+    totals[~known.any(axis=0)] = np.nan
+    return totals
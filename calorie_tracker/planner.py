@@ -0,0 +1,134 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from nutrients import MACRO_NAMES
+
+# Planner settings
+DEFAULT_MAX_ITEMS = 4
+SERVING_STEP = 0.5
+MAX_SERVINGS = 3.0
+MIN_IMPROVEMENT = 0.01
+# Grams per remaining kcal aimed for when a macro has no goal: a 25/50/25
+# protein/carbs/fat split of the calories, at 4, 4 and 9 kcal per gram
+DEFAULT_MACRO_SPLIT = {'protein_g': 0.25 / 4, 'carbs_g': 0.50 / 4, 'fat_g': 0.25 / 9}
+
+
+@dataclass
+class MealPlan:
+    """
+    Suggested foods for the rest of a day.
+
+    Attributes:
+        remaining (dict[str, float | None]): The calorie and macro budget the plan
+            aims for; None for macros without a goal.
+        items (list[tuple[str, float, dict]]): (food_name, quantity, nutrients) for
+            each suggested food, where nutrients holds the scaled calories and macros.
+        totals (dict[str, float]): The calories and macros of the whole plan.
+    """
+    remaining: dict
+    items: list = field(default_factory=list)
+    totals: dict = field(default_factory=dict)
+
+
+class FoodMatrix:
+    """
+    A user's library as a dense (foods x [calories, protein_g, carbs_g, fat_g]) matrix.
+
+    The matrix is read from the library once and kept in memory so plans are
+    scored against every food with array operations instead of queries. Rows are
+    stored in a buffer that grows by doubling, so `add` is amortized O(1) and a
+    food added through the core is available to the next plan without a reload.
+
+    Attributes:
+        names (list[str]): The food name of each row.
+    """
+    def __init__(self, rows=()):
+        rows = [row for row in rows if row[1] is not None]
+        self.names = [row[0] for row in rows]
+        self._matrix = np.zeros((max(16, len(rows)), len(MACRO_NAMES)))
+        if rows: self._matrix[:len(rows)] = np.nan_to_num(np.array([row[1:] for row in rows], dtype=np.float64))
+        self._positions = {name: i for i, name in enumerate(self.names)}
+
+    @classmethod
+    def from_repository(cls, repo, user_id):
+        """Builds the matrix from the user's food library in one query."""
+        return cls(repo.get_food_macros(user_id))
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def matrix(self):
+        """The rows in use, as a read-only view."""
+        view = self._matrix[:len(self.names)]
+        view.flags.writeable = False
+        return view
+
+    def add(self, food_name, calories, protein_g=0, carbs_g=0, fat_g=0):
+        """Adds a food, or updates its row if the name is already present."""
+        row = np.nan_to_num(np.array([calories, protein_g, carbs_g, fat_g], dtype=np.float64))
+        i = self._positions.get(food_name)
+        if i is None:
+            i = len(self.names)
+            if i == len(self._matrix):
+                self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+            self.names.append(food_name); self._positions[food_name] = i
+        self._matrix[i] = row
+
+    def plan(self, remaining, max_items=DEFAULT_MAX_ITEMS, exclude=(), goals=None):
+        """
+        Greedily picks foods and serving sizes that best fill a remaining budget.
+
+        Each round scores every food at once: the best number of servings for
+        each food against the budget still unfilled is solved in closed form
+        (least squares on one variable), rounded to SERVING_STEP and clamped to
+        [SERVING_STEP, MAX_SERVINGS], and the food leaving the smallest weighted
+        error is picked. Errors are weighted by 1 / budget so calories and grams
+        count alike. Picking stops after `max_items` foods, or when no food
+        reduces the error by at least MIN_IMPROVEMENT.
+
+        A macro without a budget is aimed at its DEFAULT_MACRO_SPLIT share of the
+        calories, so a calorie-only goal still gets a balanced plan rather than
+        one very calorie-dense food. A macro already over its goal is aimed at 0
+        and weighted by 1 / goal instead, so foods that add more of it are
+        penalized rather than ignored.
+
+        Args:
+            remaining (dict[str, float | None]): The budget per macro; None for a macro without a goal.
+            max_items (int): The most foods to suggest.
+            exclude (Iterable[str]): Foods not to suggest.
+            goals (dict[str, float | None] | None): The daily goal per macro, used to weight
+                macros whose budget is used up. Without it, their DEFAULT_MACRO_SPLIT share
+                of the calorie budget is used.
+
+        Returns:
+            list[tuple[str, float, np.ndarray]]: (food_name, quantity, scaled macros) per pick.
+        """
+        calories = remaining.get('calories') or 0.0
+        if calories <= 0 or not len(self): return []
+        goals = goals or {}
+        budget = np.array([remaining[name] if remaining.get(name) is not None else calories * DEFAULT_MACRO_SPLIT.get(name, 0.0)
+                           for name in MACRO_NAMES], dtype=np.float64)
+        scale = np.array([goals.get(name) or calories * DEFAULT_MACRO_SPLIT.get(name, 0.0) for name in MACRO_NAMES], dtype=np.float64)
+        scale = np.where(budget > 0, budget, scale)
+        weights = np.divide(1.0, scale, out=np.zeros_like(scale), where=scale > 0)
+        matrix = self.matrix * weights
+        target = np.maximum(budget, 0.0) * weights
+        available = matrix[:, 0] > 0
+        for name in exclude:
+            if name in self._positions: available[self._positions[name]] = False
+        norms = np.einsum('ij,ij->i', matrix, matrix)
+
+        picks = []
+        error = float(target @ target)
+        while len(picks) < max_items and available.any():
+            quantities = np.divide(matrix @ target, norms, out=np.zeros_like(norms), where=norms > 0)
+            quantities = np.clip(np.round(quantities / SERVING_STEP) * SERVING_STEP, SERVING_STEP, MAX_SERVINGS)
+            residuals = target - quantities[:, None] * matrix
+            errors = np.where(available, np.einsum('ij,ij->i', residuals, residuals), np.inf)
+            best = int(np.argmin(errors))
+            if error - errors[best] < MIN_IMPROVEMENT * max(error, 1e-12): break
+            picks.append((self.names[best], float(quantities[best]), self.matrix[best] * quantities[best]))
+            target = residuals[best]; error = float(errors[best]); available[best] = False
+        return picks
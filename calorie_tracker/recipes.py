@@ -0,0 +1,157 @@
+import argparse
+import re
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import nutrients
+from repository import Repository
+
+# Define file paths
+DB_FILE = 'calorie_tracker.db'
+NUTRITION_CF_CSV = 'nutrition_cf - Sheet5.csv'
+USDA_FOOD_CSV = 'food.csv'
+
+# Ingredient parsing settings
+GRAM_UNITS = {'g': 1.0, 'gm': 1.0, 'gms': 1.0, 'gram': 1.0, 'grams': 1.0, 'ml': 1.0}
+USDA_SERVING_GRAMS = 100.0
+_INGREDIENT_PATTERN = re.compile(r'(?P<name>.+?)\s*-\s*(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>[^\d\s)]*)')
+
+
+@dataclass
+class RecipeNutrition:
+    """
+    A recipe's nutrition per serving.
+
+    Attributes:
+        macros (dict[str, float]): Calories, protein_g, carbs_g and fat_g per serving.
+        nutrients (dict[str, float]): Every nutrient known for at least one ingredient, per serving.
+        matched_ingredients (int): Ingredients backed by a library food.
+        total_ingredients (int): All ingredients. Unmatched ones add nothing, so the
+            figures are a lower bound when the two counts differ.
+    """
+    macros: dict
+    nutrients: dict = field(default_factory=dict)
+    matched_ingredients: int = 0
+    total_ingredients: int = 0
+
+
+def parse_ingredients(text):
+    """
+    Splits an ingredient list such as "Cauliflower-15 gms; Onion-15 gms" into parts.
+
+    Returns:
+        list[tuple[str, float | None, str | None]]: (ingredient, amount, unit) for each
+        ingredient. Amount and unit are None when the text gives none.
+    """
+    ingredients = []
+    for part in (text or '').split(';'):
+        part = ' '.join(part.split())
+        if not part: continue
+        match = _INGREDIENT_PATTERN.match(part)
+        if match: ingredients.append((match['name'].strip(' -'), float(match['amount']), match['unit'].lower().rstrip('.') or None))
+        else: ingredients.append((part, None, None))
+    return ingredients
+
+def ingredient_grams(amount, unit):
+    """Returns an ingredient's weight in grams, or None if its unit is not a weight (e.g. '1 medium')."""
+    factor = GRAM_UNITS.get(unit or '')
+    return amount * factor if amount is not None and factor is not None else None
+
+
+class IngredientMatcher:
+    """
+    Maps free-text ingredient names to USDA food descriptions.
+
+    USDA descriptions lead with the food ("ONIONS,RAW"), so an ingredient
+    matches a description whose first comma-separated part equals its name,
+    ignoring case and a plural 's'/'es'. Among matches, raw foods and then the
+    shortest description win. Names that match nothing are left unmatched
+    rather than guessed.
+    """
+    def __init__(self, descriptions):
+        self._best = {}
+        for description in descriptions:
+            key = self._key(description.split(',')[0])
+            rank = (',RAW' not in description.upper(), len(description))
+            if key not in self._best or rank < self._best[key][0]:
+                self._best[key] = (rank, description)
+
+    @staticmethod
+    def _key(name):
+        key = re.sub(r'[^a-z ]', '', name.casefold()).strip()
+        for suffix in ('es', 's'):
+            if key.endswith(suffix) and len(key) > len(suffix) + 2: return key[:-len(suffix)]
+        return key
+
+    def match(self, ingredient):
+        """Returns the USDA description for an ingredient name, or None."""
+        best = self._best.get(self._key(ingredient))
+        return best[1] if best else None
+
+
+def compute_recipe_nutrition(dictionary, servings, rows):
+    """
+    Computes a recipe's per-serving nutrition from its ingredient rows.
+
+    The nutrient vectors of the ingredients backed by a library food are
+    weighted by their quantities and summed in one matrix-vector product, then
+    divided by the recipe's servings.
+
+    Args:
+        dictionary (NutrientDictionary): The layout of the nutrient vectors.
+        servings (float): The number of servings the ingredients make.
+        rows (list[tuple]): Rows as returned by Repository.get_recipe_ingredients.
+
+    Returns:
+        RecipeNutrition: The per-serving nutrition.
+    """
+    matched = [row for row in rows if row[4] and row[5] is not None]
+    totals = nutrients.total([row[4] for row in matched], [dictionary.food_vector(row[9], row[5:9]) for row in matched])
+    if not matched: totals = np.full(len(dictionary), np.nan)
+    totals = totals / servings
+    macros = dict(zip(nutrients.MACRO_NAMES, np.nan_to_num(totals[dictionary.positions(nutrients.MACRO_NAMES)]).tolist()))
+    return RecipeNutrition(macros, dictionary.to_dict(totals), len(matched), len(rows))
+
+def import_recipes(db_file=DB_FILE, user_id=1, path=NUTRITION_CF_CSV, usda_path=USDA_FOOD_CSV):
+    """
+    Creates a recipe for every dish in the nutrition_cf dataset from its ingredient list.
+
+    Ingredients given by weight are matched to USDA foods, whose nutrients are
+    per 100 g, and stored as that many servings of the library food. Ingredients
+    without a weight or a match are kept for reference but add no nutrition.
+    Each dish makes one serving of the size the dataset states. Re-running the
+    import replaces the dishes' ingredients, which invalidates their cached
+    nutrition.
+
+    Returns:
+        tuple[int, int, int]: The recipes written, and the matched and total ingredients.
+    """
+    import pandas as pd
+    matcher = IngredientMatcher(pd.read_csv(usda_path, usecols=['Description'])['Description'].dropna())
+    dishes = pd.read_csv(path, usecols=['Food', 'Serving', 'Ingredients']).dropna(subset=['Food', 'Ingredients'])
+    repo = Repository(db_file)
+    written = matched = total = 0
+    try:
+        with repo.transaction():
+            for name, serving, text in dishes.itertuples(index=False, name=None):
+                ingredients = []
+                for ingredient, amount, unit in parse_ingredients(text):
+                    grams = ingredient_grams(amount, unit)
+                    food_name = matcher.match(ingredient) if grams else None
+                    ingredients.append((ingredient, amount, unit, food_name, grams / USDA_SERVING_GRAMS if food_name else None))
+                    matched += food_name is not None; total += 1
+                repo.save_recipe(user_id, str(name).strip(), 1, None if pd.isna(serving) else str(serving).strip(), ingredients)
+                written += 1
+    finally:
+        repo.close()
+    return written, matched, total
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import the nutrition_cf dishes as recipes.")
+    parser.add_argument('--user-id', type=int, default=1, help="the user who gets the recipes (default: %(default)s)")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    written, matched, total = import_recipes(user_id=args.user_id)
+    print(f"{written} recipes imported in {time.perf_counter() - start:.2f}s; {matched} of {total} ingredients matched to USDA foods.")
@@ -0,0 +1,483 @@
+import atexit
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from database_setup import LOG_ENTRIES_VIEW, migrate
+from instrumentation import get_metrics, instrument_class
+
+# Define file paths and connection settings
+DB_FILE = 'calorie_tracker.db'
+BUSY_TIMEOUT_SECONDS = 5.0
+STATEMENT_CACHE_SIZE = 128
+FREQUENCY_BOOST = 1.0
+FREQUENCY_HALF_COUNT = 5
+# SQLite attaches at most 10 databases by default
+MAX_ATTACHED_ARCHIVES = 8
+
+# SQL for the queries run on every UI action
+SELECT_CALORIE_GOAL = "SELECT daily_calorie_goal FROM users WHERE user_id = ?"
+SELECT_USER_GOALS = "SELECT daily_calorie_goal, daily_protein_goal, daily_carbs_goal, daily_fat_goal FROM users WHERE user_id = ?"
+SELECT_DAILY_TOTALS = 'SELECT calories, protein_g, carbs_g, fat_g FROM daily_totals WHERE user_id = ? AND entry_date = ?'
+# The aggregate always yields one row, so the goal comes back even on a day without totals
+SELECT_DAILY_SUMMARY = '''SELECT (SELECT daily_calorie_goal FROM users WHERE user_id = :user_id),
+                                 TOTAL(calories), TOTAL(protein_g), TOTAL(carbs_g), TOTAL(fat_g)
+                          FROM daily_totals WHERE user_id = :user_id AND entry_date = :entry_date'''
+SELECT_TOTALS_RANGE = 'SELECT entry_date, calories, protein_g, carbs_g, fat_g FROM daily_totals WHERE user_id = ? AND entry_date BETWEEN ? AND ? ORDER BY entry_date'
+SELECT_DAILY_LOG = f'''SELECT log_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g FROM {LOG_ENTRIES_VIEW}
+                      WHERE user_id = ? AND entry_date = ? AND log_id > ? ORDER BY log_id'''
+SELECT_LOG_ENTRY = f'SELECT log_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g FROM {LOG_ENTRIES_VIEW} WHERE log_id = ?'
+SELECT_LOG_PAGE = f'''SELECT log_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g FROM {LOG_ENTRIES_VIEW}
+                     WHERE user_id = ? AND entry_date BETWEEN ? AND ? ORDER BY entry_date, log_id LIMIT ? OFFSET ?'''
+COUNT_LOG_ENTRIES = 'SELECT TOTAL(entry_count) FROM daily_totals WHERE user_id = ? AND entry_date BETWEEN ? AND ?'
+SELECT_FOOD_NAMES = "SELECT food_name FROM food_library WHERE user_id = ?"
+SELECT_FOOD_MACROS = "SELECT food_name, calories, protein_g, carbs_g, fat_g FROM food_library WHERE user_id = ?"
+SEARCH_FOOD_NAMES = "SELECT food_name FROM food_library WHERE user_id = ? AND food_name LIKE ?"
+SELECT_FOOD = "SELECT food_id, user_id, food_name, calories, protein_g, carbs_g, fat_g, nutrients FROM food_library WHERE user_id = ? AND food_name = ?"
+SELECT_DAY_NUTRIENTS = f'''SELECT l.quantity, l.calories, l.protein_g, l.carbs_g, l.fat_g, f.nutrients FROM {LOG_ENTRIES_VIEW} AS l
+                          LEFT JOIN food_library AS f ON f.food_id = l.food_id AND f.user_id = l.user_id
+                          WHERE l.user_id = ? AND l.entry_date = ?'''
+SELECT_RECIPE = 'SELECT recipe_id, recipe_name, servings, serving_size FROM recipes WHERE user_id = ? AND recipe_name = ?'
+SEARCH_RECIPE_NAMES = "SELECT recipe_name FROM recipes WHERE user_id = ? AND recipe_name LIKE ? ORDER BY recipe_name LIMIT ?"
+SELECT_RECIPE_INGREDIENTS = '''SELECT i.ingredient, i.amount, i.unit, i.food_name, i.quantity, f.calories, f.protein_g, f.carbs_g, f.fat_g, f.nutrients
+                               FROM recipe_ingredients AS i LEFT JOIN food_library AS f ON f.user_id = ? AND f.food_name = i.food_name
+                               WHERE i.recipe_id = ? ORDER BY i.position'''
+SELECT_RECIPE_NUTRITION = 'SELECT calories, protein_g, carbs_g, fat_g, nutrients, matched_ingredients, total_ingredients FROM recipe_nutrition WHERE recipe_id = ?'
+# Ranked food search: bm25 relevance (negative, lower is better), scaled up by as much as
+# 1 + FREQUENCY_BOOST for foods the user logs often; half the boost is reached at FREQUENCY_HALF_COUNT entries
+RANK_FOOD_NAMES = '''SELECT f.food_name FROM food_search AS s JOIN food_library AS f ON f.food_id = s.rowid
+                     WHERE food_search MATCH :query AND f.user_id = :user_id
+                     ORDER BY bm25(food_search, 10.0, 2.0, 4.0) * (1.0 + :boost * f.log_count / (f.log_count + :half_count)) LIMIT :limit'''
+RANK_FOOD_NAMES_FUZZY = '''SELECT f.food_name FROM food_search_trigram AS s JOIN food_library AS f ON f.food_id = s.rowid
+                           WHERE food_search_trigram MATCH :query AND f.user_id = :user_id
+                           ORDER BY bm25(food_search_trigram) * (1.0 + :boost * f.log_count / (f.log_count + :half_count)) LIMIT :limit'''
+# A log entry references the version of its user's library food (or, for foods not in the library, of the name alone)
+# with the entry's per-serving values, added by INSERT_FOOD_VERSION if it is new
+INSERT_FOOD_VERSION = '''INSERT OR IGNORE INTO food_versions (food_id, food_name, calories, protein_g, carbs_g, fat_g)
+                         VALUES ((SELECT food_id FROM food_library WHERE user_id = :user_id AND food_name = :food_name), :food_name,
+                                 :calories, IFNULL(:protein_g, 0), IFNULL(:carbs_g, 0), IFNULL(:fat_g, 0))'''
+SELECT_ENTRY_VERSION = '''SELECT version_id FROM food_versions
+                          WHERE IFNULL(food_id, 0) = IFNULL((SELECT food_id FROM food_library WHERE user_id = :user_id AND food_name = :food_name), 0)
+                          AND food_name = :food_name AND calories = :calories
+                          AND protein_g = IFNULL(:protein_g, 0) AND carbs_g = IFNULL(:carbs_g, 0) AND fat_g = IFNULL(:fat_g, 0)'''
+INSERT_LOG_ENTRY = f'''INSERT INTO food_log (user_id, entry_date, quantity, version_id)
+                       VALUES (:user_id, :entry_date, :quantity, ({SELECT_ENTRY_VERSION}))'''
+LOG_ENTRY_FIELDS = ('user_id', 'entry_date', 'quantity', 'food_name', 'calories', 'protein_g', 'carbs_g', 'fat_g')
+
+# food_log archives (see archive.py), and the log reads that span the main database and the archives a date range overlaps.
+# Each template is run once per store with {log} set to that store's food_log_entries view, and the parts are joined with
+# UNION, which also drops an entry seen in both stores while the archive job is moving it.
+SELECT_ARCHIVES = 'SELECT period, file_name FROM log_archives WHERE start_date <= ? AND end_date >= ? ORDER BY start_date'
+SELECT_ENTRY_ARCHIVES = 'SELECT period, file_name FROM log_archives WHERE ? BETWEEN min_log_id AND max_log_id ORDER BY start_date'
+SELECT_DAY_COUNTS = 'SELECT entry_date, entry_count FROM daily_totals WHERE user_id = ? AND entry_date BETWEEN ? AND ? ORDER BY entry_date'
+ARCHIVED_DAILY_LOG = '''SELECT log_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g FROM {log}
+                        WHERE user_id = :user_id AND entry_date = :entry_date AND log_id > :after_log_id'''
+ARCHIVED_LOG_ENTRY = 'SELECT log_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g FROM {log} WHERE log_id = ?'
+ARCHIVED_LOG_PAGE = '''SELECT log_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g FROM {log}
+                       WHERE user_id = :user_id AND entry_date BETWEEN :start_date AND :end_date'''
+ARCHIVED_DAY_ENTRIES = 'SELECT log_id, user_id, quantity, calories, protein_g, carbs_g, fat_g, food_id FROM {log} WHERE user_id = :user_id AND entry_date = :entry_date'
+
+def _union(template, schemas):
+    """Joins a log read of the main database and of each attached archive schema with UNION."""
+    return ' UNION '.join(template.format(log=f'{schema}.{LOG_ENTRIES_VIEW}') for schema in ('main', *schemas))
+
+# Hot queries with sample parameters, checked with EXPLAIN QUERY PLAN by database_setup.py --check-plans
+HOT_QUERIES = {
+    'calorie_goal': (SELECT_CALORIE_GOAL, (1,)),
+    'user_goals': (SELECT_USER_GOALS, (1,)),
+    'daily_totals': (SELECT_DAILY_TOTALS, (1, '2000-01-01')),
+    'daily_summary': (SELECT_DAILY_SUMMARY, {'user_id': 1, 'entry_date': '2000-01-01'}),
+    'totals_range': (SELECT_TOTALS_RANGE, (1, '2000-01-01', '2000-01-31')),
+    'daily_log': (SELECT_DAILY_LOG, (1, '2000-01-01', 0)),
+    'log_entry': (SELECT_LOG_ENTRY, (1,)),
+    'log_page': (SELECT_LOG_PAGE, (1, '2000-01-01', '2000-12-31', 20, 0)),
+    'count_log_entries': (COUNT_LOG_ENTRIES, (1, '2000-01-01', '2000-12-31')),
+    'food_names': (SELECT_FOOD_NAMES, (1,)),
+    'food_macros': (SELECT_FOOD_MACROS, (1,)),
+    'search_food_names': (SEARCH_FOOD_NAMES, (1, 'a%')),
+    'rank_food_names': (RANK_FOOD_NAMES, {'query': '"a"*', 'user_id': 1, 'boost': FREQUENCY_BOOST, 'half_count': FREQUENCY_HALF_COUNT, 'limit': 50}),
+    'rank_food_names_fuzzy': (RANK_FOOD_NAMES_FUZZY, {'query': '"abc"', 'user_id': 1, 'boost': FREQUENCY_BOOST, 'half_count': FREQUENCY_HALF_COUNT, 'limit': 50}),
+    'food': (SELECT_FOOD, (1, 'a')),
+    'day_nutrients': (SELECT_DAY_NUTRIENTS, (1, '2000-01-01')),
+    'recipe': (SELECT_RECIPE, (1, 'a')),
+    'search_recipe_names': (SEARCH_RECIPE_NAMES, (1, 'a%', 50)),
+    'recipe_ingredients': (SELECT_RECIPE_INGREDIENTS, (1, 1)),
+    'recipe_nutrition': (SELECT_RECIPE_NUTRITION, (1,)),
+}
+
+
+class Repository:
+    """
+    Owns the long-lived SQLite connections used by the calorie tracker.
+
+    Every thread that touches the database gets one connection, opened on first
+    use and reused for the life of the repository, so the schema is parsed once
+    and the statement cache (prepared statements) stays warm between UI actions.
+    Each connection runs in WAL journal mode with a busy timeout, which lets
+    several tracker instances share the same database file without readers and
+    writers failing with "database is locked".
+
+    The first connection upgrades the database to the latest schema version, so
+    an existing calorie_tracker.db is migrated in place when the app starts.
+
+    Entries of closed years may have been moved to archive files by archive.py.
+    The reads of log entries check the 'log_archives' registry and, only when
+    the dates they ask for overlap an archive, attach it to the calling
+    thread's connection and read both stores. At most MAX_ATTACHED_ARCHIVES
+    archives stay attached per connection; the least recently used one is
+    detached to make room.
+
+    Writes are grouped with the `transaction()` context manager. The outermost
+    block starts an immediate (write-locking) transaction and commits once on
+    exit, so a multi-statement action such as logging a new food costs a single
+    commit. Nested blocks join the enclosing transaction.
+
+    Attributes:
+        db_file (str): Path to the SQLite database file.
+    """
+    def __init__(self, db_file=DB_FILE):
+        self.db_file = db_file
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._migrated = False
+
+    def connection(self):
+        """Returns the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None,
+                                   cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+            get_metrics().attach(conn)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute(f'PRAGMA busy_timeout = {int(BUSY_TIMEOUT_SECONDS * 1000)}')
+            with self._lock:
+                if not self._migrated:
+                    migrate(conn); self._migrated = True
+                self._connections.append(conn)
+            self._local.conn = conn; self._local.depth = 0; self._local.archives = OrderedDict()
+        return conn
+
+    def _attach_archives(self, conn, archives):
+        """
+        Attaches (period, file_name) archives to the calling thread's connection and returns their schema names.
+
+        Raises:
+            FileNotFoundError: If a registered archive file is missing.
+        """
+        attached = self._local.archives
+        schemas = []
+        for period, file_name in archives:
+            schema = f'"archive_{period}"'
+            if period in attached:
+                attached.move_to_end(period)
+            else:
+                path = os.path.join(os.path.dirname(os.path.abspath(self.db_file)), file_name)
+                if not os.path.exists(path): raise FileNotFoundError(f"The food_log archive '{path}' is missing.")
+                while len(attached) >= MAX_ATTACHED_ARCHIVES:
+                    conn.execute(f'DETACH DATABASE {attached.popitem(last=False)[1]}')
+                conn.execute(f'ATTACH DATABASE ? AS {schema}', (path,))
+                attached[period] = schema
+            schemas.append(schema)
+        return schemas
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups the enclosed writes into a single committed transaction.
+
+        The outermost block issues BEGIN IMMEDIATE so the write lock is taken up
+        front (and waited for under the busy timeout) rather than upgraded midway.
+        It commits when the block exits normally and rolls back if it raises.
+        Nested blocks neither begin nor commit on their own.
+
+        Yields:
+            sqlite3.Connection: The calling thread's connection.
+        """
+        conn = self.connection()
+        depth = self._local.depth
+        if depth == 0: conn.execute('BEGIN IMMEDIATE')
+        self._local.depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0: conn.rollback()
+            raise
+        self._local.depth = depth
+        if depth == 0: conn.commit()
+
+    def close(self):
+        """Closes every connection opened by this repository."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    # --- Queries ---
+
+    def get_calorie_goal(self, user_id, default=2000):
+        """Returns the user's daily calorie goal, or `default` if the user is unknown."""
+        row = self.connection().execute(SELECT_CALORIE_GOAL, (user_id,)).fetchone()
+        return row[0] if row else default
+
+    def get_user_goals(self, user_id, default_calorie_goal=2000):
+        """
+        Returns the user's daily goals as a dict keyed by 'calories', 'protein_g', 'carbs_g' and 'fat_g'.
+
+        Macro goals are None when the user has not set them; the calorie goal falls
+        back to `default_calorie_goal` for an unknown user.
+        """
+        row = self.connection().execute(SELECT_USER_GOALS, (user_id,)).fetchone() or (default_calorie_goal, None, None, None)
+        return dict(zip(('calories', 'protein_g', 'carbs_g', 'fat_g'), row))
+
+    def get_daily_totals(self, user_id, entry_date):
+        """Returns the (calories, protein_g, carbs_g, fat_g) totals logged by a user on a date."""
+        row = self.connection().execute(SELECT_DAILY_TOTALS, (user_id, entry_date)).fetchone()
+        return tuple(row) if row else (0, 0, 0, 0)
+
+    def get_daily_summary(self, user_id, entry_date, default_goal=2000):
+        """
+        Returns the user's calorie goal and nutrient totals for a date in one lookup.
+
+        Returns:
+            tuple: (calorie_goal, calories, protein_g, carbs_g, fat_g). The goal falls
+            back to `default_goal` for a user without a users row, and the totals
+            are 0 for a day with no entries.
+        """
+        row = self.connection().execute(SELECT_DAILY_SUMMARY, {'user_id': user_id, 'entry_date': entry_date}).fetchone()
+        return (row[0] if row[0] is not None else default_goal,) + tuple(value or 0 for value in row[1:])
+
+    def get_totals_range(self, user_id, start_date, end_date):
+        """Returns the pre-aggregated (entry_date, calories, protein_g, carbs_g, fat_g) rows for each logged day in a date range."""
+        return self.connection().execute(SELECT_TOTALS_RANGE, (user_id, start_date, end_date)).fetchall()
+
+    def get_daily_log(self, user_id, entry_date, after_log_id=0):
+        """
+        Returns the entries logged by a user on a date, in log_id order.
+
+        Each row is (log_id, entry_date, quantity, food_name, calories, protein_g,
+        carbs_g, fat_g). Passing `after_log_id` returns only the entries added
+        after that one, which lets a view fetch just its new rows.
+        """
+        conn = self.connection()
+        archives = conn.execute(SELECT_ARCHIVES, (entry_date, entry_date)).fetchall()
+        if not archives: return conn.execute(SELECT_DAILY_LOG, (user_id, entry_date, after_log_id)).fetchall()
+        sql = _union(ARCHIVED_DAILY_LOG, self._attach_archives(conn, archives)) + ' ORDER BY log_id'
+        return conn.execute(sql, {'user_id': user_id, 'entry_date': entry_date, 'after_log_id': after_log_id}).fetchall()
+
+    def get_log_entry(self, log_id):
+        """Returns a single food_log row in the get_daily_log layout, or None if it does not exist."""
+        conn = self.connection()
+        row = conn.execute(SELECT_LOG_ENTRY, (log_id,)).fetchone()
+        if row is None:
+            for schema in self._attach_archives(conn, conn.execute(SELECT_ENTRY_ARCHIVES, (log_id,)).fetchall()):
+                row = conn.execute(ARCHIVED_LOG_ENTRY.format(log=f'{schema}.{LOG_ENTRIES_VIEW}'), (log_id,)).fetchone()
+                if row is not None: break
+        return row
+
+    def get_log_page(self, user_id, start_date, end_date, offset, limit):
+        """
+        Returns up to `limit` entries in a date range, ordered by date and log_id, starting at `offset`.
+
+        When the range overlaps archived years, the per-day entry counts in
+        daily_totals first narrow it to the days the page falls on, so only
+        the archives of those days are read.
+        """
+        conn = self.connection()
+        if not conn.execute(SELECT_ARCHIVES, (end_date, start_date)).fetchone():
+            return conn.execute(SELECT_LOG_PAGE, (user_id, start_date, end_date, limit, offset)).fetchall()
+        first_date = last_date = None; skipped = seen = 0
+        for entry_date, entry_count in conn.execute(SELECT_DAY_COUNTS, (user_id, start_date, end_date)):
+            if first_date is None:
+                if seen + entry_count <= offset:
+                    seen += entry_count; continue
+                first_date, skipped = entry_date, seen
+            seen += entry_count; last_date = entry_date
+            if seen >= offset + limit: break
+        if first_date is None: return []
+        archives = conn.execute(SELECT_ARCHIVES, (last_date, first_date)).fetchall()
+        if not archives: return conn.execute(SELECT_LOG_PAGE, (user_id, first_date, last_date, limit, offset - skipped)).fetchall()
+        sql = _union(ARCHIVED_LOG_PAGE, self._attach_archives(conn, archives)) + ' ORDER BY entry_date, log_id LIMIT :limit OFFSET :offset'
+        return conn.execute(sql, {'user_id': user_id, 'start_date': first_date, 'end_date': last_date, 'limit': limit, 'offset': offset - skipped}).fetchall()
+
+    def count_log_entries(self, user_id, start_date, end_date):
+        """Returns the number of entries a user logged in a date range, read from daily_totals."""
+        return int(self.connection().execute(COUNT_LOG_ENTRIES, (user_id, start_date, end_date)).fetchone()[0])
+
+    def search_food_names(self, user_id, prefix):
+        """Returns the names of library foods that start with `prefix`."""
+        rows = self.connection().execute(SEARCH_FOOD_NAMES, (user_id, f'{prefix}%')).fetchall()
+        return [row[0] for row in rows]
+
+    def rank_food_names(self, user_id, query, limit, fuzzy=False):
+        """
+        Returns up to `limit` of the user's food names matching an FTS5 query, best match first.
+
+        Matches are ordered by their bm25 relevance, boosted for foods the user
+        has logged often. With `fuzzy`, `query` is matched against the trigram
+        index of the names instead of the word index of the names, categories
+        and aliases.
+        """
+        params = {'query': query, 'user_id': user_id, 'boost': FREQUENCY_BOOST, 'half_count': FREQUENCY_HALF_COUNT, 'limit': limit}
+        return [row[0] for row in self.connection().execute(RANK_FOOD_NAMES_FUZZY if fuzzy else RANK_FOOD_NAMES, params)]
+
+    def get_food_names(self, user_id):
+        """Returns the names of every food in the user's library."""
+        return [row[0] for row in self.connection().execute(SELECT_FOOD_NAMES, (user_id,))]
+
+    def get_food_macros(self, user_id):
+        """Returns (food_name, calories, protein_g, carbs_g, fat_g) for every food in the user's library."""
+        return self.connection().execute(SELECT_FOOD_MACROS, (user_id,)).fetchall()
+
+    def get_food(self, user_id, food_name):
+        """
+        Returns a food_library row, or None if the food does not exist.
+
+        The row is (food_id, user_id, food_name, calories, protein_g, carbs_g,
+        fat_g, nutrients), where nutrients is the packed nutrient vector or None.
+        """
+        return self.connection().execute(SELECT_FOOD, (user_id, food_name)).fetchone()
+
+    def get_day_nutrients(self, user_id, entry_date):
+        """
+        Returns what is needed to total every nutrient a user logged on a date.
+
+        Each row is (quantity, calories, protein_g, carbs_g, fat_g, nutrients): the
+        logged quantity and macros, and the packed per-serving nutrient vector of
+        the food in the library (None if it has none or is no longer there).
+        """
+        conn = self.connection()
+        archives = conn.execute(SELECT_ARCHIVES, (entry_date, entry_date)).fetchall()
+        if not archives: return conn.execute(SELECT_DAY_NUTRIENTS, (user_id, entry_date)).fetchall()
+        sql = f'''SELECT l.quantity, l.calories, l.protein_g, l.carbs_g, l.fat_g, f.nutrients
+                  FROM ({_union(ARCHIVED_DAY_ENTRIES, self._attach_archives(conn, archives))}) AS l
+                  LEFT JOIN main.food_library AS f ON f.food_id = l.food_id AND f.user_id = l.user_id'''
+        return conn.execute(sql, {'user_id': user_id, 'entry_date': entry_date}).fetchall()
+
+    def get_foods(self, user_id, food_names):
+        """Returns the SELECT_FOOD rows of several foods, keyed by name. Names not in the library are left out."""
+        names = list(dict.fromkeys(food_names)); foods = {}
+        conn = self.connection()
+        for i in range(0, len(names), 500):
+            batch = names[i:i + 500]
+            sql = SELECT_FOOD.replace('food_name = ?', f"food_name IN ({', '.join('?' * len(batch))})")
+            foods.update((row[2], row) for row in conn.execute(sql, (user_id, *batch)))
+        return foods
+
+    def get_recipe(self, user_id, recipe_name):
+        """Returns (recipe_id, recipe_name, servings, serving_size), or None if the user has no such recipe."""
+        return self.connection().execute(SELECT_RECIPE, (user_id, recipe_name)).fetchone()
+
+    def search_recipe_names(self, user_id, prefix, limit=50):
+        """Returns up to `limit` of the user's recipe names starting with `prefix`, ignoring ASCII case."""
+        return [row[0] for row in self.connection().execute(SEARCH_RECIPE_NAMES, (user_id, prefix + '%', limit))]
+
+    def get_recipe_ingredients(self, user_id, recipe_id):
+        """
+        Returns a recipe's ingredients in order.
+
+        Each row is (ingredient, amount, unit, food_name, quantity, calories,
+        protein_g, carbs_g, fat_g, nutrients). The last five columns are the
+        per-serving values of the library food, or None if the ingredient has
+        no library food.
+        """
+        return self.connection().execute(SELECT_RECIPE_INGREDIENTS, (user_id, recipe_id)).fetchall()
+
+    def get_recipe_nutrition(self, recipe_id):
+        """
+        Returns a recipe's cached per-serving nutrition, or None if it is not cached.
+
+        The row is (calories, protein_g, carbs_g, fat_g, nutrients,
+        matched_ingredients, total_ingredients).
+        """
+        return self.connection().execute(SELECT_RECIPE_NUTRITION, (recipe_id,)).fetchone()
+
+    def get_nutrient_dictionary(self):
+        """Returns the NutrientDictionary describing the layout of the nutrient vectors."""
+        from nutrients import NutrientDictionary
+        return NutrientDictionary.from_connection(self.connection())
+
+    # --- Writes ---
+
+    def add_food(self, user_id, food_name, calories, protein_g, carbs_g, fat_g):
+        """Adds a food to the user's library and returns True, or False if the user already has a food with that name, which is left unchanged."""
+        with self.transaction() as conn:
+            return conn.execute('INSERT OR IGNORE INTO food_library (user_id, food_name, calories, protein_g, carbs_g, fat_g) VALUES (?, ?, ?, ?, ?, ?)',
+                                (user_id, food_name, calories, protein_g, carbs_g, fat_g)).rowcount == 1
+
+    def log_food(self, user_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g):
+        """Inserts a food_log entry for a quantity of a food with the given per-serving nutrients and returns its log_id."""
+        return self.log_foods([(user_id, entry_date, quantity, food_name, calories, protein_g, carbs_g, fat_g)])[0]
+
+    def log_foods(self, entries):
+        """
+        Inserts several food_log entries with one executemany in a single transaction.
+
+        Each entry references the food version with its name and per-serving
+        values; versions that do not exist yet are added first.
+
+        Args:
+            entries (list[tuple]): (user_id, entry_date, quantity, food_name, calories,
+                protein_g, carbs_g, fat_g) for each entry, with the nutrients per serving.
+
+        Returns:
+            list[int]: The log_ids of the entries, in order. The write lock is held
+            for the whole insert, so they are consecutive.
+        """
+        if not entries: return []
+        entries = [dict(zip(LOG_ENTRY_FIELDS, entry)) for entry in entries]
+        with self.transaction() as conn:
+            conn.executemany(INSERT_FOOD_VERSION, entries)
+            conn.executemany(INSERT_LOG_ENTRY, entries)
+            last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        return list(range(last_id - len(entries) + 1, last_id + 1))
+
+    def save_recipe(self, user_id, recipe_name, servings, serving_size, ingredients):
+        """
+        Creates or replaces a recipe and returns its recipe_id.
+
+        Args:
+            ingredients (list[tuple]): (ingredient, amount, unit, food_name, quantity) per
+                ingredient, in order. food_name and quantity may be None for an
+                ingredient with no library food.
+        """
+        with self.transaction() as conn:
+            conn.execute('''INSERT INTO recipes (user_id, recipe_name, servings, serving_size) VALUES (?, ?, ?, ?)
+                            ON CONFLICT (user_id, recipe_name) DO UPDATE SET servings = excluded.servings, serving_size = excluded.serving_size''',
+                         (user_id, recipe_name, servings, serving_size))
+            recipe_id = conn.execute('SELECT recipe_id FROM recipes WHERE user_id = ? AND recipe_name = ?', (user_id, recipe_name)).fetchone()[0]
+            conn.execute('DELETE FROM recipe_ingredients WHERE recipe_id = ?', (recipe_id,))
+            conn.executemany('INSERT INTO recipe_ingredients (recipe_id, position, ingredient, amount, unit, food_name, quantity) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             [(recipe_id, position, *ingredient) for position, ingredient in enumerate(ingredients)])
+        return recipe_id
+
+    def save_recipe_nutrition(self, recipe_id, calories, protein_g, carbs_g, fat_g, nutrients, matched_ingredients, total_ingredients):
+        """Caches a recipe's per-serving nutrition until a trigger invalidates it."""
+        with self.transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO recipe_nutrition VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         (recipe_id, calories, protein_g, carbs_g, fat_g, nutrients, matched_ingredients, total_ingredients))
+
+instrument_class(Repository, 'db', exclude=('connection', 'transaction', 'close'))
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+def get_repository():
+    """
+    Returns the process-wide repository for the default database file.
+
+    The repository is created on first use and its connections are closed when
+    the interpreter exits.
+    """
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = Repository()
+            atexit.register(_repository.close)
+        return _repository
@@ -0,0 +1,134 @@
+import re
+from bisect import bisect_left
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+# Lookup settings
+DEFAULT_CACHE_SIZE = 128
+DEFAULT_RESULT_LIMIT = 50
+# A fuzzy match must score at least this in fuzzy_score
+FUZZY_MIN_SCORE = 0.8
+
+_WORD = re.compile(r'\w+')
+
+
+class FoodNameIndex:
+    """
+    An in-memory, case-insensitive prefix index over food_library names.
+
+    The names are kept in a list sorted by their case-folded form, so every
+    prefix maps to one contiguous slice of that list and is found with two
+    binary searches instead of a table scan. When a query extends the previous
+    one (the user typed another character), the search is narrowed inside the
+    previous slice rather than over the whole list. Recent queries are kept in
+    an LRU cache of slice bounds, which is cleared whenever a name is added.
+
+    Attributes:
+        cache_size (int): The maximum number of queries kept in the LRU cache.
+    """
+    def __init__(self, names=(), cache_size=DEFAULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._entries = sorted({(name.casefold(), name) for name in names})
+        self._keys = [key for key, _ in self._entries]
+        self._cache = OrderedDict()
+        self._last_query = None; self._last_bounds = (0, len(self._keys))
+
+    @classmethod
+    def from_repository(cls, repo, user_id, cache_size=DEFAULT_CACHE_SIZE):
+        """Builds an index over every food_library name belonging to a user."""
+        return cls(repo.get_food_names(user_id), cache_size=cache_size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        entry = (name.casefold(), name)
+        i = bisect_left(self._entries, entry)
+        return i < len(self._entries) and self._entries[i] == entry
+
+    def add(self, name):
+        """Adds a name to the index, keeping it sorted. Names already present are ignored."""
+        if name in self: return
+        entry = (name.casefold(), name)
+        i = bisect_left(self._entries, entry)
+        self._entries.insert(i, entry); self._keys.insert(i, entry[0])
+        self._cache.clear()
+        self._last_query = None; self._last_bounds = (0, len(self._keys))
+
+    def search(self, prefix, limit=DEFAULT_RESULT_LIMIT):
+        """
+        Returns the names that start with `prefix`, ignoring case, in sorted order.
+
+        Args:
+            prefix (str): The text typed so far.
+            limit (int | None): The maximum number of names to return, or None for all.
+
+        Returns:
+            list[str]: The matching names.
+        """
+        key = prefix.casefold()
+        lo, hi = self._bounds(key)
+        if limit is not None: hi = min(hi, lo + limit)
+        return [name for _, name in self._entries[lo:hi]]
+
+    def _bounds(self, key):
+        """Returns the [lo, hi) slice of the sorted keys that start with `key`."""
+        bounds = self._cache.get(key)
+        if bounds is not None:
+            self._cache.move_to_end(key)
+        else:
+            if self._last_query is not None and key.startswith(self._last_query):
+                lo, hi = self._last_bounds
+            else:
+                lo, hi = 0, len(self._keys)
+            # Every key starting with `key` sorts below `key` followed by the highest code point
+            start = bisect_left(self._keys, key, lo, hi)
+            end = bisect_left(self._keys, key + '\U0010ffff', start, hi) if key else hi
+            bounds = (start, end)
+            self._cache[key] = bounds
+            if len(self._cache) > self.cache_size: self._cache.popitem(last=False)
+        self._last_query = key; self._last_bounds = bounds
+        return bounds
+
+
+def search_words(text):
+    """Splits search text into case-folded words, the way the food_search tokenizer does."""
+    return _WORD.findall(text.casefold())
+
+def fts_query(words):
+    """Returns an FTS5 query matching rows that contain every word, the last one as a prefix."""
+    quoted = [f'"{word}"' for word in words]
+    if quoted: quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def trigrams(words):
+    """Returns the distinct trigrams of the words of at least three characters, in order."""
+    return list(dict.fromkeys(word[i:i + 3] for word in words for i in range(len(word) - 2)))
+
+def fuzzy_query(words):
+    """Returns an FTS5 trigram query matching rows that share any trigram with the words, or '' if they are all too short."""
+    return ' OR '.join(f'"{trigram}"' for trigram in trigrams(words))
+
+def fuzzy_score(words, name):
+    """
+    Returns how closely a name matches search words, from 0 to 1.
+
+    Each word is compared with every word of the name using difflib's similarity
+    ratio; the last word, which may still be being typed, is also compared with
+    the name words cut to its length. Every word must match, so the score is
+    the lowest of the words' best ratios: "chiken" scores 0.92 against
+    "CHICKEN,BROILERS,RAW".
+    """
+    name_words = search_words(name)
+    if not words or not name_words: return 0.0
+    score = 1.0
+    for i, word in enumerate(words):
+        candidates = name_words + [name_word[:len(word)] for name_word in name_words] if i == len(words) - 1 else name_words
+        matcher = SequenceMatcher(b=word, autojunk=False)
+        best = 0.0
+        for candidate in candidates:
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best: best = max(best, matcher.ratio())
+        score = min(score, best)
+        if score < FUZZY_MIN_SCORE: break
+    return score
@@ -0,0 +1,494 @@
+import argparse
+import base64
+import gzip
+import json
+import math
+import sqlite3
+import time
+import urllib.parse
+from dataclasses import dataclass
+from datetime import datetime
+
+from database_setup import archive_files
+from nutrients import NutrientDictionary, pack, unpack
+from repository import INSERT_FOOD_VERSION, SELECT_ENTRY_VERSION, Repository
+
+# Define file paths
+DB_FILE = 'calorie_tracker.db'
+
+# Sync settings
+BUNDLE_FORMAT = 1
+FETCH_BATCH = 500
+DEFAULT_CALORIE_GOAL = 2000
+
+# The values a bundle carries for a changed row of each table, after its key
+SYNC_COLUMNS = {
+    'users': ('daily_calorie_goal', 'daily_protein_goal', 'daily_carbs_goal', 'daily_fat_goal'),
+    'food_library': ('calories', 'protein_g', 'carbs_g', 'fat_g', 'category', 'aliases', 'nutrients'),
+    'food_log': ('username', 'entry_date', 'quantity', 'food_name', 'calories', 'protein_g', 'carbs_g', 'fat_g'),
+}
+
+# The changes after a sync point, leaving out those that came from the peer being exported to
+SELECT_CHANGES = '''SELECT table_name, op, row_key, row_id, changed_at, IFNULL(origin, :device) FROM sync_changes
+                    WHERE seq > :since AND seq <= :to_seq AND IFNULL(origin, :device) != :peer ORDER BY seq'''
+# The values of changed rows by local id, in SYNC_COLUMNS order after the id; food_log rows carry the user_id,
+# which is replaced by the username, so the query also runs against archive files
+SELECT_CHANGED_ROWS = {
+    'users': 'SELECT user_id, daily_calorie_goal, daily_protein_goal, daily_carbs_goal, daily_fat_goal FROM users WHERE user_id IN ({ids})',
+    'food_library': 'SELECT food_id, calories, protein_g, carbs_g, fat_g, category, aliases, nutrients FROM food_library WHERE food_id IN ({ids})',
+    'food_log': '''SELECT l.log_id, l.user_id, l.entry_date, l.quantity, v.food_name, v.calories, v.protein_g, v.carbs_g, v.fat_g
+                   FROM food_log AS l JOIN food_versions AS v ON v.version_id = l.version_id WHERE l.log_id IN ({ids})''',
+}
+# Every current row with its key, in the same layout, for a full snapshot. Entries of archived years are left out.
+SELECT_SNAPSHOT_ROWS = {
+    'users': 'SELECT json_array(username), user_id, daily_calorie_goal, daily_protein_goal, daily_carbs_goal, daily_fat_goal FROM users',
+    'food_library': '''SELECT json_array(u.username, f.food_name), f.food_id, f.calories, f.protein_g, f.carbs_g, f.fat_g, f.category, f.aliases, f.nutrients
+                       FROM food_library AS f LEFT JOIN users AS u ON u.user_id = f.user_id''',
+    'food_log': '''SELECT json_array(IFNULL(d.device_uuid, :device), IFNULL(l.origin_log_id, l.log_id)), l.log_id, l.user_id, l.entry_date, l.quantity,
+                          v.food_name, v.calories, v.protein_g, v.carbs_g, v.fat_g
+                   FROM food_log AS l JOIN food_versions AS v ON v.version_id = l.version_id
+                   LEFT JOIN sync_devices AS d ON d.device_id = l.origin_device''',
+}
+# Records a row's change under the next sequence number, with the version it was made at
+RECORD_CHANGE = '''INSERT INTO sync_changes (table_name, row_key, row_id, op, seq, changed_at, origin)
+                   SELECT :table, :key, :row_id, :op, seq, :changed_at, :origin FROM sync_state WHERE true
+                   ON CONFLICT (table_name, row_key) DO UPDATE SET
+                       row_id = excluded.row_id, op = excluded.op, seq = excluded.seq, changed_at = excluded.changed_at, origin = excluded.origin'''
+UPDATE_LOG_ENTRY = f'''UPDATE food_log SET user_id = :user_id, entry_date = :entry_date, quantity = :quantity, version_id = ({SELECT_ENTRY_VERSION})
+                       WHERE log_id = :log_id'''
+INSERT_SYNCED_LOG_ENTRY = f'''INSERT INTO food_log (log_id, user_id, entry_date, quantity, version_id, origin_device, origin_log_id)
+                              VALUES (:log_id, :user_id, :entry_date, :quantity, ({SELECT_ENTRY_VERSION}), :origin_device, :origin_log_id)'''
+UPSERT_LIBRARY_FOOD = '''INSERT INTO food_library (user_id, food_name, calories, protein_g, carbs_g, fat_g, category, aliases, nutrients)
+                         VALUES (:user_id, :food_name, :calories, :protein_g, :carbs_g, :fat_g, :category, :aliases, :nutrients)
+                         ON CONFLICT (user_id, food_name) DO UPDATE SET
+                             calories = excluded.calories, protein_g = excluded.protein_g, carbs_g = excluded.carbs_g, fat_g = excluded.fat_g,
+                             category = excluded.category, aliases = excluded.aliases, nutrients = excluded.nutrients'''
+
+
+@dataclass
+class BundleReport:
+    """
+    Describes a bundle written by `export_changes`.
+
+    Attributes:
+        path (str): The bundle file.
+        changes (int): The changed rows it carries.
+        from_seq (int): The sync point it starts after; 0 for a full snapshot.
+        to_seq (int): The last sequence number it covers.
+        unkeyed (int): Changed rows left out because their user has no username
+            to key them by on other devices.
+        seconds (float): Wall-clock time spent on the export.
+    """
+    path: str
+    changes: int = 0
+    from_seq: int = 0
+    to_seq: int = 0
+    unkeyed: int = 0
+    seconds: float = 0.0
+
+    def __str__(self):
+        if self.from_seq == 0: kind = 'full snapshot'
+        elif self.to_seq <= self.from_seq: kind = f'no changes since {self.from_seq}'
+        else: kind = f'changes {self.from_seq + 1}-{self.to_seq}'
+        left_out = f" Left out {self.unkeyed} rows of users without a username." if self.unkeyed else ''
+        return f"Exported {self.changes} rows ({kind}) to '{self.path}' in {self.seconds:.2f}s.{left_out}"
+
+
+@dataclass
+class SyncReport:
+    """
+    Counts the changes handled while importing one bundle.
+
+    Attributes:
+        device (str): The device that exported the bundle.
+        applied (int): Changes written to this database.
+        superseded (int): Changes that lost to a newer version of the row here.
+        skipped (int): Changes already applied, and changes to entries of
+            archived years, which are not synced.
+        rejected (int): Changes that could not be applied, such as rows without
+            a username or rows violating a constraint here. They are left out and
+            the rest of the bundle is applied.
+        already_imported (bool): True if every change in the bundle had been
+            imported before.
+        seconds (float): Wall-clock time spent on the import.
+    """
+    device: str
+    applied: int = 0
+    superseded: int = 0
+    skipped: int = 0
+    rejected: int = 0
+    already_imported: bool = False
+    seconds: float = 0.0
+
+    def __str__(self):
+        if self.already_imported:
+            return f"{self.device}: already imported, skipped."
+        rejected = f", {self.rejected} rejected" if self.rejected else ''
+        return f"{self.device}: {self.applied} applied, {self.superseded} superseded, {self.skipped} skipped{rejected} in {self.seconds:.2f}s."
+
+
+def _encode_blob(blob):
+    return None if blob is None else base64.b64encode(blob).decode('ascii')
+
+def _start_capture(repo):
+    """Turns on change capture, and returns this device's id. Enabling it takes a sequence number, so no sync point is ever 0."""
+    with repo.transaction() as conn:
+        conn.execute('UPDATE sync_state SET enabled = 1, seq = seq + 1 WHERE enabled = 0')
+        return conn.execute('SELECT device_uuid FROM sync_state').fetchone()[0]
+
+def _changed_row_values(conn, rows):
+    """
+    Reads the current values of a batch of inserted or updated rows, keyed by (table, row_id).
+
+    Log entries that the archive job has moved since they changed are read
+    from the archive files, which are only opened if some are missing.
+    """
+    values = {}
+    for table, query in SELECT_CHANGED_ROWS.items():
+        ids = [row[3] for row in rows if row[0] == table and row[1] != 'D']
+        if not ids: continue
+        found = conn.execute(query.format(ids=', '.join('?' * len(ids))), ids).fetchall()
+        if table == 'food_log' and len(found) < len(ids):
+            missing = sorted(set(ids) - {row[0] for row in found})
+            for _, path in archive_files(conn):
+                archive = sqlite3.connect(f'file:{urllib.parse.quote(path)}?mode=ro', uri=True)
+                try:
+                    found += archive.execute(query.format(ids=', '.join('?' * len(missing))), missing).fetchall()
+                finally:
+                    archive.close()
+        values.update(((table, row[0]), list(row[1:])) for row in found)
+    return values
+
+def _encode_values(conn, table, values, usernames):
+    """Turns a row's values into their bundle form: packed nutrients as base64, and user ids as usernames."""
+    if table == 'food_library':
+        values[-1] = _encode_blob(values[-1])
+    elif table == 'food_log':
+        user_id = values[0]
+        if user_id not in usernames:
+            row = conn.execute('SELECT username FROM users WHERE user_id = ?', (user_id,)).fetchone()
+            usernames[user_id] = row[0] if row else None
+        values[0] = usernames[user_id]
+    return values
+
+def _keyed(change):
+    """Returns False for a change to a library food or log entry of a user without a username."""
+    table, _, key, _, _, values = change
+    if table == 'food_library': return json.loads(key)[0] is not None
+    return table != 'food_log' or values is None or values[0] is not None
+
+def _iter_bundle_changes(conn, device, peer, since, to_seq, report):
+    """
+    Yields the [table, op, key, changed_at, origin, values] changes of a bundle, a full snapshot first if `since` is 0.
+
+    Rows of a user without a username, which other devices could not match,
+    are left out and counted in `report.unkeyed`.
+    """
+    usernames = {}
+    if since == 0:
+        for table, query in SELECT_SNAPSHOT_ROWS.items():
+            for row in conn.execute(query, {'device': device}):
+                change = [table, 'U', row[0], '', device, _encode_values(conn, table, list(row[2:]), usernames)]
+                if _keyed(change): yield change
+                else: report.unkeyed += 1
+    cursor = conn.execute(SELECT_CHANGES, {'device': device, 'since': since, 'to_seq': to_seq, 'peer': peer or ''})
+    while rows := cursor.fetchmany(FETCH_BATCH):
+        values = _changed_row_values(conn, rows)
+        for table, op, key, row_id, changed_at, origin in rows:
+            if op == 'D':
+                change = [table, op, key, changed_at, origin, None]
+            elif (table, row_id) in values:
+                change = [table, op, key, changed_at, origin, _encode_values(conn, table, values[table, row_id], usernames)]
+            else:
+                continue
+            if _keyed(change): yield change
+            else: report.unkeyed += 1
+
+def export_changes(repo, path, peer=None, full=False):
+    """
+    Writes the changes another device has not acknowledged yet to a gzipped bundle file.
+
+    The bundle holds a JSON header line and one JSON line per changed row: its
+    table, whether it was inserted, updated or deleted, its key, its version
+    and its current values. Only the latest change of each row is kept, and the
+    changes start after the last sequence number `peer` acknowledged, so the
+    export reads just the rows changed since. A device not synced with before
+    (or `full`) gets a full snapshot of the users, library and log instead.
+    Nothing is recorded, so a lost bundle is simply exported again.
+
+    Args:
+        repo (Repository): The repository of this device's database.
+        path (str): The bundle file to write.
+        peer (str | None): The id of the device the bundle is for.
+        full (bool): Export a full snapshot even if `peer` has a sync point.
+
+    Returns:
+        BundleReport: The rows exported and the sequence range covered.
+    """
+    start = time.perf_counter()
+    device = _start_capture(repo)
+    conn = repo.connection()
+    row = conn.execute('SELECT exported_seq FROM sync_peers WHERE device_uuid = ?', (peer,)).fetchone() if peer else None
+    report = BundleReport(path, from_seq=0 if full or row is None else row[0])
+    conn.execute('BEGIN')
+    try:
+        report.to_seq = conn.execute('SELECT seq FROM sync_state').fetchone()[0]
+        dictionary = NutrientDictionary.from_connection(conn)
+        header = {'format': BUNDLE_FORMAT, 'device': device, 'peer': peer, 'from_seq': report.from_seq, 'to_seq': report.to_seq,
+                  'created_at': datetime.now().isoformat(timespec='seconds'),
+                  'acknowledged': dict(conn.execute('SELECT device_uuid, imported_seq FROM sync_peers')),
+                  'nutrients': list(zip(dictionary.names, dictionary.units)), 'columns': SYNC_COLUMNS}
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps(header) + '\n')
+            for change in _iter_bundle_changes(conn, device, peer, report.from_seq, report.to_seq, report):
+                f.write(json.dumps(change, separators=(',', ':')) + '\n'); report.changes += 1
+    finally:
+        conn.commit()
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+class _ChangeApplier:
+    """
+    Applies the changes of one bundle to this device's database, inside the import transaction.
+
+    A change is applied only if its version, the (changed_at, device) pair of
+    the edit, is newer than the version of the same row here: the one recorded
+    in 'sync_changes', or ('', this device) for a row that has not changed
+    since sync was enabled. Both devices therefore keep the same version of a
+    row whatever order bundles arrive in, the last edit winning and the device
+    id breaking ties.
+    """
+    def __init__(self, conn, device, header):
+        self.conn = conn; self.device = device
+        self.nutrients = header['nutrients']
+        self.dictionary = None
+        self.user_ids = {}; self.device_ids = {}
+
+    def user_id(self, username, create=False):
+        """Returns the local user_id of a username, adding the user if asked."""
+        if username not in self.user_ids:
+            row = self.conn.execute('SELECT user_id FROM users WHERE username = ?', (username,)).fetchone()
+            self.user_ids[username] = row[0] if row else None
+        if self.user_ids[username] is None and create:
+            self.user_ids[username] = self.conn.execute('INSERT INTO users (username, daily_calorie_goal) VALUES (?, ?)',
+                                                        (username, DEFAULT_CALORIE_GOAL)).lastrowid
+        return self.user_ids[username]
+
+    def device_id(self, device_uuid, create=False):
+        """Returns the local number of another device, adding it if asked."""
+        if device_uuid not in self.device_ids:
+            if create: self.conn.execute('INSERT OR IGNORE INTO sync_devices (device_uuid) VALUES (?)', (device_uuid,))
+            row = self.conn.execute('SELECT device_id FROM sync_devices WHERE device_uuid = ?', (device_uuid,)).fetchone()
+            if row is None: return None
+            self.device_ids[device_uuid] = row[0]
+        return self.device_ids[device_uuid]
+
+    def nutrient_blob(self, encoded):
+        """Repacks a nutrient blob from the exporting device's nutrient layout into this database's."""
+        if encoded is None: return None
+        if self.dictionary is None:
+            NutrientDictionary.register(self.conn, self.nutrients)
+            self.dictionary = NutrientDictionary.from_connection(self.conn)
+        vector = unpack(base64.b64decode(encoded), len(self.nutrients))
+        return pack(self.dictionary.vector({name: float(value) for (name, _), value in zip(self.nutrients, vector) if not math.isnan(value)}))
+
+    def archived(self, entry_date=None, log_id=None):
+        """Returns True if a date falls in an archived year, or a log_id in the range moved to an archive."""
+        if entry_date is not None:
+            return self.conn.execute('SELECT 1 FROM log_archives WHERE ? BETWEEN start_date AND end_date', (entry_date,)).fetchone() is not None
+        return self.conn.execute('SELECT 1 FROM log_archives WHERE ? BETWEEN min_log_id AND max_log_id', (log_id,)).fetchone() is not None
+
+    def find(self, table, key):
+        """Returns the local id of the row with a key, or None if it is not in this database."""
+        if table == 'users':
+            return self.user_id(key[0])
+        if table == 'food_library':
+            user_id = self.user_id(key[0])
+            row = user_id and self.conn.execute('SELECT food_id FROM food_library WHERE user_id = ? AND food_name = ?', (user_id, key[1])).fetchone()
+            return row[0] if row else None
+        device_uuid, log_id = key
+        if device_uuid == self.device:
+            row = self.conn.execute('SELECT log_id FROM food_log WHERE log_id = ?', (log_id,)).fetchone()
+        else:
+            device_id = self.device_id(device_uuid)
+            row = device_id and self.conn.execute('SELECT log_id FROM food_log WHERE origin_device = ? AND origin_log_id = ?', (device_id, log_id)).fetchone()
+        return row[0] if row else None
+
+    def write(self, table, key, row_id, values):
+        """Inserts or updates a row from a change's values and returns its local id, or None if it was skipped."""
+        conn = self.conn
+        if table == 'users':
+            goals = dict(zip(SYNC_COLUMNS['users'], values))
+            if row_id is None:
+                self.user_ids[key[0]] = conn.execute('INSERT INTO users (username, daily_calorie_goal, daily_protein_goal, daily_carbs_goal, daily_fat_goal) '
+                                                     'VALUES (:username, :daily_calorie_goal, :daily_protein_goal, :daily_carbs_goal, :daily_fat_goal)',
+                                                     {'username': key[0], **goals}).lastrowid
+                return self.user_ids[key[0]]
+            conn.execute('UPDATE users SET daily_calorie_goal = :daily_calorie_goal, daily_protein_goal = :daily_protein_goal, '
+                         'daily_carbs_goal = :daily_carbs_goal, daily_fat_goal = :daily_fat_goal WHERE user_id = :user_id', {'user_id': row_id, **goals})
+            return row_id
+        if table == 'food_library':
+            food = dict(zip(SYNC_COLUMNS['food_library'], values))
+            food.update(user_id=self.user_id(key[0], create=True), food_name=key[1], nutrients=self.nutrient_blob(food['nutrients']))
+            conn.execute(UPSERT_LIBRARY_FOOD, food)
+            return conn.execute('SELECT food_id FROM food_library WHERE user_id = ? AND food_name = ?', (food['user_id'], key[1])).fetchone()[0]
+        entry = dict(zip(SYNC_COLUMNS['food_log'], values))
+        if self.archived(entry_date=entry['entry_date']): return None
+        entry['user_id'] = self.user_id(entry.pop('username'), create=True)
+        conn.execute(INSERT_FOOD_VERSION, entry)
+        if row_id is not None:
+            conn.execute(UPDATE_LOG_ENTRY, {**entry, 'log_id': row_id})
+            return row_id
+        device_uuid, log_id = key
+        local = device_uuid == self.device
+        return conn.execute(INSERT_SYNCED_LOG_ENTRY, {**entry, 'log_id': log_id if local else None, 'origin_device': None if local else self.device_id(device_uuid, create=True),
+                                                      'origin_log_id': None if local else log_id}).lastrowid
+
+    def apply(self, change, report):
+        """
+        Applies one [table, op, key, changed_at, origin, values] change if it is newer than the row here.
+
+        A change without a username, or one that violates a constraint here, is
+        rolled back on its own and counted as rejected.
+        """
+        if not _keyed(change):
+            report.rejected += 1; return
+        self.conn.execute('SAVEPOINT sync_change')
+        try:
+            self._apply(change, report)
+        except sqlite3.IntegrityError:
+            self.conn.execute('ROLLBACK TO sync_change')
+            self.user_ids.clear(); self.device_ids.clear(); self.dictionary = None
+            report.rejected += 1
+        finally:
+            self.conn.execute('RELEASE sync_change')
+
+    def _apply(self, change, report):
+        table, op, row_key, changed_at, origin, values = change
+        key = json.loads(row_key)
+        row_id = self.find(table, key)
+        if table == 'food_log' and row_id is None and key[0] == self.device and self.archived(log_id=key[1]):
+            report.skipped += 1; return
+        version = self.conn.execute('SELECT changed_at, IFNULL(origin, ?) FROM sync_changes WHERE table_name = ? AND row_key = ?',
+                                    (self.device, table, row_key)).fetchone()
+        if version is None and row_id is not None: version = ('', self.device)
+        if version is not None and (changed_at, origin) <= tuple(version):
+            if (changed_at, origin) == tuple(version): report.skipped += 1
+            else: report.superseded += 1
+            return
+        if op == 'D':
+            if row_id is not None:
+                pk = {'users': 'user_id', 'food_library': 'food_id', 'food_log': 'log_id'}[table]
+                self.conn.execute(f'DELETE FROM {table} WHERE {pk} = ?', (row_id,))
+                if table == 'users': self.user_ids.pop(key[0], None)
+        else:
+            row_id = self.write(table, key, row_id, values)
+            if row_id is None:
+                report.skipped += 1; return
+        self.conn.execute('UPDATE sync_state SET seq = seq + 1')
+        self.conn.execute(RECORD_CHANGE, {'table': table, 'key': row_key, 'row_id': row_id, 'op': op, 'changed_at': changed_at,
+                                          'origin': None if origin == self.device else origin})
+        report.applied += 1
+
+
+def import_changes(repo, path):
+    """
+    Applies a bundle exported by another device, in a single transaction.
+
+    Each change is applied only if it is newer than the row here (see
+    _ChangeApplier), and is recorded under its original version, so it is
+    passed on to further devices but never sent back to the one it came from.
+    The device's sync point moves to the end of the bundle, and the bundle's
+    acknowledgement of this device's changes becomes the start of the next
+    export to it. A bundle whose changes were all imported before is skipped,
+    and one that starts after the sync point, so that changes in between would
+    be lost, is refused.
+
+    Raises:
+        ValueError: If the bundle is not a sync bundle, was exported by this
+            device, or does not continue from the last sync point.
+
+    Returns:
+        SyncReport: The changes applied, superseded and skipped.
+    """
+    start = time.perf_counter()
+    device = _start_capture(repo)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline() or 'null')
+        if not isinstance(header, dict) or header.get('format') != BUNDLE_FORMAT:
+            raise ValueError(f"'{path}' is not a sync bundle of format {BUNDLE_FORMAT}.")
+        if header['device'] == device: raise ValueError(f"'{path}' was exported by this device.")
+        report = SyncReport(header['device'])
+        with repo.transaction() as conn:
+            row = conn.execute('SELECT imported_seq FROM sync_peers WHERE device_uuid = ?', (header['device'],)).fetchone()
+            imported_seq = row[0] if row else 0
+            if header['from_seq'] > imported_seq:
+                raise ValueError(f"'{path}' starts after change {header['from_seq']}, but only changes up to {imported_seq} "
+                                 f"from {header['device']} were imported; export again from that device.")
+            if header['from_seq'] > 0 and header['to_seq'] <= imported_seq:
+                report.already_imported = True
+            else:
+                applier = _ChangeApplier(conn, device, header)
+                conn.execute('UPDATE sync_state SET applying = 1')
+                for line in f:
+                    applier.apply(json.loads(line), report)
+                conn.execute('UPDATE sync_state SET applying = 0')
+            conn.execute('''INSERT INTO sync_peers (device_uuid, imported_seq, exported_seq, synced_at) VALUES (?, ?, ?, ?)
+                            ON CONFLICT (device_uuid) DO UPDATE SET imported_seq = MAX(imported_seq, excluded.imported_seq),
+                                exported_seq = MAX(exported_seq, excluded.exported_seq), synced_at = excluded.synced_at''',
+                         (header['device'], header['to_seq'], header['acknowledged'].get(device, 0), datetime.now().isoformat(timespec='seconds')))
+    report.seconds = time.perf_counter() - start
+    return report
+
+def new_device_id(repo):
+    """
+    Gives this database a new device id, for a copy of a database file that is about to sync as a device of its own.
+
+    The entries logged under the old id keep their keys, now as entries
+    received from that device, and every peer gets a full snapshot next time.
+
+    Returns:
+        str: The new device id.
+    """
+    with repo.transaction() as conn:
+        old_device = conn.execute('SELECT device_uuid FROM sync_state').fetchone()[0]
+        conn.execute('INSERT OR IGNORE INTO sync_devices (device_uuid) VALUES (?)', (old_device,))
+        device_id = conn.execute('SELECT device_id FROM sync_devices WHERE device_uuid = ?', (old_device,)).fetchone()[0]
+        conn.execute('UPDATE food_log SET origin_device = ?, origin_log_id = log_id WHERE origin_device IS NULL', (device_id,))
+        conn.execute('UPDATE sync_changes SET origin = ? WHERE origin IS NULL', (old_device,))
+        conn.execute('DELETE FROM sync_peers')
+        conn.execute('UPDATE sync_state SET device_uuid = lower(hex(randomblob(16)))')
+        return conn.execute('SELECT device_uuid FROM sync_state').fetchone()[0]
+
+def print_status(repo):
+    """Prints this device's id and change sequence, and the sync points of the devices it has synced with."""
+    conn = repo.connection()
+    device, seq, enabled = conn.execute('SELECT device_uuid, seq, enabled FROM sync_state').fetchone()
+    print(f"Device {device}: change {seq}" + ('' if enabled else " (not synced yet)"))
+    for peer, imported_seq, exported_seq, synced_at in conn.execute('SELECT device_uuid, imported_seq, exported_seq, synced_at FROM sync_peers ORDER BY synced_at'):
+        print(f"  {peer}: imported up to {imported_seq}, acknowledged up to {exported_seq}, last synced {synced_at}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sync the tracker database with other devices through bundle files.")
+    parser.add_argument('--db', default=DB_FILE, help="database file (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help="show this device's id and its sync points")
+    export_parser = commands.add_parser('export', help="write the changes a device has not seen to a bundle")
+    export_parser.add_argument('bundle', help="bundle file to write, such as laptop.sync.gz")
+    export_parser.add_argument('--peer', metavar='DEVICE', help="the device the bundle is for (default: a full snapshot)")
+    export_parser.add_argument('--full', action='store_true', help="export a full snapshot even if the device has a sync point")
+    import_parser = commands.add_parser('import', help="apply a bundle exported by another device")
+    import_parser.add_argument('bundle', help="bundle file to read")
+    commands.add_parser('new-device', help="give a copied database file its own device id")
+    args = parser.parse_args()
+    repo = Repository(args.db)
+    try:
+        if args.command == 'status': print_status(repo)
+        elif args.command == 'export': print(export_changes(repo, args.bundle, args.peer, args.full))
+        elif args.command == 'import': print(import_changes(repo, args.bundle))
+        else: print(f"This database is now device {new_device_id(repo)}.")
+    except (ValueError, OSError) as e:
+        parser.exit(1, f"Error: {e}\n")
+    finally:
+        repo.close()
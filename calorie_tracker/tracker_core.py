@@ -0,0 +1,451 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from instrumentation import instrument_class
+from repository import get_repository
+from search_index import DEFAULT_RESULT_LIMIT, FUZZY_MIN_SCORE, FoodNameIndex, fts_query, fuzzy_query, fuzzy_score, search_words
+
+# Core settings
+DEFAULT_USER_ID = 1
+SUMMARY_CACHE_SECONDS = 2.0
+MAX_CACHED_USERS = 64
+MAX_CACHED_SUMMARIES = 1024
+FUZZY_CANDIDATES = 200
+DEFAULT_TREND_DAYS = 30
+
+
+class FoodNotFoundError(LookupError):
+    """Raised when a food is not in the user's library."""
+
+
+class RecipeNotFoundError(LookupError):
+    """Raised when a user has no recipe with the requested name."""
+
+
+def _lru_get(cache, key):
+    """Returns a cached value, or None, marking it as the most recently used."""
+    value = cache.get(key)
+    if value is not None: cache.move_to_end(key)
+    return value
+
+def _lru_put(cache, key, value, max_size, replace=True):
+    """Caches a value (keeping an existing one unless `replace`), evicting the least recently used entries beyond `max_size`."""
+    if replace or key not in cache: cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size: cache.popitem(last=False)
+    return cache[key]
+
+
+class TrackerCore:
+    """
+    The calorie tracker's logging, search and summary logic, independent of any UI.
+
+    Every operation takes the user it acts for, so one core can serve the Tk app
+    and many users of the JSON API at once. Database access goes through the
+    repository, whose per-thread connections are reused across calls.
+
+    Per-user caches sit in front of the database. The food-name search index
+    and the macro matrix the meal planner scores are built on first use and
+    kept in sync as foods are added through the core; they are kept for the
+    MAX_CACHED_USERS most recently active users. Daily summaries are cached for
+    SUMMARY_CACHE_SECONDS (at most MAX_CACHED_SUMMARIES of them) and dropped
+    whenever the core logs food for that user and day; the short expiry bounds
+    how stale a summary can be when another process writes to the database.
+    The caches are guarded by a lock so the core is safe to share between
+    threads. Trends are cached by a TrendsCache, created on first use so
+    pandas is only imported when they are asked for, invalidated day by day as
+    food is logged, and only dropped wholesale when another connection has
+    written to the database.
+
+    numpy and the modules built on it (nutrients, planner, recipes) are imported
+    by the operations that use them rather than with the core, so opening the
+    app and reading its summary, log and search index never waits for them;
+    `preload` imports them ahead of time.
+
+    Attributes:
+        repo (Repository): The repository the core reads and writes through.
+    """
+    def __init__(self, repo=None):
+        self.repo = repo or get_repository()
+        self._lock = threading.Lock()
+        self._search_indexes = OrderedDict()
+        self._food_matrices = OrderedDict()
+        self._summaries = OrderedDict()
+        self._trends = None
+        self._nutrient_dictionary = None
+
+    def preload(self):
+        """Imports the numerical modules used by logging, nutrients, recipes and planning."""
+        import nutrients
+        import planner
+        import recipes
+
+    # --- Search ---
+
+    def get_search_index(self, user_id):
+        """Returns the user's food-name index, building it from the library on first use."""
+        with self._lock:
+            index = _lru_get(self._search_indexes, user_id)
+        if index is None:
+            index = FoodNameIndex.from_repository(self.repo, user_id)
+            with self._lock:
+                index = _lru_put(self._search_indexes, user_id, index, MAX_CACHED_USERS, replace=False)
+        return index
+
+    def search_foods(self, user_id, prefix, limit=DEFAULT_RESULT_LIMIT, load=True):
+        """
+        Returns the user's food names that start with `prefix`, ignoring case.
+
+        Args:
+            user_id (int): The user whose library is searched.
+            prefix (str): The text typed so far. An empty prefix matches nothing.
+            limit (int | None): The maximum number of names to return, or None for all.
+            load (bool): Build the user's index if it is not cached yet. With
+                False, an uncached user gets no results instead of a database read.
+
+        Returns:
+            list[str]: The matching names in sorted order.
+        """
+        if not prefix: return []
+        if load: self.get_search_index(user_id)
+        with self._lock:
+            index = _lru_get(self._search_indexes, user_id)
+            return index.search(prefix, limit=limit) if index is not None else []
+
+    def find_foods(self, user_id, text, limit=DEFAULT_RESULT_LIMIT):
+        """
+        Returns the user's foods matching free search text, best match first.
+
+        Every word of the text must start a word of the food's name, category or
+        aliases, so "chai" finds "Hot tea (Garam Chai)" and "butter whip" finds
+        "BUTTER,WHIPPED,WITH SALT". Matches are ranked by bm25 relevance, with
+        foods the user logs often boosted. When that finds fewer than `limit`
+        foods, up to FUZZY_CANDIDATES names sharing a trigram with the text are
+        scored by their words' similarity to it, and those scoring at least
+        FUZZY_MIN_SCORE are appended, best first. This catches typos such as
+        "chiken".
+
+        Args:
+            user_id (int): The user whose library is searched.
+            text (str): The search text. Text without any word matches nothing.
+            limit (int): The maximum number of names to return.
+
+        Returns:
+            list[str]: The matching names.
+        """
+        words = search_words(text)
+        if not words: return []
+        names = self.repo.rank_food_names(user_id, fts_query(words), limit)
+        query = fuzzy_query(words)
+        if len(names) < limit and query:
+            found = set(names)
+            scored = [(fuzzy_score(words, name), name) for name in self.repo.rank_food_names(user_id, query, FUZZY_CANDIDATES, fuzzy=True)
+                      if name not in found]
+            scored = [(score, name) for score, name in scored if score >= FUZZY_MIN_SCORE]
+            # sort is stable, so equally close names keep their bm25 order
+            names += [name for _, name in sorted(scored, key=lambda item: -item[0])[:limit - len(names)]]
+        return names
+
+    # --- Logging ---
+
+    def log_food(self, user_id, food_name, quantity=1, entry_date=None):
+        """
+        Logs a quantity of a library food.
+
+        The entry references the food's current per-serving values, which the
+        food_log_entries view scales by the quantity.
+
+        Args:
+            user_id (int): The user logging the food.
+            food_name (str): The name of a food in the user's library.
+            quantity (float): The number of servings. Must be positive.
+            entry_date (str | None): The ISO date to log on. Defaults to today.
+
+        Returns:
+            int: The log_id of the new entry.
+
+        Raises:
+            ValueError: If the quantity is not positive.
+            FoodNotFoundError: If the food is not in the user's library.
+        """
+        import numpy as np
+        if quantity <= 0: raise ValueError("Quantity must be positive.")
+        entry_date = entry_date or date.today().isoformat()
+        with self.repo.transaction():
+            food_data = self.repo.get_food(user_id, food_name)
+            if not food_data: raise FoodNotFoundError(food_name)
+
+            name = food_data[2]
+            macros = np.nan_to_num(np.array(food_data[3:7], dtype=np.float64))
+            log_id = self.repo.log_food(user_id, entry_date, quantity, name, *macros.tolist())
+        self._invalidate_day(user_id, entry_date)
+        return log_id
+
+    def log_meal(self, user_id, foods=(), recipes=(), entry_date=None):
+        """
+        Logs several library foods and recipes at once, in a single transaction.
+
+        The foods are looked up in one query; the recipes use their cached
+        per-serving nutrition. All entries are then written with one
+        executemany, so a meal costs one commit and one summary refresh instead
+        of one per item.
+
+        Args:
+            user_id (int): The user logging the meal.
+            foods (Iterable[tuple[str, float]]): (food_name, quantity) of library foods.
+            recipes (Iterable[tuple[str, float]]): (recipe_name, servings) of the user's recipes.
+            entry_date (str | None): The ISO date to log on. Defaults to today.
+
+        Returns:
+            list[int]: The log_ids of the new entries: the foods in order, then the recipes.
+
+        Raises:
+            ValueError: If a quantity is not positive.
+            FoodNotFoundError: If a food is not in the user's library. Nothing is logged.
+            RecipeNotFoundError: If a recipe does not exist. Nothing is logged.
+        """
+        import numpy as np
+        foods = list(foods); recipes = list(recipes)
+        if any(quantity <= 0 for _, quantity in foods + recipes): raise ValueError("Quantity must be positive.")
+        entry_date = entry_date or date.today().isoformat()
+        entries = []
+        with self.repo.transaction():
+            if foods:
+                library = self.repo.get_foods(user_id, [name for name, _ in foods])
+                for name, _ in foods:
+                    if name not in library: raise FoodNotFoundError(name)
+                macros = np.nan_to_num(np.array([library[name][3:7] for name, _ in foods], dtype=np.float64))
+                for (name, quantity), per_serving in zip(foods, macros.tolist()):
+                    entries.append((user_id, entry_date, quantity, library[name][2], *per_serving))
+            for name, servings in recipes:
+                recipe = self.repo.get_recipe(user_id, name)
+                if recipe is None: raise RecipeNotFoundError(name)
+                per_serving = list(self._recipe_nutrition(user_id, recipe).macros.values())
+                entries.append((user_id, entry_date, servings, recipe[1], *per_serving))
+            log_ids = self.repo.log_foods(entries)
+        if entries: self._invalidate_day(user_id, entry_date)
+        return log_ids
+
+    def add_food(self, user_id, food_name, calories, protein_g=0, carbs_g=0, fat_g=0, log=True, entry_date=None):
+        """
+        Adds a food to the user's library and, by default, logs one serving of it.
+
+        Both writes happen in a single transaction, and the food is added to the
+        user's cached search index and food matrix. If the library already has a
+        food with that name, it is left unchanged and so are the cached matrix
+        rows; the serving is still logged with the given values.
+
+        Returns:
+            int | None: The log_id of the logged serving, or None if `log` is False.
+        """
+        entry_date = entry_date or date.today().isoformat()
+        with self.repo.transaction():
+            added = self.repo.add_food(user_id, food_name, calories, protein_g, carbs_g, fat_g)
+            log_id = self.repo.log_food(user_id, entry_date, 1, food_name, calories, protein_g, carbs_g, fat_g) if log else None
+        if added:
+            with self._lock:
+                index = self._search_indexes.get(user_id)
+                if index is not None: index.add(food_name)
+                matrix = self._food_matrices.get(user_id)
+                if matrix is not None: matrix.add(food_name, calories, protein_g, carbs_g, fat_g)
+        if log: self._invalidate_day(user_id, entry_date)
+        return log_id
+
+    # --- Summaries and logs ---
+
+    def get_summary(self, user_id, entry_date=None):
+        """Returns the user's (calorie_goal, calories, protein_g, carbs_g, fat_g) for a date, defaulting to today."""
+        key = (user_id, entry_date or date.today().isoformat())
+        with self._lock:
+            cached = _lru_get(self._summaries, key)
+        if cached is not None and time.monotonic() - cached[0] < SUMMARY_CACHE_SECONDS:
+            return cached[1]
+        summary = self.repo.get_daily_summary(*key)
+        with self._lock:
+            _lru_put(self._summaries, key, (time.monotonic(), summary), MAX_CACHED_SUMMARIES)
+        return summary
+
+    def get_nutrient_totals(self, user_id, entry_date=None, include_missing=False):
+        """
+        Returns every nutrient the user logged on a date (default today), keyed by nutrient name.
+
+        The per-serving vectors of the day's foods are stacked and weighted by
+        their quantities in one matrix-vector product. Calories and macros come
+        from the log entries themselves, so they match the daily summary even if
+        a library food has changed since it was logged. Nutrients no logged food
+        has a value for are left out unless `include_missing` is set.
+        """
+        import numpy as np
+        import nutrients
+        dictionary = self.get_nutrient_dictionary()
+        rows = self.repo.get_day_nutrients(user_id, entry_date or date.today().isoformat())
+        if not rows: return dictionary.to_dict(np.zeros(len(dictionary)), include_missing=True)
+        logged = np.array([row[:5] for row in rows], dtype=np.float64)
+        quantities = logged[:, 0]
+        vectors = [dictionary.food_vector(row[5], per_serving) for row, per_serving in zip(rows, (logged[:, 1:] / quantities[:, None]).tolist())]
+        totals = nutrients.total(quantities, vectors)
+        totals[dictionary.positions(nutrients.MACRO_NAMES)] = np.nansum(logged[:, 1:], axis=0)
+        return dictionary.to_dict(totals, include_missing=include_missing)
+
+    def get_nutrient_dictionary(self):
+        """Returns the layout of the nutrient vectors, read from the database on first use."""
+        with self._lock:
+            if self._nutrient_dictionary is None: self._nutrient_dictionary = self.repo.get_nutrient_dictionary()
+            return self._nutrient_dictionary
+
+    def get_log(self, user_id, entry_date=None, after_log_id=0):
+        """Returns the user's log entries for a date (default today), optionally only those after `after_log_id`."""
+        return self.repo.get_daily_log(user_id, entry_date or date.today().isoformat(), after_log_id=after_log_id)
+
+    def get_log_entry(self, log_id):
+        """Returns a single log entry, or None if it does not exist."""
+        return self.repo.get_log_entry(log_id)
+
+    def get_history_page(self, user_id, start_date, end_date, offset, page_size, total=None):
+        """
+        Returns one page of the user's entries between two dates.
+
+        Args:
+            total (int | None): The number of entries in the range if already known;
+                it is read from daily_totals otherwise.
+
+        Returns:
+            tuple[int, int, list]: The total entry count, the offset actually used
+            (clamped so the last page is full), and the page's rows.
+        """
+        if total is None: total = self.repo.count_log_entries(user_id, start_date, end_date)
+        offset = max(0, min(offset, total - page_size))
+        return total, offset, self.repo.get_log_page(user_id, start_date, end_date, offset, page_size)
+
+    # --- Recipes ---
+
+    def search_recipes(self, user_id, prefix='', limit=DEFAULT_RESULT_LIMIT):
+        """Returns the user's recipe names starting with `prefix`, in sorted order."""
+        return self.repo.search_recipe_names(user_id, prefix, limit)
+
+    def get_recipe(self, user_id, recipe_name):
+        """
+        Returns a recipe with its ingredients and per-serving nutrition.
+
+        Returns:
+            dict: 'recipe_name', 'servings', 'serving_size', 'ingredients' (a list of
+            (ingredient, amount, unit, food_name) tuples) and 'nutrition' (a RecipeNutrition).
+
+        Raises:
+            RecipeNotFoundError: If the user has no such recipe.
+        """
+        recipe = self.repo.get_recipe(user_id, recipe_name)
+        if recipe is None: raise RecipeNotFoundError(recipe_name)
+        recipe_id, name, servings, serving_size = recipe
+        ingredients = [row[:4] for row in self.repo.get_recipe_ingredients(user_id, recipe_id)]
+        return {'recipe_name': name, 'servings': servings, 'serving_size': serving_size,
+                'ingredients': ingredients, 'nutrition': self._recipe_nutrition(user_id, recipe)}
+
+    def _recipe_nutrition(self, user_id, recipe):
+        """
+        Returns a recipe's per-serving nutrition from the recipe_nutrition cache, computing and caching it on a miss.
+
+        Triggers empty the cache row whenever the recipe or one of its library
+        foods changes. The miss path reads the ingredients and writes the result
+        in one immediate transaction, so a concurrent change cannot be cached over.
+        """
+        import nutrients
+        from recipes import RecipeNutrition, compute_recipe_nutrition
+        recipe_id, _, servings, _ = recipe
+        dictionary = self.get_nutrient_dictionary()
+        cached = self.repo.get_recipe_nutrition(recipe_id)
+        if cached is not None:
+            *macros, blob, matched, total = cached
+            return RecipeNutrition(dict(zip(nutrients.MACRO_NAMES, macros)), dictionary.to_dict(nutrients.unpack(blob, len(dictionary))), matched, total)
+        with self.repo.transaction():
+            nutrition = compute_recipe_nutrition(dictionary, servings, self.repo.get_recipe_ingredients(user_id, recipe_id))
+            self.repo.save_recipe_nutrition(recipe_id, *nutrition.macros.values(), nutrients.pack(dictionary.vector(nutrition.nutrients)),
+                                            nutrition.matched_ingredients, nutrition.total_ingredients)
+        return nutrition
+
+    # --- Meal planning ---
+
+    def get_food_matrix(self, user_id):
+        """Returns the user's FoodMatrix, building it from the library on first use."""
+        with self._lock:
+            matrix = _lru_get(self._food_matrices, user_id)
+        if matrix is None:
+            from planner import FoodMatrix
+            matrix = FoodMatrix.from_repository(self.repo, user_id)
+            with self._lock:
+                matrix = _lru_put(self._food_matrices, user_id, matrix, MAX_CACHED_USERS, replace=False)
+        return matrix
+
+    def plan_day(self, user_id, max_items=None, entry_date=None):
+        """
+        Suggests library foods and quantities that fill what is left of the user's goals for a date.
+
+        The budget is each daily goal (calories, and protein, carbs and fat where
+        set) minus what has been logged on the date, which defaults to today.
+        At most `max_items` foods are suggested (default: planner.DEFAULT_MAX_ITEMS).
+
+        Returns:
+            MealPlan: The budget and the suggested foods. It has no items once the
+            calorie goal has been reached.
+        """
+        import numpy as np
+        import nutrients
+        from planner import DEFAULT_MAX_ITEMS, MealPlan
+        entry_date = entry_date or date.today().isoformat()
+        goals = self.repo.get_user_goals(user_id)
+        _, *logged = self.get_summary(user_id, entry_date)
+        remaining = {name: (goals[name] - total if goals[name] is not None else None) for name, total in zip(nutrients.MACRO_NAMES, logged)}
+        matrix = self.get_food_matrix(user_id)
+        with self._lock:
+            picks = matrix.plan(remaining, max_items=max_items or DEFAULT_MAX_ITEMS, goals=goals)
+        plan = MealPlan(remaining)
+        for food_name, quantity, scaled in picks:
+            plan.items.append((food_name, quantity, dict(zip(nutrients.MACRO_NAMES, scaled.tolist()))))
+        plan.totals = dict(zip(nutrients.MACRO_NAMES, sum((scaled for _, _, scaled in picks), np.zeros(len(nutrients.MACRO_NAMES))).tolist()))
+        return plan
+
+    # --- Trends ---
+
+    def get_trends(self, user_id, days=DEFAULT_TREND_DAYS, end_date=None):
+        """
+        Returns the user's intake trends for the `days` days ending on `end_date` (default today).
+
+        Returns:
+            analytics.Trends: Daily totals with 7- and 30-day rolling averages, and
+            the adherence to the user's calorie and macro goals.
+
+        Raises:
+            ValueError: If `days` is not positive.
+        """
+        if days <= 0: raise ValueError("The number of days must be positive.")
+        end = date.fromisoformat(end_date) if end_date else date.today()
+        return self._get_trends_cache().get(user_id, (end - timedelta(days=days - 1)).isoformat(), end.isoformat())
+
+    def _get_trends_cache(self):
+        with self._lock:
+            if self._trends is None:
+                from analytics import TrendsCache
+                self._trends = TrendsCache(self.repo)
+            return self._trends
+
+    def _invalidate_day(self, user_id, entry_date):
+        with self._lock:
+            self._summaries.pop((user_id, entry_date), None)
+            trends = self._trends
+        if trends is not None: trends.invalidate(user_id, entry_date)
+
+instrument_class(TrackerCore, 'core')
+
+
+_core = None
+_core_lock = threading.Lock()
+
+def get_core():
+    """Returns the process-wide tracker core for the default database, creating it on first use."""
+    global _core
+    with _core_lock:
+        if _core is None:
+            _core = TrackerCore()
+        return _core